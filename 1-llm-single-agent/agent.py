@@ -2,85 +2,134 @@ from google.adk import Agent
 from google.adk.tools.tool_context import ToolContext
 from google.genai import types
 
+from shared.policy import refund_policy
+from shared.store import load_purchase_store, tool_error
+from shared.tool_executor import ToolExecutor
+
 
 # Build-in stub tool -
-def get_purchase_history(purchaser: str) -> list:
-    history_data = {
-        "Alexis": [
-            {
-                "purchase_id": "JD001-20250415",
-                "purchased_date": "2025-04-15",
-                "items": [
-                    {
-                        "product_name": "Assorted Taffy 1lb Box",
-                        "quantity": 1,
-                        "price": 15.00,
-                    },
-                    {
-                        "product_name": "Watermelon Taffy 0.5lb Bag",
-                        "quantity": 1,
-                        "price": 8.00,
-                    },
-                ],
-                "shipping_method": "STANDARD",
-                "total_amount": 23.00,
-            }
-        ],
-        "David": [
-            {
-                "purchase_id": "SG001-20250501",
-                "purchased_date": "2025-05-01",
-                "items": [
-                    {
-                        "product_name": "Assorted Taffy 1lb Box",
-                        "quantity": 2,
-                        "price": 15.00,
-                    }
-                ],
-                "shipping_method": "INSURED",
-                "total_amount": 30.00,
-            },
-            {
-                "purchase_id": "SG002-20250610",
-                "purchased_date": "2025-06-03",
-                "items": [
-                    {
-                        "product_name": "Peanut Butter Taffy 0.5lb Bag",
-                        "quantity": 1,
-                        "price": 8.00,
-                    },
-                    {
-                        "product_name": "Sour Apple Taffy 0.5lb Bag",
-                        "quantity": 1,
-                        "price": 8.00,
-                    },
-                ],
-                "shipping_method": "STANDARD",
-                "total_amount": 16.00,
-            },
-        ],
-    }
-    if purchaser not in history_data:
-        return []
-    return history_data[purchaser]
+PURCHASE_HISTORY = {
+    "Alexis": [
+        {
+            "purchase_id": "JD001-20250415",
+            "purchased_date": "2025-04-15",
+            "items": [
+                {
+                    "product_name": "Assorted Taffy 1lb Box",
+                    "quantity": 1,
+                    "price": 15.00,
+                },
+                {
+                    "product_name": "Watermelon Taffy 0.5lb Bag",
+                    "quantity": 1,
+                    "price": 8.00,
+                },
+            ],
+            "shipping_method": "STANDARD",
+            "total_amount": 23.00,
+        }
+    ],
+    "David": [
+        {
+            "purchase_id": "SG001-20250501",
+            "purchased_date": "2025-05-01",
+            "items": [
+                {
+                    "product_name": "Assorted Taffy 1lb Box",
+                    "quantity": 2,
+                    "price": 15.00,
+                }
+            ],
+            "shipping_method": "INSURED",
+            "total_amount": 30.00,
+        },
+        {
+            "purchase_id": "SG002-20250610",
+            "purchased_date": "2025-06-03",
+            "items": [
+                {
+                    "product_name": "Peanut Butter Taffy 0.5lb Bag",
+                    "quantity": 1,
+                    "price": 8.00,
+                },
+                {
+                    "product_name": "Sour Apple Taffy 0.5lb Bag",
+                    "quantity": 1,
+                    "price": 8.00,
+                },
+            ],
+            "shipping_method": "STANDARD",
+            "total_amount": 16.00,
+        },
+    ],
+}
 
+# Loaded and indexed once at startup (set PURCHASE_DB to use a local SQLite file instead).
+purchase_store = load_purchase_store(PURCHASE_HISTORY)
+
+
+def get_purchase_history(
+    purchaser: str,
+    since: str = "",
+    until: str = "",
+    product: str = "",
+    shipping_method: str = "",
+    limit: int = 0,
+    summary: bool = False,
+) -> list:
+    # All filters are optional: since / until are YYYY-MM-DD, product matches part of an
+    # item name, limit keeps the most recent N, summary drops the line items.
+    return purchase_store.query(
+        purchaser,
+        since=since or None,
+        until=until or None,
+        product=product or None,
+        shipping_method=shipping_method or None,
+        limit=limit or None,
+        summary=summary,
+    )
+
+
+def find_order(purchaser: str, description: str) -> dict:
+    # Ranks the purchaser's orders against the items the customer described. purchase_id
+    # is set when one order clearly matches best, None when it's ambiguous.
+    return purchase_store.find_order(purchaser, description)
 
-def check_refund_eligible(reason: str, shipping_method: str) -> bool:
-    eligible_shipping_methods = ["INSURED", "OVERNIGHT"]
-    eligible_reasons = ["DAMAGED", "NEVER_ARRIVED"]
 
-    if (
-        reason.upper() in eligible_shipping_methods
-        and shipping_method.upper() in eligible_reasons
-    ):
-        return True
-    return False
+def check_refund_eligible(reason: str, shipping_method: str) -> bool:
+    return refund_policy.check(reason, shipping_method)
 
 
 def process_refund(amount: float, order_id: str) -> str:
     return "Refund processed successfully"
 
 
+# Bulk variant - settles several orders in one tool call instead of one call per order.
+# Each refund is {"amount": float, "order_id": str}. -> one result per refund, in order; a
+# refund missing a field gets an error of its own and doesn't stop the others.
+def process_refunds(refunds: list[dict]) -> list:
+    results = []
+    for refund in refunds:
+        order_id = refund.get("order_id")
+        if order_id is None or refund.get("amount") is None:
+            result = tool_error("Each refund needs an amount and an order_id")
+        else:
+            result = process_refund(refund["amount"], order_id)
+        results.append({"order_id": order_id, "result": result})
+    return results
+
+
+# The tools stand in for blocking database / payment calls: run them on a bounded thread
+# pool so the independent calls in one model response overlap instead of queueing on the
+# event loop. Refunds never time out: the call can't be stopped, so reporting it as failed
+# would invite the model to refund the order a second time.
+tool_executor = ToolExecutor(
+    max_workers=8,
+    timeout=10.0,
+    timeouts={"process_refund": None, "process_refunds": None},
+)
+
+
 root_agent = Agent(
     model="gemini-2.5-flash-preview-05-20",
     name="refundagent",
@@ -90,9 +139,12 @@ root_agent = Agent(
       Your task is to process refunds for customers based on their purchase history and refund reasons.
       
       Available inline tools:
-      1. get_purchase_history. This gets all the recent purchases for the user's name. if there are multiple purchases for that user, ask them which one, based on the items and date! 
+      1. get_purchase_history. This gets all the recent purchases for the user's name. if there are multiple purchases for that user, call find_order with the items they described - if it returns a purchase_id, that's the order. Otherwise ask them which one, based on the items and date! If it returns did_you_mean, the name is close to more than one customer's - ask the user to confirm their name, and never pick one of them yourself.
+         Optional filters: since / until (YYYY-MM-DD), product (part of a product name), shipping_method, limit (most recent N orders), and summary=true for one line per order (totals and item counts, no line items). Use them when the user mentions a product or date, or has a lot of orders.
       2. check_refund_eligible. Checks the user's refund reason (must be one of (DAMAGED, NEVER_ARRIVED, INCORRECT_ORDER, RACCOON_ATE_IT, OTHER) against allowed refund reasons. this returns a boolean - true if eligible, false if not.
       3. process_refund- takes the user's order ID and the amount to refund.
+      4. process_refunds - same as process_refund, for several orders in one call. Use it when more than one order is being refunded.
+      5. find_order - takes the user's name and a description of the items (eg. "peanut butter taffy"), and returns the matching purchase_id, or null with the closest candidates if it's ambiguous.
       
       You should use these tools to verify the user's purchase, get their shipping method, then check if they are refund eligible. 
       If they are refund eligible, you should process the refund and explain the order ID and the items that will be refunded. Explain why they were eligible for a refund. 
@@ -100,5 +152,13 @@ root_agent = Agent(
       
       When you respond, be friendly and thank the user for their request.       
     """,
-    tools=[get_purchase_history, check_refund_eligible, process_refund],
+    tools=tool_executor.wrap_all(
+        [
+            get_purchase_history,
+            find_order,
+            check_refund_eligible,
+            process_refund,
+            process_refunds,
+        ]
+    ),
 )
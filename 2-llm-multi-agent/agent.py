@@ -1,83 +1,120 @@
 from google.adk.agents import Agent
 
+from shared.policy import refund_policy
+from shared.store import load_purchase_store, tool_error
 
-def get_purchase_history(purchaser: str) -> list:
-    history_data = {
-        "Alexis": [
-            {
-                "purchase_id": "JD001-20250415",
-                "purchased_date": "2025-04-15",
-                "items": [
-                    {
-                        "product_name": "Assorted Taffy 1lb Box",
-                        "quantity": 1,
-                        "price": 15.00,
-                    },
-                    {
-                        "product_name": "Watermelon Taffy 0.5lb Bag",
-                        "quantity": 1,
-                        "price": 8.00,
-                    },
-                ],
-                "shipping_method": "STANDARD",
-                "total_amount": 23.00,
-            }
-        ],
-        "David": [
-            {
-                "purchase_id": "SG001-20250501",
-                "purchased_date": "2025-05-01",
-                "items": [
-                    {
-                        "product_name": "Assorted Taffy 1lb Box",
-                        "quantity": 2,
-                        "price": 15.00,
-                    }
-                ],
-                "shipping_method": "INSURED",
-                "total_amount": 30.00,
-            },
-            {
-                "purchase_id": "SG002-20250610",
-                "purchased_date": "2025-06-03",
-                "items": [
-                    {
-                        "product_name": "Peanut Butter Taffy 0.5lb Bag",
-                        "quantity": 1,
-                        "price": 8.00,
-                    },
-                    {
-                        "product_name": "Sour Apple Taffy 0.5lb Bag",
-                        "quantity": 1,
-                        "price": 8.00,
-                    },
-                ],
-                "shipping_method": "STANDARD",
-                "total_amount": 16.00,
-            },
-        ],
-    }
-    if purchaser not in history_data:
-        return []
-    return history_data[purchaser]
 
+PURCHASE_HISTORY = {
+    "Alexis": [
+        {
+            "purchase_id": "JD001-20250415",
+            "purchased_date": "2025-04-15",
+            "items": [
+                {
+                    "product_name": "Assorted Taffy 1lb Box",
+                    "quantity": 1,
+                    "price": 15.00,
+                },
+                {
+                    "product_name": "Watermelon Taffy 0.5lb Bag",
+                    "quantity": 1,
+                    "price": 8.00,
+                },
+            ],
+            "shipping_method": "STANDARD",
+            "total_amount": 23.00,
+        }
+    ],
+    "David": [
+        {
+            "purchase_id": "SG001-20250501",
+            "purchased_date": "2025-05-01",
+            "items": [
+                {
+                    "product_name": "Assorted Taffy 1lb Box",
+                    "quantity": 2,
+                    "price": 15.00,
+                }
+            ],
+            "shipping_method": "INSURED",
+            "total_amount": 30.00,
+        },
+        {
+            "purchase_id": "SG002-20250610",
+            "purchased_date": "2025-06-03",
+            "items": [
+                {
+                    "product_name": "Peanut Butter Taffy 0.5lb Bag",
+                    "quantity": 1,
+                    "price": 8.00,
+                },
+                {
+                    "product_name": "Sour Apple Taffy 0.5lb Bag",
+                    "quantity": 1,
+                    "price": 8.00,
+                },
+            ],
+            "shipping_method": "STANDARD",
+            "total_amount": 16.00,
+        },
+    ],
+}
+
+# Loaded and indexed once at startup (set PURCHASE_DB to use a local SQLite file instead).
+purchase_store = load_purchase_store(PURCHASE_HISTORY)
+
+
+def get_purchase_history(
+    purchaser: str,
+    since: str = "",
+    until: str = "",
+    product: str = "",
+    shipping_method: str = "",
+    limit: int = 0,
+    summary: bool = False,
+) -> list:
+    # All filters are optional: since / until are YYYY-MM-DD, product matches part of an
+    # item name, limit keeps the most recent N, summary drops the line items.
+    return purchase_store.query(
+        purchaser,
+        since=since or None,
+        until=until or None,
+        product=product or None,
+        shipping_method=shipping_method or None,
+        limit=limit or None,
+        summary=summary,
+    )
 
-def check_refund_eligible(reason: str, shipping_method: str) -> bool:
-    eligible_shipping_methods = ["INSURED", "OVERNIGHT"]
-    eligible_reasons = ["DAMAGED", "NEVER_ARRIVED"]
 
-    if (
-        reason.upper() in eligible_shipping_methods
-        and shipping_method.upper() in eligible_reasons
-    ):
-        return True
-    return False
+def find_order(purchaser: str, description: str) -> dict:
+    # Ranks the purchaser's orders against the items the customer described. purchase_id
+    # is set when one order clearly matches best, None when it's ambiguous.
+    return purchase_store.find_order(purchaser, description)
+
+
+def check_refund_eligible(reason: str, shipping_method: str) -> bool:
+    return refund_policy.check(reason, shipping_method)
 
 
 def process_refund(amount: float, order_id: str) -> str:
     return "Refund processed successfully"
 
 
+# Bulk variant - settles several orders in one tool call instead of one call per order.
+# Each refund is {"amount": float, "order_id": str}. -> one result per refund, in order; a
+# refund missing a field gets an error of its own and doesn't stop the others.
+def process_refunds(refunds: list[dict]) -> list:
+    results = []
+    for refund in refunds:
+        order_id = refund.get("order_id")
+        if order_id is None or refund.get("amount") is None:
+            result = tool_error("Each refund needs an amount and an order_id")
+        else:
+            result = process_refund(refund["amount"], order_id)
+        results.append({"order_id": order_id, "result": result})
+    return results
+
+
 # ---Wrap each of the three tools in a sub-agent ----
 
 # 1. Purchase Verifier Agent
@@ -89,10 +126,13 @@ purchase_verifier_agent = Agent(
       You are the Purchase Verifier Agent for Crabby's Taffy.
       Your sole task is to verify a customer's purchase history given their name.
       Use the `get_purchase_history` to retrieve the relevant information.
+      If the customer mentions a product or a date, or has a lot of orders, narrow it down with the optional filters: since / until (YYYY-MM-DD), product (part of a product name), shipping_method, limit (most recent N orders), and summary=true for one line per order (totals and item counts, no line items).
+      If the customer has several orders, call `find_order` with the items they described (eg. "peanut butter taffy"). If it returns a purchase_id, that is the order they mean - say so. If it returns null, the match was ambiguous.
       Return the purchase history data clearly and concisely.
       If no purchase is found, return an empty list or a clear message indicating so.
+      If it returns did_you_mean, the name is close to more than one customer's - never pick one of them yourself. Say no purchase was found under that name and list the did_you_mean names so the customer can confirm theirs.
     """,
-    tools=[get_purchase_history],
+    tools=[get_purchase_history, find_order],
 )
 
 # 2. Refund Policy Applier Agent
@@ -117,10 +157,10 @@ refund_processor_agent = Agent(
     instruction="""
       You are the Refund Processor Agent for Crabby's Taffy.
       Your task is to initiate and confirm a refund for a given amount and order ID.
-      Use the `process_refund_tool` to perform the refund.
+      Use the `process_refund_tool` to perform the refund. If several orders are being refunded, use `process_refunds` to refund them all in one call.
       Return the confirmation message from the processing tool.
     """,
-    tools=[process_refund],
+    tools=[process_refund, process_refunds],
 )
 
 # ----- Orchestrator (parent) agent -----
@@ -133,7 +173,7 @@ root_agent = Agent(
       Your task is to process refunds for customers based on their purchase history and refund reasons.
       
       Available sub-agents:
-      1. purchase_verifier_agent. This gets all the recent purchases for the user's name. if there are multiple purchases for that user, ask them which one, based on the items and date! 
+      1. purchase_verifier_agent. This gets all the recent purchases for the user's name, and pins down the order from the items the user described when it can. if there are multiple purchases for that user and it couldn't, ask them which one, based on the items and date! 
       2. refund_policy_applier_agent . Checks the user's refund reason (must be one of (DAMAGED, NEVER_ARRIVED, INCORRECT_ORDER, RACCOON_ATE_IT, OTHER) against allowed refund reasons. this returns a boolean - true if eligible, false if not.
       3. refund_processor_agent - takes the user's order ID and the amount to refund.
       
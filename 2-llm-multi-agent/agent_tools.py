@@ -0,0 +1,80 @@
+from google.adk.agents import Agent
+from google.adk.tools.agent_tool import AgentTool
+
+from shared.policy import OTHER, refund_policy
+
+from .agent import purchase_verifier_agent, refund_processor_agent
+
+# The sub-agents from agent.py, exposed to the coordinator as callable tools instead of
+# transfer targets. The coordinator never gives up control: it calls a sub-agent, gets the
+# answer back as a tool result, and can call several of them in one turn (ADK runs the
+# calls from one response concurrently).
+#
+# The instances here have no parent. agent.py's are the Coordinator's sub-agents there, and
+# an agent under a parent is offered transfer_to_agent on every request - so they're built
+# (or cloned) separately for this build.
+#
+# The verifier and the policy applier don't depend on each other: the policy applier
+# returns every shipping method the refund reason is eligible under, instead of checking the
+# order's, so the coordinator calls both in its first turn and they run side by side. It
+# then matches the order's shipping method against the list itself, and only the refund
+# has to wait for them.
+#
+# Compare the two builds offline with:
+#   python -m shared.benchmark -p 2 2:agent_tools
+
+
+def eligible_shipping_methods(reason: str) -> list:
+    # The shipping methods a refund for `reason` is allowed under - empty if none.
+    return [
+        method
+        for method in refund_policy.shipping_methods
+        if method != OTHER and refund_policy.check(reason, method)
+    ]
+
+
+# 1. Purchase Verifier Agent - a copy without agent.py's Coordinator as its parent.
+purchase_verifier_tool_agent = purchase_verifier_agent.clone()
+
+# 2. Refund Policy Applier Agent
+refund_policy_tool_agent = Agent(
+    model="gemini-2.5-flash-preview-05-20",
+    name="RefundPolicyApplierAgent",
+    description="Lists the shipping methods Crabby's Taffy refund policies allow a refund reason under.",
+    instruction="""
+      You are the Refund Policy Applier Agent for Crabby's Taffy.
+      You get the customer's reason for a refund. Map it to one of DAMAGED, NEVER_ARRIVED, INCORRECT_ORDER, RACCOON_ATE_IT, OTHER and call `eligible_shipping_methods` with it.
+      Return the reason and the shipping methods it's eligible under, or say it isn't eligible under any.
+    """,
+    tools=[eligible_shipping_methods],
+)
+
+# 3. Refund Processor Agent - a copy without agent.py's Coordinator as its parent.
+refund_processor_tool_agent = refund_processor_agent.clone()
+
+root_agent = Agent(
+    name="Coordinator",
+    model="gemini-2.5-flash-preview-05-20",
+    description="I coordinate greetings and tasks.",
+    instruction="""
+      You are a customer refund agent for the Crabby's Taffy company.
+      Your task is to process refunds for customers based on their purchase history and refund reasons.
+
+      Available agent tools:
+      1. PurchaseVerifierAgent. Send it the user's name and the items they described. It finds their order and returns its ID, total amount and shipping method. If there are multiple purchases for that user and it couldn't tell which one they mean, ask them which one, based on the items and date!
+      2. RefundPolicyApplierAgent. Send it the user's refund reason. It returns the shipping methods that reason is eligible for a refund under.
+      3. RefundProcessorAgent - takes the user's order ID and the amount to refund.
+
+      PurchaseVerifierAgent and RefundPolicyApplierAgent don't need each other's answers - always call both of them together, in the same turn.
+      The refund is eligible if the order's shipping method is one of the methods RefundPolicyApplierAgent returned. You never need to ask the user for the shipping method. The user should only input their name, order items, and reason for a refund request.
+      If they are refund eligible, you should process the refund and explain the order ID and the items that will be refunded. Explain why they were eligible for a refund.
+      If they are NOT refund eligible, explain why and gently decline the refund.
+
+      When you respond, no matter the outcome, be friendly and thank the user for their request. Respond in complete sentences.
+    """,
+    tools=[
+        AgentTool(agent=purchase_verifier_tool_agent),
+        AgentTool(agent=refund_policy_tool_agent),
+        AgentTool(agent=refund_processor_tool_agent),
+    ],
+)
@@ -1,74 +1,120 @@
 from google.adk.agents import Agent, SequentialAgent
 
+from shared.classifier import ReasonClassifierAgent
+from shared.context_cache import split_instructions
+from shared.instrumentation import emit_event, events_enabled
+from shared.policy import refund_policy
+from shared.projection import ProjectedInstruction, render_orders
+from shared.scheduler import schedule_models
+from shared.store import load_purchase_store, tool_error
+from shared.verifier import PurchaseLookupAgent
 
-def get_purchase_history(purchaser: str) -> list:
-    history_data = {
-        "Alexis": [
-            {
-                "purchase_id": "JD001-20250415",
-                "purchased_date": "2025-04-15",
-                "items": [
-                    {
-                        "product_name": "Assorted Taffy 1lb Box",
-                        "quantity": 1,
-                        "price": 15.00,
-                    },
-                    {
-                        "product_name": "Watermelon Taffy 0.5lb Bag",
-                        "quantity": 1,
-                        "price": 8.00,
-                    },
-                ],
-                "shipping_method": "STANDARD",
-                "total_amount": 23.00,
-            }
-        ],
-        "David": [
-            {
-                "purchase_id": "SG001-20250501",
-                "purchased_date": "2025-05-01",
-                "items": [
-                    {
-                        "product_name": "Assorted Taffy 1lb Box",
-                        "quantity": 2,
-                        "price": 15.00,
-                    }
-                ],
-                "shipping_method": "INSURED",
-                "total_amount": 30.00,
-            },
-        ],
-    }
-    if purchaser not in history_data:
-        return []
-    return history_data[purchaser]
+
+PURCHASE_HISTORY = {
+    "Alexis": [
+        {
+            "purchase_id": "JD001-20250415",
+            "purchased_date": "2025-04-15",
+            "items": [
+                {
+                    "product_name": "Assorted Taffy 1lb Box",
+                    "quantity": 1,
+                    "price": 15.00,
+                },
+                {
+                    "product_name": "Watermelon Taffy 0.5lb Bag",
+                    "quantity": 1,
+                    "price": 8.00,
+                },
+            ],
+            "shipping_method": "STANDARD",
+            "total_amount": 23.00,
+        }
+    ],
+    "David": [
+        {
+            "purchase_id": "SG001-20250501",
+            "purchased_date": "2025-05-01",
+            "items": [
+                {
+                    "product_name": "Assorted Taffy 1lb Box",
+                    "quantity": 2,
+                    "price": 15.00,
+                }
+            ],
+            "shipping_method": "INSURED",
+            "total_amount": 30.00,
+        },
+    ],
+}
+
+# Loaded and indexed once at startup (set PURCHASE_DB to use a local SQLite file instead).
+purchase_store = load_purchase_store(PURCHASE_HISTORY)
+
+
+def get_purchase_history(
+    purchaser: str,
+    since: str = "",
+    until: str = "",
+    product: str = "",
+    shipping_method: str = "",
+    limit: int = 0,
+    summary: bool = False,
+) -> list:
+    # All filters are optional: since / until are YYYY-MM-DD, product matches part of an
+    # item name, limit keeps the most recent N, summary drops the line items.
+    return purchase_store.query(
+        purchaser,
+        since=since or None,
+        until=until or None,
+        product=product or None,
+        shipping_method=shipping_method or None,
+        limit=limit or None,
+        summary=summary,
+    )
 
 
 def check_refund_eligible(reason: str, shipping_method: str) -> str:
-    eligible_reasons = ["DAMAGED", "LOST", "LATE"]
-    eligible_shipping_methods = ["INSURED"]
     reason = reason.strip().upper()
     shipping_method = shipping_method.strip().upper()
-    print("⭐ Reason: ", reason)
-    print("⭐ Shipping Method: ", shipping_method)
-    if reason in eligible_reasons and shipping_method in eligible_shipping_methods:
-        print("✅ Eligible for Refund, returning TRUE")
-        return "TRUE"
-    print("❌ Not Eligible for Refund, returning FALSE")
-    return "FALSE"
+    result = "TRUE" if refund_policy.check(reason, shipping_method) else "FALSE"
+    if events_enabled():
+        emit_event(
+            "refund_eligibility_checked",
+            reason=reason,
+            shipping_method=shipping_method,
+            eligible=result,
+        )
+    return result
 
 
 def process_refund(amount: float, order_id: str) -> str:
     return "Refund processed successfully"
 
 
+# Bulk variant - settles several orders in one tool call instead of one call per order.
+# Each refund is {"amount": float, "order_id": str}. -> one result per refund, in order; a
+# refund missing a field gets an error of its own and doesn't stop the others.
+def process_refunds(refunds: list[dict]) -> list:
+    results = []
+    for refund in refunds:
+        order_id = refund.get("order_id")
+        if order_id is None or refund.get("amount") is None:
+            result = tool_error("Each refund needs an amount and an order_id")
+        else:
+            result = process_refund(refund["amount"], order_id)
+        results.append({"order_id": order_id, "result": result})
+    return results
+
+
 # A sequential agent must be able to "pass data" from one agent to another
 # (There is no AI-powered coordinator/parent agent! The sequence is "hardcoded.")
 
 # 1. Purchase Verifier Agent
-purchase_verifier_agent = Agent(
+# LLM version - only used as a fallback when the lookup agent below can't find the purchaser's name.
+llm_purchase_verifier_agent = Agent(
     model="gemini-2.5-flash-preview-05-20",
-    name="PurchaseVerifierAgent",
+    name="LlmPurchaseVerifierAgent",
     description="Verifies customer purchase history using the internal database.",
     instruction="""
       You are the Purchase Verifier Agent for Crabby's Taffy.
@@ -77,17 +123,29 @@ purchase_verifier_agent = Agent(
       Return the purchase history data clearly and concisely.
       You will get back the shipping method. 
       If no purchase is found, return an empty list or a clear message indicating so.
+      If it returns did_you_mean, the name is close to more than one customer's - never pick one of them yourself. Say no purchase was found under that name and list the did_you_mean names so the customer can confirm theirs.
     """,
     tools=[get_purchase_history],
     output_key="purchase_history",
 )
 
+# Deterministic version - finds the purchaser's name in the user's message and writes
+# state['purchase_history'] straight from the purchase store, with no model call.
+purchase_verifier_agent = PurchaseLookupAgent(
+    name="PurchaseVerifierAgent",
+    description="Verifies customer purchase history using the internal database.",
+    store=purchase_store,
+    sub_agents=[llm_purchase_verifier_agent],
+)
+
 # 2. Refund Policy Applier Agent
-refund_eligibility_agent = Agent(
+# LLM version - only used as a fallback when the reason classifier below isn't confident.
+llm_refund_eligibility_agent = Agent(
     model="gemini-2.5-flash-preview-05-20",
-    name="RefundPolicyApplierAgent",
+    name="LlmRefundPolicyApplierAgent",
     description="Applies Crabby's Taffy refund policies to determine eligibility.",
-    instruction="""
+    instruction=ProjectedInstruction(
+        """
       You are the Refund Policy Applier Agent for Crabby's Taffy.
       Your task is to determine if a refund request is eligible based on the provided reason and shipping method.
       Use the `check_refund_eligibile` to make this determination.
@@ -103,29 +161,47 @@ refund_eligibility_agent = Agent(
       
       Call the check_refund_eligible tool to determine if the refund is eligible. You will get a True or False result back from the tool. Do not modify the tool's response. Simply response TRUE or FALSE.
     """,
+        purchase_history=render_orders("purchase_id", "shipping_method"),
+    ),
     tools=[check_refund_eligible],
     output_key="is_refund_eligible",
 )
 
+# Fast path - matches the reason against known keywords ("melted", "never arrived", "stolen", ...)
+# and calls check_refund_eligible directly, writing state['is_refund_eligible'] with no model call.
+refund_eligibility_agent = ReasonClassifierAgent(
+    name="RefundPolicyApplierAgent",
+    description="Applies Crabby's Taffy refund policies to determine eligibility.",
+    check_eligible=check_refund_eligible,
+    output_key="is_refund_eligible",
+    sub_agents=[llm_refund_eligibility_agent],
+)
+
 # 3. Refund Processor Agent
 refund_processor_agent = Agent(
     model="gemini-2.5-flash-preview-05-20",
     name="RefundProcessorAgent",
     description="Processes customer refunds through the payment system.",
-    instruction="""
+    instruction=ProjectedInstruction(
+        """
         You are a customer refund agent for the Crabby's Taffy company.
         Your task is to process refunds for customers based on their purchase history and refund reasons.
         When you respond, no matter the outcome, be friendly and thank the user for their request. Respond in complete sentences. 
 
+        This is the user's purchase history, with the order ID and total to refund: 
+        {purchase_history}
+
         Based on the prior agent's response, this value represents whether the user is eligible for a refund: {is_refund_eligible}
 
         If eligible: 
-        use the `process_refund_tool` to perform the refund.
+        use the `process_refund_tool` to perform the refund. If several orders are being refunded, use `process_refunds` to refund them all in one call.
         Return the confirmation message from the processing tool.
         
         Do not hand off to a human in the loop. Always make a "refund" or "no refund" decision.
     """,
-    tools=[process_refund],
+        purchase_history=render_orders("purchase_id", "purchased_date", "total_amount", "items"),
+    ),
+    tools=[process_refund, process_refunds],
     output_key="refund_confirmation_message",
 )
 
@@ -139,3 +215,11 @@ root_agent = SequentialAgent(
         refund_processor_agent,
     ],
 )
+
+# Keep the long, unchanging part of each instruction in a stable prompt prefix that the
+# provider can cache; the state-derived values are sent after it (see shared.context_cache).
+split_instructions(root_agent)
+
+# Every model call goes through the process-wide scheduler (see shared.scheduler), which
+# keeps them within the quota and serves the reply the customer is waiting on first.
+schedule_models(root_agent, foreground={"RefundProcessorAgent"})
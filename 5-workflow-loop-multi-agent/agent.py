@@ -2,90 +2,149 @@ from google.adk.agents import Agent, SequentialAgent, LoopAgent, BaseAgent, LlmA
 from google.adk.tools.tool_context import ToolContext
 from google.adk.events import Event, EventActions
 from google.adk.agents.invocation_context import InvocationContext
+from google.genai import types
 from typing import AsyncGenerator
+from dataclasses import asdict
 
+from shared.classifier import ReasonClassifierAgent
+from shared.compaction import HistoryCompactor, HistoryPolicy
+from shared.context_cache import split_instructions
+from shared.deadlines import (
+    DeadlineAgent,
+    eligibility_fallback,
+    hedge_models,
+    refund_processed,
+    template_fallback,
+    verifier_fallback,
+)
+from shared.instrumentation import emit_event, events_enabled
+from shared.offers import (
+    CASH,
+    CHOICE_RE,
+    Offer,
+    accepted_offer,
+    format_offers,
+    offer_ladder,
+)
+from shared.policy import refund_policy
+from shared.projection import ProjectedInstruction, render_orders
+from shared.scheduler import schedule_models
+from shared.store import load_purchase_store, tool_error
+from shared.verifier import PurchaseLookupAgent, user_message_text
+
+
+PURCHASE_HISTORY = {
+    "Alexis": [
+        {
+            "purchase_id": "JD001-20250415",
+            "purchased_date": "2025-04-15",
+            "items": [
+                {
+                    "product_name": "Assorted Taffy 1lb Box",
+                    "quantity": 1,
+                    "price": 15.00,
+                },
+                {
+                    "product_name": "Watermelon Taffy 0.5lb Bag",
+                    "quantity": 1,
+                    "price": 8.00,
+                },
+            ],
+            "shipping_method": "STANDARD",
+            "total_amount": 23.00,
+        }
+    ],
+    "David": [
+        {
+            "purchase_id": "SG001-20250501",
+            "purchased_date": "2025-05-01",
+            "items": [
+                {
+                    "product_name": "Assorted Taffy 1lb Box",
+                    "quantity": 2,
+                    "price": 15.00,
+                }
+            ],
+            "shipping_method": "INSURED",
+            "total_amount": 30.00,
+        },
+    ],
+}
+
+# Loaded and indexed once at startup (set PURCHASE_DB to use a local SQLite file instead).
+purchase_store = load_purchase_store(PURCHASE_HISTORY)
 
-def get_purchase_history(purchaser: str) -> list:
-    history_data = {
-        "Alexis": [
-            {
-                "purchase_id": "JD001-20250415",
-                "purchased_date": "2025-04-15",
-                "items": [
-                    {
-                        "product_name": "Assorted Taffy 1lb Box",
-                        "quantity": 1,
-                        "price": 15.00,
-                    },
-                    {
-                        "product_name": "Watermelon Taffy 0.5lb Bag",
-                        "quantity": 1,
-                        "price": 8.00,
-                    },
-                ],
-                "shipping_method": "STANDARD",
-                "total_amount": 23.00,
-            }
-        ],
-        "David": [
-            {
-                "purchase_id": "SG001-20250501",
-                "purchased_date": "2025-05-01",
-                "items": [
-                    {
-                        "product_name": "Assorted Taffy 1lb Box",
-                        "quantity": 2,
-                        "price": 15.00,
-                    }
-                ],
-                "shipping_method": "INSURED",
-                "total_amount": 30.00,
-            },
-        ],
-    }
-    if purchaser not in history_data:
-        return []
-    return history_data[purchaser]
+
+def get_purchase_history(
+    purchaser: str,
+    since: str = "",
+    until: str = "",
+    product: str = "",
+    shipping_method: str = "",
+    limit: int = 0,
+    summary: bool = False,
+) -> list:
+    # All filters are optional: since / until are YYYY-MM-DD, product matches part of an
+    # item name, limit keeps the most recent N, summary drops the line items.
+    return purchase_store.query(
+        purchaser,
+        since=since or None,
+        until=until or None,
+        product=product or None,
+        shipping_method=shipping_method or None,
+        limit=limit or None,
+        summary=summary,
+    )
 
 
 def check_refund_eligible(reason: str, shipping_method: str) -> str:
-    eligible_reasons = ["DAMAGED", "LOST", "LATE"]
-    eligible_shipping_methods = ["INSURED"]
     reason = reason.strip().upper()
     shipping_method = shipping_method.strip().upper()
-    print("⭐ Reason: ", reason)
-    print("⭐ Shipping Method: ", shipping_method)
-    if reason in eligible_reasons and shipping_method in eligible_shipping_methods:
-        print("✅ Eligible for Refund, returning TRUE")
-        return "TRUE"
-    print("❌ Not Eligible for Refund, returning FALSE")
-    return "FALSE"
-
-
-def negotiate_alternative_refund(iteration: int) -> str:
-    if iteration == 1:
-        return "I can offer you a 1/2lb box of assorted taffy for your next order?"
-    elif iteration == 2:
-        return (
-            "I can offer you a store credit voucher for 75 percent of your order total?"
+    result = "TRUE" if refund_policy.check(reason, shipping_method) else "FALSE"
+    if events_enabled():
+        emit_event(
+            "refund_eligibility_checked",
+            reason=reason,
+            shipping_method=shipping_method,
+            eligible=result,
         )
-    elif iteration == 3:
-        return "I can offer you a 50 percent cash refund?"
-    else:
-        return "❌ Invalid iteration"
+    return result
 
 
 def process_refund(amount: float, order_id: str) -> str:
     return "Refund processed successfully"
 
 
+# Bulk variant - settles several orders in one tool call instead of one call per order.
+# Each refund is {"amount": float, "order_id": str}. -> one result per refund, in order; a
+# refund missing a field gets an error of its own and doesn't stop the others.
+def process_refunds(refunds: list[dict]) -> list:
+    results = []
+    for refund in refunds:
+        order_id = refund.get("order_id")
+        if order_id is None or refund.get("amount") is None:
+            result = tool_error("Each refund needs an amount and an order_id")
+        else:
+            result = process_refund(refund["amount"], order_id)
+        results.append({"order_id": order_id, "result": result})
+    return results
+
+
+# Latency budgets (seconds) for the LLM agents (see shared.deadlines). Every model call in
+# the loop adds to the turn, so past its budget each one is answered by code instead.
+VERIFIER_BUDGET = 3.0
+ELIGIBILITY_BUDGET = 3.0
+NEGOTIATOR_BUDGET = 2.0
+OFFER_READER_BUDGET = 2.0
+
 # A sequential agent must be able to "pass data" from one agent to another
 # (There is no AI-powered coordinator/parent agent! The sequence is "hardcoded.")
 
 # 1. Purchase Verifier Agent
-purchase_verifier_agent = Agent(
+# LLM version - only used as a fallback when the lookup agent below can't find the purchaser's name.
+llm_purchase_verifier_agent = Agent(
     model="gemini-2.5-flash-preview-05-20",
-    name="PurchaseVerifierAgent",
+    name="LlmPurchaseVerifierAgent",
     description="Verifies customer purchase history using the internal database.",
     instruction="""
       You are the Purchase Verifier Agent for Crabby's Taffy.
@@ -94,17 +153,37 @@ purchase_verifier_agent = Agent(
       Return the purchase history data clearly and concisely.
       You will get back the shipping method. 
       If no purchase is found, return an empty list or a clear message indicating so.
+      If it returns did_you_mean, the name is close to more than one customer's - never pick one of them yourself. Say no purchase was found under that name and list the did_you_mean names so the customer can confirm theirs.
     """,
     tools=[get_purchase_history],
     output_key="purchase_history",
 )
 
+# Deterministic version - finds the purchaser's name in the user's message and writes
+# state['purchase_history'] straight from the purchase store, with no model call.
+purchase_verifier_agent = PurchaseLookupAgent(
+    name="PurchaseVerifierAgent",
+    description="Verifies customer purchase history using the internal database.",
+    store=purchase_store,
+    sub_agents=[
+        # The fallback gets a latency budget - past it, an exact name lookup answers instead.
+        DeadlineAgent(
+            name="LlmPurchaseVerifierDeadline",
+            budget=VERIFIER_BUDGET,
+            fallback=verifier_fallback(purchase_store),
+            sub_agents=[llm_purchase_verifier_agent],
+        )
+    ],
+)
+
 # 2. Refund Policy Applier Agent
-refund_eligibility_agent = Agent(
+# LLM version - only used as a fallback when the reason classifier below isn't confident.
+llm_refund_eligibility_agent = Agent(
     model="gemini-2.5-flash-preview-05-20",
-    name="RefundPolicyApplierAgent",
+    name="LlmRefundPolicyApplierAgent",
     description="Applies Crabby's Taffy refund policies to determine eligibility.",
-    instruction="""
+    instruction=ProjectedInstruction(
+        """
       You are the Refund Policy Applier Agent for Crabby's Taffy.
       Your task is to determine if a refund request is eligible based on the provided reason and shipping method.
       Use the `check_refund_eligibile` to make this determination.
@@ -121,7 +200,30 @@ refund_eligibility_agent = Agent(
       Call the check_refund_eligible tool to determine if the refund is eligible. You will get a True or False result back from the tool. Do not modify the tool's response. Simply respond TRUE or FALSE.
       Then, update state['is_full_refund_eligible`] to that result, either TRUE or FALSE.
     """,
+        purchase_history=render_orders("purchase_id", "shipping_method"),
+    ),
     tools=[check_refund_eligible],
+    output_key="is_full_refund_eligible",
+)
+
+# Fast path - matches the reason against known keywords ("melted", "never arrived", "stolen", ...)
+# and calls check_refund_eligible directly, writing state['is_full_refund_eligible'] with no model call.
+refund_eligibility_agent = ReasonClassifierAgent(
+    name="RefundPolicyApplierAgent",
+    description="Applies Crabby's Taffy refund policies to determine eligibility.",
+    check_eligible=check_refund_eligible,
+    output_key="is_full_refund_eligible",
+    sub_agents=[
+        # Past its budget, the classifier's best guess decides instead.
+        DeadlineAgent(
+            name="LlmRefundPolicyApplierDeadline",
+            budget=ELIGIBILITY_BUDGET,
+            fallback=eligibility_fallback(
+                check_refund_eligible, "is_full_refund_eligible"
+            ),
+            sub_agents=[llm_refund_eligibility_agent],
+        )
+    ],
 )
 
 # 3. NEW - Loop Agent for refund processing.
@@ -129,68 +231,278 @@ refund_eligibility_agent = Agent(
 How the refund LoopAgent works: 
 - Similar to sequential agent, the base workflow is to get the purchase history, check eligibility, and issue a refund 
 - BUT, if the user is NOT eligible on the first go (eg. their order was not insured), we introduce a sub-loop with a new subagent (negotiate_refund) and process_refund, to offer alternatives to the user to boost customer satisfaction + loyalty.
-- Within the negotiation subloop we can do a MAX of three iterations, each representing one refund alternative: 
+- Within the negotiation subloop we can make a MAX of three offers, each one refund alternative: 
         1. Offer a coupon for a 1/2lb box of assorted taffy on their next order 
         2. Offer a store credit voucher for 75% of their order total 
         3. Offer a 50% cash refund. 
+  The whole ladder is computed up front with concrete amounts from the order total (see shared.offers),
+  and offers_per_turn of them are put to the customer at once - all three by default, so one answer settles it.
 - The exit criteria for that negotiation loop is EITHER max_tries_reachd (>3) OR the user agrees to one of those options. 
+
+The loop is driven by RefundLoopController (code, not an LLM). It owns state['iteration_number'],
+state['refund_negotiated'] and state['refund_resolved'], calls process_refund itself for fully
+eligible customers, and escalates out of the loop as soon as the refund is resolved - or after
+offers have been made, to wait for the customer's answer (the next user message re-enters the loop).
+The models only phrase the offers and read which one (if any) the customer accepted.
 """
 
+MAX_OFFERS = 3
 
+# Only used when the controller can't pick the order to refund by itself: the purchase
+# history isn't structured (the LLM verifier fallback ran), or the customer's message
+# doesn't single out one of their orders.
 refund_loop_checker_agent = Agent(
     model="gemini-2.5-flash-preview-05-20",
     name="RefundLoopCheckerAgent",
-    instruction="""
-    Read the value of state['is_full_refund_eligible']. 
-    If TRUE, call process_refund and update state['refund_resolved'] to value: pass. Thank the user for their request.
-    
-    Otherwise, check state['refund_negotiated'] and if TRUE, respond "I will mail this alternative refund to you!" and update state['refund_resolved'] to value: pass. Thank the user for their request!
-    
-    If neither of these conditions are true, DO NOT RESPOND TO THE USER, and make sure state['refund_resolved'] is set to value: fail. 
+    instruction=ProjectedInstruction(
+        """
+    The customer is eligible for a full refund. Based on their purchase history, call process_refund for the order they described:
+    {purchase_history}
+    If you can't tell which order they mean, ask them instead of guessing.
+    Then thank the user for their request.
      """,
-    tools=[process_refund],
+        purchase_history=render_orders("purchase_id", "purchased_date", "total_amount"),
+    ),
+    tools=[process_refund, process_refunds],
+)
+
+refund_offer_reader_agent = LlmAgent(
+    model="gemini-2.5-flash-preview-05-20",
+    name="RefundOfferReaderAgent",
+    instruction="""
+      We offered the customer these alternatives to a full refund:
+      {current_offer}
+      
+      Read the customer's latest message. If they accepted one of the offers, respond with its number. Otherwise, respond NONE.
+      Respond with only the number or NONE.
+      """,
+    output_key="accepted_offer",
 )
 
 refund_loop_negotiator_agent = LlmAgent(
     model="gemini-2.5-flash-preview-05-20",
     name="RefundLoopNegotiatorAgent",
     instruction="""
-      If state['iteration_number'] is unset or set to 0, set it to 1. 
-      Otherwise, increment state['iteration_number'] by 1. 
-      
-      Then, call negotiate_alternative_refund and pass state['iteration_number'] as an argument. 
+      The customer is not eligible for a full refund. Offer them these alternatives instead, in this order:
+      {current_offer}
       
-      The returned value of negotiate_alternative_refund is the offer you should pass to the user. Ask them if that offer would work. You should PAUSE, and WAIT for the user to accept or decline the offer. 
-      
-      If they accept, set state['refund_negotiated'] to TRUE.
-      If they do not accept, set state['refund_negotiated'] to FALSE. 
+      Be friendly, explain each offer in a sentence, and ask which one would work for them.
       """,
-    tools=[negotiate_alternative_refund],
 )
 
 
-# Custom check-condition agent
+# Templated offers, in place of the negotiator when it runs past its budget.
+OFFER_TEMPLATE = (
+    "I'm sorry, your order isn't eligible for a full refund. I can offer you one of these "
+    "instead:\n{current_offer}\nWhich one would work for you?"
+)
+
+
+def read_offer_answer(ctx: InvocationContext) -> tuple:
+    # In place of the offer reader: the offer number, if that's all the customer replied -
+    # a number inside a sentence ("I ordered 2 boxes") could be anything.
+    match = CHOICE_RE.match(user_message_text(ctx))
+    return None, {"accepted_offer": match.group(1) if match else "NONE"}
+
+
+def is_true(value) -> bool:
+    return str(value).strip().upper() == "TRUE"
+
+
+def order_to_refund(ctx: InvocationContext):
+    # The order the customer described (see PurchaseStore.find_order), or their only order.
+    # None if the verifier didn't write structured history or the message doesn't match
+    # exactly one order. Once offers are made the choice is kept in state, since the
+    # answers ("2") don't describe the order again.
+    state = ctx.session.state
+    purchase_history = state.get("purchase_history")
+    if not isinstance(purchase_history, list) or not purchase_history:
+        return None
+    purchase_id = state.get("refund_purchase_id")
+    if purchase_id is None:
+        if len(purchase_history) == 1:
+            return purchase_history[0]
+        purchaser = state.get("purchaser")
+        if purchaser is None:
+            return None
+        match = purchase_store.find_order(purchaser, user_message_text(ctx))
+        purchase_id = match["purchase_id"]
+    for purchase in purchase_history:
+        if purchase["purchase_id"] == purchase_id:
+            return purchase
+    return None
+
+
+# Custom loop controller - replaces the LLM checker and CheckStatusAndEscalate.
 # Source: https://google.github.io/adk-docs/agents/multi-agents/#iterative-refinement-pattern
 # Resolution could mean:
 # - a full refund was given
 # - a negotiated alternative was given
 # - max iterations reached (user declined all alternatives)
-class CheckStatusAndEscalate(BaseAgent):
+# sub_agents: [offer reader, full refund fallback]
+class RefundLoopController(BaseAgent):
+    # Offers from the ladder put to the customer per turn: 1 makes them one at a time.
+    offers_per_turn: int = MAX_OFFERS
+
+    def state_reads(self) -> set:
+        return {
+            "purchaser",
+            "purchase_history",
+            "refund_purchase_id",
+            "is_full_refund_eligible",
+            "iteration_number",
+            "offer_ladder",
+            "accepted_offer",
+            "refund_resolved",
+            "offer_invocation_id",
+        }
+
+    def state_writes(self) -> set:
+        return {
+            "iteration_number",
+            "offer_ladder",
+            "current_offer",
+            "refund_purchase_id",
+            "refund_negotiated",
+            "refund_resolved",
+            "offer_invocation_id",
+        }
+
     async def _run_async_impl(
         self, ctx: InvocationContext
     ) -> AsyncGenerator[Event, None]:
-        status = ctx.session.state.get("refund_resolved", "fail")
-        should_stop = status == "pass"
-        yield Event(author=self.name, actions=EventActions(escalate=should_stop))
+        state = ctx.session.state
+        offer_reader, refund_fallback = self.sub_agents
+
+        if state.get("refund_resolved") in ("pass", "declined"):
+            yield Event(author=self.name, actions=EventActions(escalate=True))
+            return
+
+        if is_true(state.get("is_full_refund_eligible")):
+            order = order_to_refund(ctx)
+            if order is None:
+                async for event in refund_fallback.run_async(ctx):
+                    yield event
+                if refund_processed(ctx):
+                    yield self._resolve("pass")
+                else:
+                    # It asked which order they mean - wait for the answer, unresolved.
+                    yield Event(author=self.name, actions=EventActions(escalate=True))
+                return
+            process_refund(order["total_amount"], order["purchase_id"])
+            yield self._resolve(
+                "pass",
+                f"Your order {order['purchase_id']} is eligible for a full refund, so I've "
+                f"refunded ${order['total_amount']:.2f} to your original payment method. "
+                "Thank you for your request!",
+            )
+            return
+
+        # iteration_number counts the offers made so far.
+        iteration = state.get("iteration_number", 0)
+        if state.get("offer_invocation_id") == ctx.invocation_id:
+            # We just made an offer in this turn - stop and wait for the customer's answer.
+            yield Event(author=self.name, actions=EventActions(escalate=True))
+            return
+
+        order = order_to_refund(ctx)
+        if state.get("offer_ladder"):
+            ladder = [Offer(**offer) for offer in state["offer_ladder"]]
+        else:
+            ladder = offer_ladder(order["total_amount"] if order else None)[:MAX_OFFERS]
+
+        if iteration > 0:
+            async for event in offer_reader.run_async(ctx):
+                yield event
+            offer = accepted_offer(
+                ctx.session.state.get("accepted_offer"), ladder[:iteration]
+            )
+            if offer is not None:
+                yield self._settle(offer, order)
+                return
+
+        if iteration >= MAX_OFFERS:
+            yield self._resolve(
+                "declined",
+                "I'm sorry we couldn't find an option that works for you. "
+                "Thank you for your request, and we hope to see you again soon.",
+            )
+            return
 
+        # Make the next offers; the negotiator phrases them.
+        offers = ladder[iteration : iteration + self.offers_per_turn]
+        yield Event(
+            author=self.name,
+            actions=EventActions(
+                state_delta={
+                    "iteration_number": iteration + len(offers),
+                    "offer_ladder": [asdict(offer) for offer in ladder],
+                    "current_offer": format_offers(offers),
+                    "refund_purchase_id": order["purchase_id"] if order else None,
+                    "refund_negotiated": "FALSE",
+                    "refund_resolved": "fail",
+                    "offer_invocation_id": ctx.invocation_id,
+                }
+            ),
+        )
+
+    def _settle(self, offer: Offer, order) -> Event:
+        # Cash is refunded right away; the rest is mailed out.
+        if offer.kind == CASH and offer.amount is not None and order is not None:
+            process_refund(offer.amount, order["purchase_id"])
+            message = (
+                f"I've refunded ${offer.amount:.2f} for your order {order['purchase_id']} "
+                "to your original payment method. Thank you for your request!"
+            )
+        else:
+            message = (
+                f"I will mail this alternative refund to you: {offer.text}! "
+                "Thank you for your request!"
+            )
+        return Event(
+            author=self.name,
+            content=types.Content(role="model", parts=[types.Part(text=message)]),
+            actions=EventActions(
+                state_delta={"refund_negotiated": "TRUE", "refund_resolved": "pass"},
+                escalate=True,
+            ),
+        )
+
+    def _resolve(self, status: str, message: str = None) -> Event:
+        content = None
+        if message:
+            content = types.Content(role="model", parts=[types.Part(text=message)])
+        return Event(
+            author=self.name,
+            content=content,
+            actions=EventActions(state_delta={"refund_resolved": status}, escalate=True),
+        )
+
+
+refund_loop_controller = RefundLoopController(
+    name="RefundLoopController",
+    sub_agents=[
+        DeadlineAgent(
+            name="RefundOfferReaderDeadline",
+            budget=OFFER_READER_BUDGET,
+            fallback=read_offer_answer,
+            sub_agents=[refund_offer_reader_agent],
+        ),
+        refund_loop_checker_agent,
+    ],
+)
 
 refund_loop_agent = LoopAgent(
     name="RefundLoopAgent",
-    max_iterations=3,
+    max_iterations=MAX_OFFERS,
     sub_agents=[
-        refund_loop_checker_agent,
-        refund_loop_negotiator_agent,
-        CheckStatusAndEscalate(name="StopChecker"),
+        refund_loop_controller,
+        DeadlineAgent(
+            name="RefundLoopNegotiatorDeadline",
+            budget=NEGOTIATOR_BUDGET,
+            fallback=template_fallback(OFFER_TEMPLATE),
+            sub_agents=[refund_loop_negotiator_agent],
+        ),
     ],
 )
 
@@ -205,3 +517,40 @@ root_agent = SequentialAgent(
         refund_loop_agent,
     ],
 )
+
+# Keep the long, unchanging part of each instruction in a stable prompt prefix that the
+# provider can cache; the state-derived values are sent after it (see shared.context_cache).
+split_instructions(root_agent)
+
+# The negotiation pauses for the customer's answer after every offer, so a session can run
+# for several turns. Each model only gets the part of the history it needs, so prompts stay
+# flat instead of replaying the whole negotiation on every call (see shared.compaction).
+history_compactor = HistoryCompactor(
+    {
+        "LlmPurchaseVerifierAgent": HistoryPolicy(window=1, authors=set()),
+        "LlmRefundPolicyApplierAgent": HistoryPolicy(window=1, authors=set()),
+        "RefundLoopCheckerAgent": HistoryPolicy(window=1, authors=set()),
+        "RefundOfferReaderAgent": HistoryPolicy(window=1, authors=set()),
+        # Earlier offers and answers are kept as a short summary.
+        "RefundLoopNegotiatorAgent": HistoryPolicy(
+            window=1, authors=set(), summary_key="negotiation_summary"
+        ),
+    }
+)
+history_compactor.attach(root_agent)
+
+# Send a second copy of any model call that runs past the 95th percentile of that agent's
+# recent calls, and take whichever answers first.
+hedge_models(root_agent)
+
+# Every model call goes through the process-wide scheduler (see shared.scheduler), which
+# keeps them within the quota. The negotiation comes first: those sessions are the closest
+# to done, and the customer is waiting on the reply.
+schedule_models(
+    root_agent,
+    foreground={
+        "RefundLoopCheckerAgent",
+        "RefundOfferReaderAgent",
+        "RefundLoopNegotiatorAgent",
+    },
+)
@@ -0,0 +1,199 @@
+"""
+Batch runner for queues of refund requests (eg. the backlog after a shipping incident).
+
+Drives any of the five root_agents over a JSONL file of requests, one session per request,
+with bounded asyncio concurrency:
+
+    python -m shared.batch 4 requests.jsonl results.jsonl --concurrency 32
+
+Each input line is {"id": "...", "message": "..."} ("id" defaults to the line number, and
+"user_id" is optional); a line that isn't a JSON object gets an error result of its own.
+Results are appended to the output JSONL as each request finishes:
+
+    {"id": ..., "response": <final text>, "state": {...}, "error": null, "latency_ms": ...}
+
+The output file doubles as the checkpoint: re-running the same command skips every id that
+already has a successful result, so an interrupted run picks up where it left off and
+requests that failed are tried again.
+
+--stub-latency swaps every LlmAgent's model for the benchmark's StubModel, for dry runs.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+from google.adk.runners import Runner
+from google.adk.sessions import InMemorySessionService
+from google.genai import types
+
+from shared.patterns import load_root_agent, resolve_pattern
+
+# State keys worth keeping in the results file.
+RESULT_STATE_KEYS = [
+    "purchaser",
+    "refund_reason",
+    "is_refund_eligible",
+    "is_full_refund_eligible",
+    "refund_resolved",
+    "refund_confirmation_message",
+]
+
+
+def read_requests(path: str):
+    with open(path) as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                request = json.loads(line)
+                if not isinstance(request, dict):
+                    raise ValueError("expected a JSON object")
+            except ValueError as e:
+                # Becomes an error result for this line - see run_request().
+                yield {"id": str(line_number), "invalid": f"{type(e).__name__}: {e}"}
+                continue
+            request.setdefault("id", str(line_number))
+            yield request
+
+
+def completed_ids(path: str) -> set:
+    if not os.path.exists(path):
+        return set()
+    done = set()
+    with open(path) as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+                if result["error"] is None:
+                    done.add(result["id"])
+            except (ValueError, KeyError):
+                # A half-written last line from an interrupted run - redo that request.
+                continue
+    return done
+
+
+async def run_request(runner: Runner, request: dict) -> dict:
+    if "invalid" in request:
+        error = f"Invalid request on line {request['id']}: {request['invalid']}"
+        return {
+            "id": request["id"],
+            "response": None,
+            "state": {},
+            "error": error,
+            "latency_ms": 0.0,
+        }
+    user_id = request.get("user_id", "batch")
+    session = await runner.session_service.create_session(
+        app_name=runner.app_name, user_id=user_id
+    )
+    result = {"id": request["id"], "response": None, "state": {}, "error": None}
+    started = time.perf_counter()
+    try:
+        # Inside the try: a malformed request fails on its own, not the whole batch.
+        content = types.Content(
+            role="user", parts=[types.Part(text=request["message"])]
+        )
+        async for event in runner.run_async(
+            user_id=user_id, session_id=session.id, new_message=content
+        ):
+            if event.is_final_response() and event.content and event.content.parts:
+                text = "".join(part.text or "" for part in event.content.parts)
+                if text:
+                    result["response"] = text
+        session = await runner.session_service.get_session(
+            app_name=runner.app_name, user_id=user_id, session_id=session.id
+        )
+        result["state"] = {
+            key: session.state[key] for key in RESULT_STATE_KEYS if key in session.state
+        }
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+    finally:
+        # One session per request - don't let a long backlog pile them up in memory.
+        await runner.session_service.delete_session(
+            app_name=runner.app_name, user_id=user_id, session_id=session.id
+        )
+    result["latency_ms"] = (time.perf_counter() - started) * 1000
+    return result
+
+
+async def run_batch(
+    pattern: str,
+    input_path: str,
+    output_path: str,
+    concurrency: int = 8,
+    root_agent=None,
+) -> dict:
+    pattern = resolve_pattern(pattern)
+    runner = Runner(
+        app_name=pattern,
+        agent=root_agent or load_root_agent(pattern),
+        session_service=InMemorySessionService(),
+    )
+    done = completed_ids(output_path)
+    queue = asyncio.Queue(maxsize=concurrency * 2)
+    counts = {"completed": 0, "failed": 0, "skipped": 0}
+
+    async def produce():
+        for request in read_requests(input_path):
+            if request["id"] in done:
+                counts["skipped"] += 1
+                continue
+            await queue.put(request)
+        for _ in range(concurrency):
+            await queue.put(None)
+
+    async def work(out):
+        while (request := await queue.get()) is not None:
+            result = await run_request(runner, request)
+            out.write(json.dumps(result, default=str) + "\n")
+            out.flush()
+            counts["failed" if result["error"] else "completed"] += 1
+
+    started = time.perf_counter()
+    with open(output_path, "a") as out:
+        await asyncio.gather(produce(), *(work(out) for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    processed = counts["completed"] + counts["failed"]
+    return {
+        **counts,
+        "elapsed_s": elapsed,
+        "requests_per_s": processed / elapsed if elapsed else 0.0,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("pattern", help="pattern directory or number, eg. 4")
+    parser.add_argument("input", help="JSONL file of refund requests")
+    parser.add_argument("output", help="JSONL file to append results to")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument(
+        "--stub-latency",
+        type=float,
+        help="use the offline StubModel with this many seconds per call",
+    )
+    args = parser.parse_args()
+
+    root_agent = None
+    if args.stub_latency is not None:
+        from shared.benchmark import SCRIPTS, install_stubs
+
+        root_agent = load_root_agent(args.pattern)
+        install_stubs(
+            root_agent, SCRIPTS[resolve_pattern(args.pattern)], args.stub_latency, []
+        )
+
+    report = asyncio.run(
+        run_batch(args.pattern, args.input, args.output, args.concurrency, root_agent)
+    )
+    print(
+        f"{report['completed']} completed, {report['failed']} failed, "
+        f"{report['skipped']} skipped in {report['elapsed_s']:.1f}s "
+        f"({report['requests_per_s']:.1f} requests/s)",
+        file=sys.stderr,
+    )
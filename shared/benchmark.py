@@ -0,0 +1,262 @@
+"""
+Offline benchmark for the five agent patterns.
+
+Runs each pattern's root_agent against StubModel (see shared.stub_model) instead of Gemini,
+so it needs no network or API key, and reports per pattern:
+- model round trips
+- prompt / completion tokens (estimated)
+- tool calls and agent transfers
+- wall-clock latency
+- critical path: the longest chain of model calls that had to run one after another
+
+--trace PATH also records per-agent / model / tool spans (see shared.instrumentation).
+
+    python -m shared.benchmark                      # all five patterns
+    python -m shared.benchmark -p 3 4 --latency 0.5 --runs 5
+    python -m shared.benchmark --json
+    python -m shared.benchmark -p 2 2:agent_tools   # transfers vs. sub-agents as tools
+
+The scripted replies below follow the happy path for DEFAULT_MESSAGE (David's insured order
+arrived melted). Agents that never reach a model call (eg. the deterministic verifier) simply
+don't show up in the counts.
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from dataclasses import asdict, dataclass
+
+from google.adk.runners import Runner
+from google.adk.sessions import InMemorySessionService
+from google.genai import types
+
+from shared.instrumentation import Tracer
+from shared.patterns import (
+    PATTERNS,
+    llm_agents,
+    load_root_agent,
+    replace_base_model,
+    resolve_pattern,
+)
+from shared.stub_model import StubModel, call, constant, say
+
+DEFAULT_MESSAGE = (
+    "Hi, I'm David. My Assorted Taffy box arrived completely melted - can I get a refund?"
+)
+
+FINAL_ANSWER = say(
+    "Thanks for reaching out, David! Your order SG001-20250501 was insured and arrived "
+    "damaged, so I've refunded the full $30.00 to your original payment method."
+)
+
+
+def transfer(agent_name: str):
+    return call("transfer_to_agent", agent_name=agent_name)
+
+
+_LOOKUP = call("get_purchase_history", purchaser="David")
+_CHECK = call("check_refund_eligible", reason="DAMAGED", shipping_method="INSURED")
+_REFUND = call("process_refund", amount=30.0, order_id="SG001-20250501")
+
+_WORKFLOW_SCRIPT = {
+    "LlmPurchaseVerifierAgent": [_LOOKUP, say("David: SG001-20250501, INSURED, $30.00")],
+    "LlmRefundPolicyApplierAgent": [_CHECK, say("TRUE")],
+    "RefundProcessorAgent": [_REFUND, FINAL_ANSWER],
+}
+
+# pattern -> agent name -> replies, in turn order.
+SCRIPTS = {
+    "1-llm-single-agent": {
+        "refundagent": [_LOOKUP, _CHECK, _REFUND, FINAL_ANSWER],
+    },
+    "2-llm-multi-agent": {
+        "Coordinator": [
+            transfer("PurchaseVerifierAgent"),
+            transfer("RefundPolicyApplierAgent"),
+            transfer("RefundProcessorAgent"),
+            FINAL_ANSWER,
+        ],
+        "PurchaseVerifierAgent": [_LOOKUP, transfer("Coordinator")],
+        "RefundPolicyApplierAgent": [_CHECK, transfer("Coordinator")],
+        "RefundProcessorAgent": [_REFUND, transfer("Coordinator")],
+    },
+    # The sub-agents reply with text instead of a transfer and only see the coordinator's
+    # request, not the whole session. The verifier and the policy applier are called in
+    # the same turn and run concurrently.
+    "2-llm-multi-agent:agent_tools": {
+        "Coordinator": [
+            [
+                call("PurchaseVerifierAgent", request="David, Assorted Taffy box"),
+                call("RefundPolicyApplierAgent", request="the box arrived melted"),
+            ],
+            call("RefundProcessorAgent", request="order SG001-20250501, amount 30.00"),
+            FINAL_ANSWER,
+        ],
+        "PurchaseVerifierAgent": [_LOOKUP, say("SG001-20250501, INSURED, $30.00")],
+        "RefundPolicyApplierAgent": [
+            call("eligible_shipping_methods", reason="DAMAGED"),
+            say("DAMAGED: eligible under INSURED, OVERNIGHT"),
+        ],
+        "RefundProcessorAgent": [_REFUND, say("Refunded $30.00 for SG001-20250501.")],
+    },
+    "3-workflow-sequential-multi-agent": _WORKFLOW_SCRIPT,
+    "4-workflow-parallel-multi-agent": {
+        **_WORKFLOW_SCRIPT,
+        "LlmRefundPolicyApplierAgent": [
+            call("check_refund_eligible", reason="DAMAGED"),
+            say("TRUE"),
+        ],
+    },
+    "5-workflow-loop-multi-agent": {
+        **_WORKFLOW_SCRIPT,
+        "RefundLoopCheckerAgent": [_REFUND, FINAL_ANSWER],
+        "RefundOfferReaderAgent": [say("NONE")],
+        "RefundLoopNegotiatorAgent": [
+            say(
+                "I can offer you a free 1/2lb box of assorted taffy, a $17.25 store "
+                "credit voucher or an $11.50 cash refund - which would work for you?"
+            )
+        ],
+    },
+}
+
+
+@dataclass
+class PatternResult:
+    pattern: str
+    runs: int
+    model_calls: float
+    prompt_tokens: float
+    completion_tokens: float
+    tool_calls: float
+    transfers: float
+    wall_ms: float
+    critical_path: float
+
+
+def critical_path(calls: list) -> int:
+    # Longest chain of model calls where each one started after the previous ended -
+    # i.e. how many model latencies a request pays end to end. Overlapping (parallel)
+    # calls only count once.
+    calls = sorted(calls, key=lambda c: c.started)
+    longest = []
+    for i, current in enumerate(calls):
+        before = [longest[j] for j in range(i) if calls[j].ended <= current.started]
+        longest.append(1 + max(before, default=0))
+    return max(longest, default=0)
+
+
+def install_stubs(root_agent, script: dict, latency, log: list, server=None) -> dict:
+    # Model wrappers (eg. shared.deadlines.HedgedModel) stay; the model they wrap is
+    # stubbed out. -> agent name -> its StubModel
+    stubs = {}
+    for agent in llm_agents(root_agent):
+        stub = StubModel(
+            agent_name=agent.name,
+            replies=script.get(agent.name, []),
+            latency=latency,
+            log=log,
+            server=server,
+        )
+        stubs[agent.name] = replace_base_model(agent, lambda model: stub)
+    return stubs
+
+
+async def run_once(runner: Runner, message: str, log: list) -> dict:
+    del log[:]
+    session = await runner.session_service.create_session(
+        app_name=runner.app_name, user_id="bench"
+    )
+    content = types.Content(role="user", parts=[types.Part(text=message)])
+    counts = {"tool_calls": 0, "transfers": 0}
+    started = time.perf_counter()
+    async for event in runner.run_async(
+        user_id="bench", session_id=session.id, new_message=content
+    ):
+        for function_call in event.get_function_calls():
+            if function_call.name == "transfer_to_agent":
+                counts["transfers"] += 1
+            else:
+                counts["tool_calls"] += 1
+    counts["wall_ms"] = (time.perf_counter() - started) * 1000
+    counts["model_calls"] = len(log)
+    counts["prompt_tokens"] = sum(c.prompt_tokens for c in log)
+    counts["completion_tokens"] = sum(c.completion_tokens for c in log)
+    counts["critical_path"] = critical_path(log)
+    return counts
+
+
+async def run_pattern(
+    pattern: str,
+    message: str = DEFAULT_MESSAGE,
+    latency=0.2,
+    runs: int = 1,
+    tracer=None,
+) -> PatternResult:
+    pattern = resolve_pattern(pattern)
+    root_agent = load_root_agent(pattern)
+    log = []
+    install_stubs(root_agent, SCRIPTS.get(pattern, {}), latency, log)
+    if tracer is not None:
+        tracer.attach(root_agent)
+    runner = Runner(
+        app_name=pattern, agent=root_agent, session_service=InMemorySessionService()
+    )
+
+    # One untimed run first, so one-off setup (tool schemas, imports) isn't measured.
+    await run_once(runner, message, log)
+    totals = {}
+    for _ in range(runs):
+        for key, value in (await run_once(runner, message, log)).items():
+            totals[key] = totals.get(key, 0) + value
+    return PatternResult(
+        pattern=pattern, runs=runs, **{k: v / runs for k, v in totals.items()}
+    )
+
+
+def format_table(results: list) -> str:
+    header = (
+        f"{'pattern':<36}{'model':>7}{'prompt':>9}{'compl.':>8}"
+        f"{'tools':>7}{'xfers':>7}{'wall ms':>10}{'crit.':>7}"
+    )
+    lines = [header, "-" * len(header)]
+    for r in results:
+        lines.append(
+            f"{r.pattern:<36}{r.model_calls:>7.1f}{r.prompt_tokens:>9.0f}"
+            f"{r.completion_tokens:>8.0f}{r.tool_calls:>7.1f}{r.transfers:>7.1f}"
+            f"{r.wall_ms:>10.1f}{r.critical_path:>7.1f}"
+        )
+    return "\n".join(lines)
+
+
+async def main(args) -> None:
+    results = []
+    tracer = Tracer() if args.trace else None
+    for pattern in args.patterns:
+        results.append(
+            await run_pattern(
+                pattern, args.message, constant(args.latency), args.runs, tracer
+            )
+        )
+    if args.json:
+        print(json.dumps([asdict(r) for r in results], indent=2))
+    else:
+        print(format_table(results))
+    if tracer is not None:
+        tracer.export_otlp_json(args.trace)
+        print()
+        print(tracer.format_summary())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("-p", "--patterns", nargs="+", default=PATTERNS)
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds per model call")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--message", default=DEFAULT_MESSAGE)
+    parser.add_argument("--json", action="store_true")
+    parser.add_argument(
+        "--trace", metavar="PATH", help="export spans as OTLP/JSON and print a latency summary"
+    )
+    asyncio.run(main(parser.parse_args()))
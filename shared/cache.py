@@ -0,0 +1,203 @@
+"""
+Opt-in LLM response cache for any ADK Agent.
+
+Many sub-agent calls are deterministic given their inputs (RefundPolicyApplierAgent given
+the same purchase history and reason, PurchaseVerifierAgent given the same name), and during
+incidents (eg. a carrier outage) we see the exact same requests over and over. Every hit
+skips a whole model call.
+
+The cache hooks in through before_model / after_model callbacks:
+
+    cache = ResponseCache(ttl=300, ttls={"RefundPolicyApplierAgent": 3600})
+    cache.attach(refund_eligibility_agent, purchase_verifier_agent)
+
+The key is the agent name + a hash of the request the model would actually see: the
+instruction AFTER {template} substitution and the contents (user message, tool calls and
+tool results). Entries are evicted LRU and expire after a per-agent TTL.
+
+Backends:
+- MemoryBackend - in-process (default)
+- SqliteBackend - a local file, so several worker processes can share one cache
+"""
+
+import hashlib
+import json
+import sqlite3
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from google.adk.agents.callback_context import CallbackContext
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+
+from shared.callbacks import add_callback
+
+
+class MemoryBackend:
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (value, expires_at)
+
+    def get(self, key: str):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at < time.time():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: str, ttl: float) -> None:
+        self._entries[key] = (value, time.time() + ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+class SqliteBackend:
+    def __init__(self, path: str, max_entries: int = 100_000):
+        self.max_entries = max_entries
+        # WAL lets several processes read while one writes.
+        self._conn = sqlite3.connect(path, timeout=5, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache ("
+            " key TEXT PRIMARY KEY, value TEXT NOT NULL,"
+            " expires_at REAL NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS llm_cache_lru ON llm_cache (last_used)"
+        )
+        self._conn.commit()
+
+    def get(self, key: str):
+        now = time.time()
+        row = self._conn.execute(
+            "SELECT value, expires_at FROM llm_cache WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        value, expires_at = row
+        with self._conn:
+            if expires_at < now:
+                self._conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                return None
+            self._conn.execute(
+                "UPDATE llm_cache SET last_used = ? WHERE key = ?", (now, key)
+            )
+        return value
+
+    def set(self, key: str, value: str, ttl: float) -> None:
+        now = time.time()
+        with self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache VALUES (?, ?, ?, ?)",
+                (key, value, now + ttl, now),
+            )
+            self._conn.execute(
+                "DELETE FROM llm_cache WHERE key IN ("
+                " SELECT key FROM llm_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    latency_saved: float = 0.0  # seconds
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+def request_key(agent_name: str, llm_request: LlmRequest) -> str:
+    config = llm_request.config
+    instruction = config.system_instruction if config else None
+    if instruction is not None and not isinstance(instruction, str):
+        instruction = json.dumps(to_json(instruction), sort_keys=True)
+    payload = json.dumps(
+        {
+            "model": llm_request.model,
+            "instruction": instruction,
+            "contents": [to_json(content) for content in llm_request.contents],
+        },
+        sort_keys=True,
+    )
+    return agent_name + ":" + hashlib.sha256(payload.encode()).hexdigest()
+
+
+def to_json(value):
+    # Pydantic models (and lists of them) -> plain JSON values, for hashing.
+    if hasattr(value, "model_dump"):
+        return value.model_dump(mode="json", exclude_none=True)
+    if isinstance(value, list):
+        return [to_json(v) for v in value]
+    return value
+
+
+class ResponseCache:
+    def __init__(self, backend=None, ttl: float = 300, ttls: dict = None):
+        self.backend = backend or MemoryBackend()
+        self.ttl = ttl
+        self.ttls = ttls or {}
+        self.stats = {}  # agent name -> CacheStats
+        self._pending = {}  # (invocation_id, agent name) -> (key, started_at)
+
+    def attach(self, *agents) -> None:
+        for agent in agents:
+            add_callback(agent, "before_model_callback", self.before_model_callback)
+            add_callback(agent, "after_model_callback", self.after_model_callback)
+
+    def totals(self) -> CacheStats:
+        total = CacheStats()
+        for stats in self.stats.values():
+            total.hits += stats.hits
+            total.misses += stats.misses
+            total.latency_saved += stats.latency_saved
+        return total
+
+    def before_model_callback(
+        self, callback_context: CallbackContext, llm_request: LlmRequest
+    ):
+        agent_name = callback_context.agent_name
+        stats = self.stats.setdefault(agent_name, CacheStats())
+        key = request_key(agent_name, llm_request)
+        cached = self.backend.get(key)
+        if cached is None:
+            stats.misses += 1
+            self._pending[(callback_context.invocation_id, agent_name)] = (
+                key,
+                time.perf_counter(),
+            )
+            return None
+
+        entry = json.loads(cached)
+        stats.hits += 1
+        stats.latency_saved += entry["latency"]
+        return LlmResponse.model_validate(entry["response"])
+
+    def after_model_callback(
+        self, callback_context: CallbackContext, llm_response: LlmResponse
+    ):
+        if llm_response.partial:
+            # Streaming chunk - wait for the final, aggregated response.
+            return None
+        agent_name = callback_context.agent_name
+        pending = self._pending.pop((callback_context.invocation_id, agent_name), None)
+        # Only cache complete, successful answers.
+        if pending is None or llm_response.error_code:
+            return None
+        key, started_at = pending
+        entry = {
+            "response": llm_response.model_dump(mode="json", exclude_none=True),
+            "latency": time.perf_counter() - started_at,
+        }
+        self.backend.set(key, json.dumps(entry), self.ttls.get(agent_name, self.ttl))
+        return None
+
@@ -0,0 +1,14 @@
+"""
+Helpers for adding ADK callbacks to agents without clobbering ones already set.
+"""
+
+
+def add_callback(agent, field: str, callback) -> None:
+    # ADK callback fields hold None, a single callable or a list of callables.
+    existing = getattr(agent, field)
+    if existing is None:
+        setattr(agent, field, callback)
+    elif isinstance(existing, list):
+        setattr(agent, field, existing + [callback])
+    else:
+        setattr(agent, field, [existing, callback])
@@ -0,0 +1,363 @@
+"""
+Record / replay for model calls, so a real conversation can be rerun offline.
+
+Record a root_agent run once against the real model, then replay it as often as needed
+with no network: each model call is answered from the cassette, at the recorded latency
+or a multiple of it (0 answers at once). Replays are deterministic, so what's left to
+measure is our own time - framework overhead, state handling, tools - and a change that
+alters behaviour shows up as a divergence instead of a different model answer.
+
+    cassette = Cassette()
+    use_cassette(root_agent, cassette, RECORD)
+    ... run the conversation ...
+    cassette.save("refund.cassette")
+
+    cassette = Cassette.load("refund.cassette")
+    use_cassette(root_agent, cassette, REPLAY, latency_scale=0.0)
+    ... run it again ...
+    print(cassette.format_divergences())
+
+Calls are keyed by agent name and a hash of the normalised request: system instruction,
+tool names and contents, with whitespace collapsed and function call ids (fresh on every
+run) left out. The same request asked again gets the next recording for that key. A
+request the cassette doesn't have - a changed prompt, a new tool, a different path through
+the agents - is a divergence: it's answered with that agent's next recording in order
+(or raises CassetteMiss with strict=True), and the report shows the first line where the
+prompt differs from that recording. Recordings never asked for are reported too.
+
+The cassette is one gzipped JSON line per call, after a header line with the user messages,
+so replay needs nothing else:
+
+    python -m shared.cassette record -p 4 -o refund.cassette    # against Gemini
+    python -m shared.cassette record -p 4 -o refund.cassette --stub-latency 0.2   # offline
+    python -m shared.cassette replay -i refund.cassette --runs 20 --scale 0
+"""
+
+import argparse
+import asyncio
+import gzip
+import hashlib
+import json
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Any, AsyncGenerator, Optional
+
+from google.adk.models.base_llm import BaseLlm
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from google.adk.runners import Runner
+from google.adk.sessions import InMemorySessionService
+from google.genai import types
+
+from shared.patterns import (
+    llm_agents,
+    load_root_agent,
+    replace_base_model,
+    resolve_pattern,
+)
+from shared.stub_model import part_text
+
+RECORD = "record"
+REPLAY = "replay"
+
+
+class CassetteMiss(LookupError):
+    pass
+
+
+def normalize_request(llm_request: LlmRequest) -> str:
+    # One line per system instruction / tool / content part, ids and whitespace dropped.
+    lines = []
+    config = llm_request.config
+    if config and config.system_instruction:
+        instruction = config.system_instruction
+        if isinstance(instruction, types.Content):
+            instruction = "\n".join(part_text(part) for part in instruction.parts or [])
+        lines.append(f"system: {' '.join(str(instruction).split())}")
+    for tool in (config.tools if config else None) or []:
+        for declaration in getattr(tool, "function_declarations", None) or []:
+            lines.append(f"tool: {declaration.name}")
+    for content in llm_request.contents:
+        for part in content.parts or []:
+            lines.append(f"{content.role}: {' '.join(part_text(part).split())}")
+    return "\n".join(lines)
+
+
+def request_key(agent_name: str, prompt: str) -> str:
+    digest = hashlib.sha256(prompt.encode()).hexdigest()[:16]
+    return f"{agent_name}:{digest}"
+
+
+@dataclass
+class Recording:
+    agent_name: str
+    key: str
+    prompt: str
+    # (seconds after the request, LlmResponse as JSON), one per response - streamed
+    # partial responses included.
+    responses: list
+
+    @property
+    def latency(self) -> float:
+        return self.responses[-1][0] if self.responses else 0.0
+
+
+@dataclass
+class Divergence:
+    agent_name: str
+    kind: str  # "miss": not in the cassette, "unused": recorded, never asked for
+    key: str
+    detail: str = ""
+
+
+@dataclass
+class Cassette:
+    pattern: str = ""  # what was recorded, for the CLI
+    messages: list = field(default_factory=list)  # the user's turns, in order
+    recordings: list = field(default_factory=list)
+    divergences: list = field(default_factory=list)
+
+    def __post_init__(self):
+        self.rewind()
+
+    def rewind(self) -> None:
+        # Makes every recording available again, for another replay.
+        self._by_key = defaultdict(list)
+        self._by_agent = defaultdict(list)
+        for recording in self.recordings:
+            self._by_key[recording.key].append(recording)
+            self._by_agent[recording.agent_name].append(recording)
+        self._used = set()
+        self.divergences = []
+
+    def add(self, recording: Recording) -> None:
+        self.recordings.append(recording)
+        self._by_key[recording.key].append(recording)
+        self._by_agent[recording.agent_name].append(recording)
+
+    def _next_unused(self, recordings: list) -> Optional[Recording]:
+        return next((r for r in recordings if id(r) not in self._used), None)
+
+    def lookup(self, agent_name: str, prompt: str, strict: bool = False) -> Recording:
+        key = request_key(agent_name, prompt)
+        recording = self._next_unused(self._by_key.get(key, ()))
+        if recording is None:
+            nearest = self._next_unused(self._by_agent.get(agent_name, ()))
+            detail = _first_difference(nearest.prompt, prompt) if nearest else ""
+            self.divergences.append(Divergence(agent_name, "miss", key, detail))
+            if strict or nearest is None:
+                raise CassetteMiss(f"No recording for {agent_name} ({key}). {detail}")
+            recording = nearest
+        self._used.add(id(recording))
+        return recording
+
+    def finish(self) -> list:
+        # Adds a divergence for every recording no request asked for; -> divergences.
+        for recording in self.recordings:
+            if id(recording) not in self._used:
+                self.divergences.append(
+                    Divergence(recording.agent_name, "unused", recording.key)
+                )
+                self._used.add(id(recording))
+        return self.divergences
+
+    def format_divergences(self) -> str:
+        if not self.divergences:
+            return "No divergences - every model call matched the cassette."
+        lines = [f"{len(self.divergences)} divergences:"]
+        for divergence in self.divergences:
+            line = f"  {divergence.kind:<7}{divergence.agent_name:<32}{divergence.key}"
+            lines.append(line)
+            if divergence.detail:
+                lines.append(f"         {divergence.detail}")
+        return "\n".join(lines)
+
+    def save(self, path: str) -> None:
+        with gzip.open(path, "wt", encoding="utf-8") as out:
+            header = {"pattern": self.pattern, "messages": self.messages}
+            out.write(json.dumps(header) + "\n")
+            for r in self.recordings:
+                row = [r.agent_name, r.key, r.prompt, r.responses]
+                out.write(json.dumps(row, separators=(",", ":")) + "\n")
+
+    @classmethod
+    def load(cls, path: str) -> "Cassette":
+        with gzip.open(path, "rt", encoding="utf-8") as lines:
+            header = json.loads(next(lines))
+            recordings = [Recording(*json.loads(line)) for line in lines]
+        return cls(header["pattern"], header["messages"], recordings)
+
+
+def _first_difference(recorded: str, requested: str) -> str:
+    recorded_lines, requested_lines = recorded.splitlines(), requested.splitlines()
+    for i, (was, now) in enumerate(zip(recorded_lines, requested_lines)):
+        if was != now:
+            # Shown from just before the first character that differs.
+            start = next(
+                (j for j, (a, b) in enumerate(zip(was, now)) if a != b),
+                min(len(was), len(now)),
+            )
+            start = max(0, start - 20)
+            return (
+                f"line {i + 1}: recorded {was[start:start + 60]!r}"
+                f", now {now[start:start + 60]!r}"
+            )
+    if len(recorded_lines) != len(requested_lines):
+        return f"recorded {len(recorded_lines)} lines, now {len(requested_lines)}"
+    return ""
+
+
+class CassetteModel(BaseLlm):
+    agent_name: str
+    # Typed Any so pydantic doesn't copy it - every agent's model shares one cassette.
+    cassette: Any
+    mode: str = REPLAY
+    inner: Optional[BaseLlm] = None  # the real model, for RECORD
+    latency_scale: float = 1.0  # REPLAY at the recorded latency times this
+    strict: bool = False  # REPLAY raises CassetteMiss instead of answering in order
+
+    async def generate_content_async(
+        self, llm_request: LlmRequest, stream: bool = False
+    ) -> AsyncGenerator[LlmResponse, None]:
+        prompt = normalize_request(llm_request)
+        if self.mode == RECORD:
+            started = time.perf_counter()
+            recorded = []
+            responses = self.inner.generate_content_async(llm_request, stream)
+            async for response in responses:
+                # Dumped before ADK adds its function call ids to the response.
+                dumped = response.model_dump(mode="json", exclude_none=True)
+                recorded.append([time.perf_counter() - started, dumped])
+                yield response
+            key = request_key(self.agent_name, prompt)
+            self.cassette.add(Recording(self.agent_name, key, prompt, recorded))
+            return
+
+        recording = self.cassette.lookup(self.agent_name, prompt, self.strict)
+        started = time.perf_counter()
+        for offset, dumped in recording.responses:
+            delay = started + offset * self.latency_scale - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            yield LlmResponse.model_validate(dumped)
+
+
+def use_cassette(
+    root_agent,
+    cassette: Cassette,
+    mode: str,
+    latency_scale: float = 1.0,
+    strict: bool = False,
+) -> list:
+    # Puts a CassetteModel in place of the model of every LLM agent under root_agent,
+    # under any model wrappers (eg. HedgedModel) so they run as usual. -> the models
+    models = []
+    for agent in llm_agents(root_agent):
+        models.append(
+            replace_base_model(
+                agent,
+                lambda model, name=agent.name: CassetteModel(
+                    model=model.model,
+                    agent_name=name,
+                    cassette=cassette,
+                    mode=mode,
+                    inner=model if mode == RECORD else None,
+                    latency_scale=latency_scale,
+                    strict=strict,
+                ),
+            )
+        )
+    return models
+
+
+async def run_conversation(root_agent, messages: list) -> float:
+    # Sends the messages as one session's turns; -> wall seconds.
+    runner = Runner(
+        app_name="cassette", agent=root_agent, session_service=InMemorySessionService()
+    )
+    session = await runner.session_service.create_session(
+        app_name="cassette", user_id="cassette"
+    )
+    started = time.perf_counter()
+    for message in messages:
+        content = types.Content(role="user", parts=[types.Part(text=message)])
+        async for _ in runner.run_async(
+            user_id="cassette", session_id=session.id, new_message=content
+        ):
+            pass
+    return time.perf_counter() - started
+
+
+async def record(args) -> None:
+    from shared.benchmark import DEFAULT_MESSAGE, SCRIPTS, install_stubs
+    from shared.stub_model import constant
+
+    pattern = resolve_pattern(args.pattern)
+    root_agent = load_root_agent(pattern)
+    if args.stub_latency is not None:
+        latency = constant(args.stub_latency)
+        install_stubs(root_agent, SCRIPTS.get(pattern, {}), latency, [])
+    cassette = Cassette(pattern, args.message or [DEFAULT_MESSAGE])
+    use_cassette(root_agent, cassette, RECORD)
+    seconds = await run_conversation(root_agent, cassette.messages)
+    cassette.save(args.output)
+    print(
+        f"Recorded {len(cassette.recordings)} model calls from {pattern} "
+        f"({seconds * 1000:.0f}ms) to {args.output}"
+    )
+
+
+async def replay(args) -> None:
+    cassette = Cassette.load(args.input)
+    root_agent = load_root_agent(cassette.pattern)
+    use_cassette(root_agent, cassette, REPLAY, args.scale, args.strict)
+    model_s = sum(r.latency for r in cassette.recordings) * args.scale
+    walls, divergences = [], []
+    for _ in range(args.runs):
+        cassette.rewind()
+        walls.append(await run_conversation(root_agent, cassette.messages))
+        divergences = cassette.finish()
+    walls.sort()
+    print(
+        f"{cassette.pattern}: {len(cassette.messages)} turns, "
+        f"{len(cassette.recordings)} recorded model calls, {args.runs} replays "
+        f"at {args.scale:g}x recorded latency"
+    )
+    print(
+        f"  wall p50 {walls[len(walls) // 2] * 1000:.1f}ms"
+        f", max {walls[-1] * 1000:.1f}ms"
+        f", model calls (summed) {model_s * 1000:.1f}ms"
+    )
+    print(cassette.format_divergences())
+    if divergences:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    record_parser = commands.add_parser(
+        "record", help="run a pattern, record its model calls"
+    )
+    record_parser.add_argument("-p", "--pattern", required=True)
+    record_parser.add_argument("-o", "--output", required=True)
+    record_parser.add_argument(
+        "-m", "--message", action="append", help="a user turn (repeat for more)"
+    )
+    record_parser.add_argument(
+        "--stub-latency",
+        type=float,
+        help="record the benchmark's StubModels instead of Gemini (offline)",
+    )
+    replay_parser = commands.add_parser("replay", help="rerun a cassette offline")
+    replay_parser.add_argument("-i", "--input", required=True)
+    replay_parser.add_argument("--runs", type=int, default=1)
+    replay_parser.add_argument(
+        "--scale", type=float, default=1.0, help="times the recorded latency, 0: none"
+    )
+    replay_parser.add_argument(
+        "--strict", action="store_true", help="stop at the first divergence"
+    )
+    args = parser.parse_args()
+    asyncio.run(record(args) if args.command == "record" else replay(args))
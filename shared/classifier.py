@@ -0,0 +1,160 @@
+"""
+Fast-path refund reason classifier for the workflow patterns (3, 4 and 5).
+
+RefundPolicyApplierAgent spends a model call mapping the customer's free-text reason onto
+DAMAGED / LATE / LOST / OTHER before calling check_refund_eligible. Most messages say it
+outright ("melted", "never arrived", "stolen", "late"), so ReasonClassifierAgent matches
+them against one compiled regex, calls the pattern's own check_refund_eligible and writes
+the result to state itself. Only low-confidence messages are handed to the LLM agent
+(its only sub-agent).
+
+`stats` counts fast-path hits vs. LLM fallbacks - every hit is one model call saved.
+"""
+
+import re
+from dataclasses import dataclass
+from typing import AsyncGenerator, Callable
+
+from google.adk.agents import BaseAgent
+from google.adk.agents.invocation_context import InvocationContext
+from google.adk.events import Event, EventActions
+from pydantic import Field
+
+from shared.verifier import user_message_text
+
+# reason -> [(regex, weight)]. Weight is how sure a single match makes us.
+REASON_RULES = {
+    "DAMAGED": [
+        (r"\bmelt(?:ed|ing|s)?\b", 0.95),
+        (r"\bdamaged?\b", 0.95),
+        (r"\b(?:broken|crushed|smashed|squashed|ruined)\b", 0.9),
+        (r"\b(?:box|package|bag) (?:was |came )?(?:open|opened|torn|ripped)\b", 0.85),
+        (r"\bsticky mess\b", 0.8),
+    ],
+    "LOST": [
+        (r"\bnever (?:arrived|came|showed up|got here|received|got it)\b", 0.95),
+        (r"\b(?:didn't|did not|hasn't|has not|never) (?:arrive|come|show up)\b", 0.9),
+        (r"\bstolen\b", 0.95),
+        (r"\bporch pirate", 0.9),
+        (r"\b(?:lost|missing)\b", 0.85),
+    ],
+    "LATE": [
+        (r"\b(?:late|delayed)\b", 0.9),
+        (r"\btook (?:too long|forever|weeks)\b", 0.85),
+        (r"\barrived after\b", 0.8),
+    ],
+}
+
+OTHER = "OTHER"
+
+
+class ReasonClassifier:
+    def __init__(self, rules: dict = REASON_RULES):
+        # All patterns go into one alternation, so a message is scanned once no matter
+        # how many rules there are. Group rN maps back to rule N.
+        self._rules = []
+        groups = []
+        for reason, patterns in rules.items():
+            for pattern, weight in patterns:
+                groups.append(f"(?P<r{len(self._rules)}>{pattern})")
+                self._rules.append((reason, weight))
+        self._regex = re.compile("|".join(groups), re.IGNORECASE)
+
+    def classify(self, text: str) -> tuple:
+        # Returns (reason, confidence). Several matches for one reason reinforce each other;
+        # matches for competing reasons cut the confidence down.
+        scores = {}
+        for match in self._regex.finditer(text):
+            reason, weight = self._rules[int(match.lastgroup[1:])]
+            scores[reason] = 1 - (1 - scores.get(reason, 0.0)) * (1 - weight)
+        if not scores:
+            return OTHER, 0.0
+        ranked = sorted(scores.items(), key=lambda kv: kv[1], reverse=True)
+        reason, best = ranked[0]
+        runner_up = ranked[1][1] if len(ranked) > 1 else 0.0
+        return reason, best * (1 - runner_up)
+
+
+@dataclass
+class ClassifierStats:
+    hits: int = 0
+    fallbacks: int = 0
+
+    @property
+    def total(self) -> int:
+        return self.hits + self.fallbacks
+
+    @property
+    def hit_rate(self) -> float:
+        return self.hits / self.total if self.total else 0.0
+
+    @property
+    def model_calls_saved(self) -> int:
+        return self.hits
+
+
+def shipping_method_from_state(state):
+    # Only usable when the purchase verifier wrote structured history (see shared.verifier)
+    # and every order went out the same way. Anything else is the LLM's job.
+    history = state.get("purchase_history")
+    if not isinstance(history, list) or not history:
+        return None
+    methods = {purchase["shipping_method"] for purchase in history}
+    if len(methods) != 1:
+        return None
+    return methods.pop()
+
+
+class ReasonClassifierAgent(BaseAgent):
+    check_eligible: Callable
+    output_key: str = "is_refund_eligible"
+    # Pattern 4's check_refund_eligible only takes the reason.
+    needs_shipping_method: bool = True
+    min_confidence: float = 0.8
+    classifier: ReasonClassifier = Field(default_factory=ReasonClassifier)
+    stats: ClassifierStats = Field(default_factory=ClassifierStats)
+
+    # State keys this agent reads / writes itself (see shared.planner).
+    def state_reads(self) -> set:
+        if self.needs_shipping_method:
+            return {"refund_reason", "purchase_history"}
+        return {"refund_reason"}
+
+    def state_writes(self) -> set:
+        return {"refund_reason", self.output_key}
+
+    def _decide(self, ctx: InvocationContext):
+        state = ctx.session.state
+        reason, confidence = self.classifier.classify(user_message_text(ctx))
+        if confidence < self.min_confidence:
+            # Later turns ("no thanks", "ok!") don't restate the reason - reuse ours.
+            reason = state.get("refund_reason")
+            if reason is None:
+                return None
+
+        if not self.needs_shipping_method:
+            return reason, self.check_eligible(reason)
+        shipping_method = shipping_method_from_state(state)
+        if shipping_method is None:
+            return None
+        return reason, self.check_eligible(reason, shipping_method)
+
+    async def _run_async_impl(
+        self, ctx: InvocationContext
+    ) -> AsyncGenerator[Event, None]:
+        decision = self._decide(ctx)
+        if decision is None:
+            self.stats.fallbacks += 1
+            for fallback in self.sub_agents:
+                async for event in fallback.run_async(ctx):
+                    yield event
+            return
+
+        self.stats.hits += 1
+        reason, eligible = decision
+        yield Event(
+            author=self.name,
+            actions=EventActions(
+                state_delta={"refund_reason": reason, self.output_key: eligible}
+            ),
+        )
@@ -0,0 +1,218 @@
+"""
+Per-agent history compaction, so prompts stay flat over long sessions.
+
+By default every LLM agent gets the whole session replayed on every call: each customer
+message, every other agent's replies and tool calls, every earlier offer. In the
+negotiation loop that grows with every round. A HistoryPolicy trims what one agent sees:
+
+- window: keep only the last N customer turns in full (the current one included)
+- authors: other agents whose messages are kept; others' messages are dropped
+  (None keeps everyone, set() keeps only the customer and the agent itself)
+- summary_key: instead of dropping older turns outright, summarise them (customer message
+  and last reply per turn) into state[summary_key] and send that summary in their place
+
+    history_compactor = HistoryCompactor(
+        {"RefundOfferReaderAgent": HistoryPolicy(window=1, authors=set())}
+    )
+    history_compactor.attach(root_agent)
+
+Anything that isn't a customer message or another agent's message - the agent's own calls
+and tool results within a kept turn, ADK's dynamic instruction - is left where it is.
+history_compactor.log records prompt tokens per model call, before and after compaction.
+
+    python -m shared.compaction     # tokens per turn over a full pattern 5 negotiation
+"""
+
+import asyncio
+import re
+from dataclasses import dataclass
+from typing import Optional
+
+from google.adk.agents.callback_context import CallbackContext
+from google.adk.models.llm_request import LlmRequest
+from google.adk.runners import Runner
+from google.adk.sessions import InMemorySessionService
+from google.genai import types
+
+from shared.callbacks import add_callback
+from shared.patterns import llm_agents, load_pattern
+from shared.stub_model import estimate_tokens, part_text, request_text
+
+# ADK presents other agents' messages as user content, one "[AgentName] said: ..." (or
+# "called tool", ...) part per original part.
+OTHER_AGENT_RE = re.compile(r"^\[([^\]\n]+)\] ")
+
+SUMMARY_CHARS = 160  # per message kept in a summary
+
+
+@dataclass
+class HistoryPolicy:
+    window: Optional[int] = None
+    authors: Optional[set] = None
+    summary_key: Optional[str] = None
+
+
+@dataclass
+class CompactedCall:
+    invocation_id: str
+    agent_name: str
+    tokens_before: int
+    tokens_after: int
+
+
+def content_text(content: types.Content) -> str:
+    return "\n".join(part_text(part) for part in content.parts or []).strip()
+
+
+def other_agent(content: types.Content, agent_names: set) -> Optional[str]:
+    if content.role != "user":
+        return None
+    for part in content.parts or []:
+        match = OTHER_AGENT_RE.match(part.text or "")
+        if match and match.group(1) in agent_names:
+            return match.group(1)
+    return None
+
+
+def _shorten(text: str) -> str:
+    text = " ".join(text.split())
+    return text if len(text) <= SUMMARY_CHARS else text[:SUMMARY_CHARS] + "..."
+
+
+def summarize_turns(turns: list) -> str:
+    # One line for the customer's message and one for the last reply, per turn.
+    lines = []
+    for user_message, replies in turns:
+        lines.append(f"- Customer: {_shorten(user_message)}")
+        if replies:
+            lines.append(f"  Reply: {_shorten(replies[-1])}")
+    return "\n".join(lines)
+
+
+class HistoryCompactor:
+    def __init__(self, policies: dict):
+        self.policies = policies  # agent name -> HistoryPolicy
+        self.log = []  # CompactedCall per model call
+
+    def attach(self, root_agent) -> None:
+        for agent in llm_agents(root_agent):
+            if agent.name in self.policies:
+                add_callback(agent, "before_model_callback", self.before_model_callback)
+
+    def before_model_callback(
+        self, callback_context: CallbackContext, llm_request: LlmRequest
+    ):
+        agent_name = callback_context.agent_name
+        policy = self.policies[agent_name]
+        tokens_before = estimate_tokens(request_text(llm_request))
+        events = callback_context.session.events
+        user_messages = set()
+        agent_names = set()
+        for event in events:
+            if event.author == "user":
+                if event.content:
+                    user_messages.add(content_text(event.content))
+            else:
+                agent_names.add(event.author)
+        agent_names.discard(agent_name)
+
+        contents = llm_request.contents
+        if policy.authors is not None:
+            contents = [
+                c
+                for c in contents
+                if other_agent(c, agent_names) in (None, *policy.authors)
+            ]
+
+        starts = [
+            i
+            for i, c in enumerate(contents)
+            if c.role == "user" and content_text(c) in user_messages
+        ]
+        if policy.window is not None and len(starts) > policy.window:
+            cut = starts[-policy.window]
+            older, contents = contents[:cut], contents[cut:]
+            pinned, turns = [], []
+            for content in older:
+                if content.role == "user" and content_text(content) in user_messages:
+                    turns.append((content_text(content), []))
+                elif content.role == "model" or other_agent(content, agent_names):
+                    text = "\n".join(p.text for p in content.parts or [] if p.text)
+                    if turns and text.strip():
+                        turns[-1][1].append(text)
+                elif not any(p.function_response for p in content.parts or []):
+                    pinned.append(content)  # eg. ADK's dynamic instruction
+            if policy.summary_key and turns:
+                summary = summarize_turns(turns)
+                callback_context.state[policy.summary_key] = summary
+                pinned.insert(
+                    0,
+                    types.Content(
+                        role="user",
+                        parts=[
+                            types.Part(
+                                text=f"Summary of the earlier conversation:\n{summary}"
+                            )
+                        ],
+                    ),
+                )
+            contents = pinned + contents
+
+        llm_request.contents = contents
+        self.log.append(
+            CompactedCall(
+                invocation_id=callback_context.invocation_id,
+                agent_name=agent_name,
+                tokens_before=tokens_before,
+                tokens_after=estimate_tokens(request_text(llm_request)),
+            )
+        )
+        return None
+
+
+NEGOTIATION = [
+    "Hi, I'm Alexis. My Watermelon Taffy never arrived, I'd like a refund please.",
+    "No thanks, I'd really rather have my money back.",
+    "That's still not what I asked for. Can't you just refund me?",
+    "No. Half isn't good enough either.",
+]
+
+
+async def send(runner: Runner, session_id: str, message: str) -> None:
+    content = types.Content(role="user", parts=[types.Part(text=message)])
+    async for _ in runner.run_async(
+        user_id="bench", session_id=session_id, new_message=content
+    ):
+        pass
+
+
+async def main() -> None:
+    from shared.benchmark import SCRIPTS, install_stubs
+
+    pattern = "5-workflow-loop-multi-agent"
+    module = load_pattern(pattern)
+    # One offer per turn: the longest negotiation the loop allows.
+    module.refund_loop_controller.offers_per_turn = 1
+    install_stubs(module.root_agent, SCRIPTS[pattern], lambda: 0.0, [])
+    runner = Runner(
+        app_name=pattern,
+        agent=module.root_agent,
+        session_service=InMemorySessionService(),
+    )
+    session = await runner.session_service.create_session(
+        app_name=pattern, user_id="bench"
+    )
+    compactor = module.history_compactor
+    print(f"{'turn':<6}{'agent':<32}{'full':>8}{'compacted':>11}")
+    for turn, message in enumerate(NEGOTIATION, 1):
+        del compactor.log[:]
+        await send(runner, session.id, message)
+        for call in compactor.log:
+            print(
+                f"{turn:<6}{call.agent_name:<32}{call.tokens_before:>8}"
+                f"{call.tokens_after:>11}"
+            )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
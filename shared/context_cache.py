@@ -0,0 +1,211 @@
+"""
+Static / dynamic instruction split, and an offline model of prompt-prefix caching.
+
+Providers cache a request's longest previously-seen prefix (system instruction, tool
+declarations, then the conversation) and bill it at a discount. Our instructions had state
+values such as {purchase_history} substituted into the middle of them, so the very first
+part of every request changed from session to session and nothing after it could be reused.
+
+split_instructions() keeps all of an agent's instruction text as its static_instruction, with
+each {placeholder} swapped for a pointer to where its value is ("[purchase_history, below]"),
+and moves only the values into a small dynamic suffix:
+
+    split_instructions(root_agent)
+
+ADK sends static_instruction literally as the system instruction, and the (still templated)
+instruction as a short user message at the end of the contents.
+
+ContextCache models prefix caching locally, so cache-hit token counts can be measured
+offline. It records the cumulative prefixes of every request it sees (in a shared.cache
+backend - MemoryBackend by default) and counts how many prompt tokens of each request were
+already cached:
+
+    context_cache = ContextCache(ttl=3600)
+    context_cache.attach(*llm_agents(root_agent))
+    ...
+    context_cache.totals().hit_rate
+
+    python -m shared.context_cache -p 3 4 5    # cache hits for a new customer's session
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import re
+from dataclasses import dataclass
+
+from google.adk.agents.callback_context import CallbackContext
+from google.adk.models.llm_request import LlmRequest
+from google.adk.runners import Runner
+from google.adk.sessions import InMemorySessionService
+
+from shared.cache import MemoryBackend, to_json
+from shared.callbacks import add_callback
+from shared.patterns import PATTERNS, llm_agents, load_root_agent, resolve_pattern
+from shared.projection import PLACEHOLDER_RE, ProjectedInstruction
+from shared.stub_model import constant, estimate_tokens, part_text
+
+
+def split_instruction(template: str) -> tuple:
+    # -> (static, dynamic). The text stays in the static part, in place, so a placeholder
+    # keeps its lead-in; the dynamic part only labels and holds the values, once each.
+    placeholders = {}  # name -> placeholder as written, eg. "{refund_reason?}"
+
+    def refer(match: re.Match) -> str:
+        placeholders.setdefault(match.group(1), match.group())
+        return f"[{match.group(1)}, below]"
+
+    static = PLACEHOLDER_RE.sub(refer, template.strip())
+    dynamic = "\n\n".join(
+        f"{name}:\n{placeholder}" for name, placeholder in placeholders.items()
+    )
+    return static, dynamic
+
+
+def split_instructions(root_agent) -> list:
+    # Splits every templated instruction under root_agent; returns the names of the agents
+    # that changed. Agents that already have a static_instruction are left alone.
+    split = []
+    for agent in llm_agents(root_agent):
+        instruction = agent.instruction
+        if agent.static_instruction is not None:
+            continue
+        if isinstance(instruction, ProjectedInstruction):
+            template = instruction.template
+        elif isinstance(instruction, str):
+            template = instruction
+        else:
+            continue
+        static, dynamic = split_instruction(template)
+        if not static or not dynamic:
+            continue
+        agent.static_instruction = static
+        if isinstance(instruction, ProjectedInstruction):
+            agent.instruction = ProjectedInstruction(
+                dynamic, instruction.max_tokens, **instruction.renderers
+            )
+        else:
+            agent.instruction = dynamic
+        split.append(agent.name)
+    return split
+
+
+def prefix_segments(llm_request: LlmRequest) -> list:
+    # [(key, tokens)] for each cumulative prefix of the request: model + system instruction +
+    # tools first, then one more content at a time.
+    config = llm_request.config
+    head = json.dumps(
+        {
+            "model": llm_request.model,
+            "instruction": to_json(config.system_instruction) if config else None,
+            "tools": to_json(config.tools) if config and config.tools else None,
+        },
+        sort_keys=True,
+    )
+    digest = hashlib.sha256(head.encode())
+    tokens = estimate_tokens(head)
+    segments = [(digest.hexdigest(), tokens)]
+    for content in llm_request.contents:
+        text = "\n".join(part_text(part) for part in content.parts or [])
+        digest.update(f"\x00{content.role}\x00{text}".encode())
+        tokens += estimate_tokens(text)
+        segments.append((digest.hexdigest(), tokens))
+    return segments
+
+
+@dataclass
+class ContextCacheStats:
+    requests: int = 0
+    prompt_tokens: int = 0
+    cached_tokens: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        # Share of prompt tokens that came out of the cache.
+        return self.cached_tokens / self.prompt_tokens if self.prompt_tokens else 0.0
+
+
+class ContextCache:
+    def __init__(self, backend=None, ttl: float = 3600, min_tokens: int = 0):
+        self.backend = backend or MemoryBackend(max_entries=100_000)
+        self.ttl = ttl
+        # Providers only cache prefixes above a minimum size (eg. 1024 tokens for Gemini).
+        self.min_tokens = min_tokens
+        self.stats = {}  # agent name -> ContextCacheStats
+
+    def attach(self, *agents) -> None:
+        for agent in agents:
+            add_callback(agent, "before_model_callback", self.before_model_callback)
+
+    def totals(self) -> ContextCacheStats:
+        total = ContextCacheStats()
+        for stats in self.stats.values():
+            total.requests += stats.requests
+            total.prompt_tokens += stats.prompt_tokens
+            total.cached_tokens += stats.cached_tokens
+        return total
+
+    def cached_tokens(self, segments: list) -> int:
+        for key, tokens in reversed(segments):
+            if self.backend.get(key) is not None:
+                return tokens
+        return 0
+
+    def before_model_callback(
+        self, callback_context: CallbackContext, llm_request: LlmRequest
+    ):
+        segments = prefix_segments(llm_request)
+        stats = self.stats.setdefault(callback_context.agent_name, ContextCacheStats())
+        stats.requests += 1
+        stats.prompt_tokens += segments[-1][1]
+        stats.cached_tokens += self.cached_tokens(segments)
+        for key, tokens in segments:
+            if tokens >= self.min_tokens:
+                self.backend.set(key, "1", self.ttl)
+        return None
+
+
+# The first session warms the cache, the second is measured: a different customer, so only
+# what's shared across sessions (the static prefix) can come out of the cache.
+MESSAGES = [
+    "Hi, I'm David. My Assorted Taffy box arrived completely melted - can I get a refund?",
+    "Hi, I'm Alexis. My Watermelon Taffy never arrived, I'd like a refund please.",
+]
+
+
+async def measure(pattern: str, latency: float = 0.0) -> ContextCacheStats:
+    from shared.benchmark import SCRIPTS, install_stubs, run_once
+
+    root_agent = load_root_agent(pattern)
+    log = []
+    install_stubs(root_agent, SCRIPTS.get(pattern, {}), constant(latency), log)
+    context_cache = ContextCache()
+    context_cache.attach(*llm_agents(root_agent))
+    runner = Runner(
+        app_name=pattern, agent=root_agent, session_service=InMemorySessionService()
+    )
+    warm_up, *measured = MESSAGES
+    await run_once(runner, warm_up, log)
+    context_cache.stats.clear()
+    for message in measured:
+        await run_once(runner, message, log)
+    return context_cache.totals()
+
+
+async def main(args) -> None:
+    print(f"{'pattern':<36}{'requests':>9}{'prompt':>9}{'cached':>9}{'hit %':>7}")
+    for name in args.patterns:
+        pattern = resolve_pattern(name)
+        stats = await measure(pattern, args.latency)
+        print(
+            f"{pattern:<36}{stats.requests:>9}{stats.prompt_tokens:>9}"
+            f"{stats.cached_tokens:>9}{stats.hit_rate * 100:>7.1f}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("-p", "--patterns", nargs="+", default=PATTERNS)
+    parser.add_argument("--latency", type=float, default=0.0, help="stub seconds per call")
+    asyncio.run(main(parser.parse_args()))
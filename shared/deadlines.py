@@ -0,0 +1,418 @@
+"""
+Per-agent latency budgets with deterministic fallbacks, and hedged model requests.
+
+Model tail latency sets our p99: pattern 4's ParallelAgent waits for its slowest branch, and
+every slow call in pattern 5's loop adds up. Two tools, usable together:
+
+HedgedModel wraps an agent's model. Once a call has run longer than the `percentile`-th
+percentile of that agent's recent calls, it sends the same request again and takes whichever
+answer arrives first (the other is cancelled) - so at most 1 - percentile/100 of calls cost a
+second request:
+
+    hedge_models(root_agent, percentile=95)
+
+DeadlineAgent runs one agent (typically an LLM fallback) under a budget. If the agent hasn't
+finished in time, it's cancelled and a deterministic fallback answers in its place - the
+rule-based eligibility result, the templated decline, a templated offer - writing the same
+state keys:
+
+    DeadlineAgent(
+        name="LlmRefundPolicyApplierDeadline",
+        budget=2.0,
+        fallback=eligibility_fallback(check_refund_eligible, "is_refund_eligible"),
+        sub_agents=[llm_refund_eligibility_agent],
+    )
+
+A fallback takes the InvocationContext and returns (reply text or None, state delta).
+Both keep stats, and `enabled` switches them off for comparisons:
+
+    python -m shared.deadlines -p 4 5 --sessions 300 --latency 0.2 --sigma 1.0
+"""
+
+import argparse
+import asyncio
+import contextlib
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, AsyncGenerator, Callable, Optional
+
+from google.adk.agents import BaseAgent
+from google.adk.agents.invocation_context import InvocationContext
+from google.adk.events import Event, EventActions
+from google.adk.models.base_llm import BaseLlm
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from google.adk.utils.context_utils import Aclosing
+from google.genai import types
+from pydantic import Field
+
+from shared.classifier import ReasonClassifier, shipping_method_from_state
+from shared.gate import decline_message, known_rejection
+from shared.patterns import (
+    PATTERNS,
+    llm_agents,
+    load_root_agent,
+    resolve_pattern,
+    walk_agents,
+)
+from shared.verifier import find_purchaser, user_message_text
+
+
+@dataclass
+class HedgeStats:
+    requests: int = 0
+    hedged: int = 0  # requests that got a second copy
+    hedge_wins: int = 0  # ... where the second copy answered first
+
+
+class HedgedModel(BaseLlm):
+    inner: BaseLlm
+    percentile: float = 95.0
+    # Observed latencies needed before hedging starts; until then calls aren't hedged.
+    min_samples: int = 20
+    enabled: bool = True
+    latencies: Any = Field(default_factory=lambda: deque(maxlen=500))
+    stats: HedgeStats = Field(default_factory=HedgeStats)
+
+    def hedge_after(self) -> Optional[float]:
+        if not self.enabled or len(self.latencies) < self.min_samples:
+            return None
+        latencies = sorted(self.latencies)
+        index = int(len(latencies) * self.percentile / 100)
+        return latencies[min(len(latencies) - 1, index)]
+
+    async def _complete(self, llm_request: LlmRequest) -> tuple:
+        # -> (responses, seconds). Hedging needs whole answers, so this doesn't stream.
+        started = time.perf_counter()
+        responses = [
+            response
+            async for response in self.inner.generate_content_async(llm_request)
+        ]
+        return responses, time.perf_counter() - started
+
+    async def generate_content_async(
+        self, llm_request: LlmRequest, stream: bool = False
+    ) -> AsyncGenerator[LlmResponse, None]:
+        if stream:
+            async for response in self.inner.generate_content_async(llm_request, True):
+                yield response
+            return
+        self.stats.requests += 1
+        primary = asyncio.ensure_future(self._complete(llm_request))
+        pending = {primary}
+        delay = self.hedge_after()
+        if delay is not None:
+            done, _ = await asyncio.wait(pending, timeout=delay)
+            if not done:
+                self.stats.hedged += 1
+                pending.add(
+                    asyncio.ensure_future(
+                        self._complete(llm_request.model_copy(deep=True))
+                    )
+                )
+        try:
+            while True:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                # Take the first copy that succeeded; an error only counts once both failed.
+                finished = [task for task in done if task.exception() is None]
+                if finished or not pending:
+                    winner = finished[0] if finished else done.pop()
+                    break
+        finally:
+            for task in pending:
+                task.cancel()
+        responses, seconds = winner.result()
+        self.latencies.append(seconds)
+        if winner is not primary:
+            self.stats.hedge_wins += 1
+        for response in responses:
+            yield response
+
+
+def hedge_models(root_agent, percentile: float = 95.0, min_samples: int = 20) -> list:
+    # Wraps the model of every LLM agent under root_agent; returns the HedgedModels.
+    hedged = []
+    for agent in llm_agents(root_agent):
+        if isinstance(agent.model, HedgedModel):
+            continue
+        agent.model = HedgedModel(
+            model=agent.canonical_model.model,
+            inner=agent.canonical_model,
+            percentile=percentile,
+            min_samples=min_samples,
+        )
+        hedged.append(agent.model)
+    return hedged
+
+
+@dataclass
+class DeadlineStats:
+    runs: int = 0
+    missed: int = 0  # answered by the fallback
+
+
+class DeadlineAgent(BaseAgent):
+    budget: Optional[float] = None  # seconds; None never times out
+    fallback: Callable
+    enabled: bool = True
+    stats: DeadlineStats = Field(default_factory=DeadlineStats)
+
+    async def _run_async_impl(
+        self, ctx: InvocationContext
+    ) -> AsyncGenerator[Event, None]:
+        (agent,) = self.sub_agents
+        self.stats.runs += 1
+        if not self.enabled or self.budget is None:
+            async with Aclosing(agent.run_async(ctx)) as agen:
+                async for event in agen:
+                    yield event
+            return
+
+        # The agent runs in its own task so it can be cancelled; like ParallelAgent, it
+        # waits for each event to be consumed before going on.
+        done = object()
+        queue = asyncio.Queue()
+
+        async def run_agent():
+            try:
+                async with Aclosing(agent.run_async(ctx)) as agen:
+                    async for event in agen:
+                        resume = asyncio.Event()
+                        await queue.put((event, resume))
+                        await resume.wait()
+            finally:
+                queue.put_nowait((done, None))
+
+        task = asyncio.ensure_future(run_agent())
+        deadline = time.perf_counter() + self.budget
+        streaming = False  # partials of a message went out, its final copy hasn't
+        try:
+            while True:
+                remaining = deadline - time.perf_counter()
+                try:
+                    event, resume = await asyncio.wait_for(
+                        queue.get(), max(0, remaining)
+                    )
+                except asyncio.TimeoutError:
+                    break
+                if event is done:
+                    task.result()  # re-raises the agent's error, if any
+                    return
+                if event.content:
+                    streaming = bool(event.partial)
+                yield event
+                resume.set()
+        finally:
+            if not task.done():
+                task.cancel()
+                with contextlib.suppress(asyncio.CancelledError):
+                    await task
+
+        # A tool response the agent produced just before the deadline already took effect -
+        # pass it on, so the fallback (and the session) can see it.
+        while not queue.empty():
+            event, _ = queue.get_nowait()
+            if event is not done and event.get_function_responses():
+                yield event
+
+        self.stats.missed += 1
+        # The reply comes from the agent it stands in for, so it reaches the customer
+        # wherever that agent's would (eg. shared.streaming). `interrupted` marks a
+        # streamed message that was cut off - the fallback replaces it.
+        message, state_delta = self.fallback(ctx)
+        content = None
+        if message:
+            content = types.Content(role="model", parts=[types.Part(text=message)])
+        yield Event(
+            author=agent.name,
+            content=content,
+            interrupted=streaming or None,
+            actions=EventActions(state_delta=dict(state_delta)),
+        )
+
+
+def eligibility_fallback(
+    check_eligible: Callable, output_key: str, needs_shipping_method: bool = True
+) -> Callable:
+    # Rule-based eligibility: the classifier's best guess at the reason, however unsure,
+    # through the pattern's own check_refund_eligible. Unknown shipping method -> not
+    # eligible.
+    classifier = ReasonClassifier()
+
+    def fallback(ctx: InvocationContext) -> tuple:
+        state = ctx.session.state
+        reason, confidence = classifier.classify(user_message_text(ctx))
+        if confidence == 0.0 and state.get("refund_reason"):
+            reason = state["refund_reason"]
+        if not needs_shipping_method:
+            eligible = check_eligible(reason)
+        else:
+            shipping_method = shipping_method_from_state(state)
+            eligible = check_eligible(reason, shipping_method or "OTHER")
+        return None, {"refund_reason": reason, output_key: eligible}
+
+    return fallback
+
+
+PENDING = (
+    "Thank you for reaching out to Crabby's Taffy{name}! We've received your refund "
+    "request and will email you as soon as it's been processed."
+)
+REFUNDED = (
+    "Thank you for reaching out to Crabby's Taffy{name}! Your refund has been processed "
+    "and will show up on your original payment method shortly."
+)
+REFUND_TOOLS = {"process_refund", "process_refunds"}
+
+
+def refund_processed(ctx: InvocationContext) -> bool:
+    # Whether a refund tool already answered in this turn.
+    for event in reversed(ctx.session.events):
+        if event.invocation_id != ctx.invocation_id:
+            break
+        if any(r.name in REFUND_TOOLS for r in event.get_function_responses()):
+            return True
+    return False
+
+
+def processor_fallback(output_key: str, policy=None) -> Callable:
+    # A confirmation if the processor got as far as issuing the refund - telling the
+    # customer it's pending would invite a second one. Otherwise the templated decline for
+    # a known "no", or an acknowledgement, and the refund is left for a person to finish
+    # rather than declined.
+    def fallback(ctx: InvocationContext) -> tuple:
+        state = ctx.session.state
+        purchaser = state.get("purchaser")
+        name = f", {purchaser}" if purchaser else ""
+        if refund_processed(ctx):
+            message = REFUNDED.format(name=name)
+        elif known_rejection(state, policy) is not None:
+            message = decline_message(state, policy)
+        else:
+            message = PENDING.format(name=name)
+        return message, {output_key: message}
+
+    return fallback
+
+
+def verifier_fallback(store, output_key: str = "purchase_history") -> Callable:
+    # Exact names only - the purchaser from an earlier turn, or one named in the message.
+    # A near-miss could be another customer, so no match -> no purchase on record, which
+    # the gate declines, asking for the name the order was placed under.
+    def fallback(ctx: InvocationContext) -> tuple:
+        purchaser = find_purchaser(user_message_text(ctx), store)
+        purchaser = purchaser or ctx.session.state.get("purchaser")
+        if purchaser is None:
+            return None, {output_key: []}
+        return None, {"purchaser": purchaser, output_key: store.get_history(purchaser)}
+
+    return fallback
+
+
+class _Blank(dict):
+    def __missing__(self, key: str) -> str:
+        return ""
+
+
+def template_fallback(template: str, output_key: Optional[str] = None) -> Callable:
+    # Formats `template` with state values as the reply; keys missing from state are left
+    # blank rather than failing the turn.
+    def fallback(ctx: InvocationContext) -> tuple:
+        message = template.format_map(_Blank(ctx.session.state))
+        return message, {output_key: message} if output_key else {}
+
+    return fallback
+
+
+def configure(root_agent, hedging: bool = True, deadlines: bool = True) -> None:
+    # Switches the HedgedModels and DeadlineAgents under root_agent on or off.
+    for agent in walk_agents(root_agent):
+        if isinstance(agent, DeadlineAgent):
+            agent.enabled = deadlines
+        if isinstance(getattr(agent, "model", None), HedgedModel):
+            agent.model.enabled = hedging
+
+
+# A vague message that reaches the LLM fallbacks: a spelling of the name the lookup doesn't
+# know, and a reason the classifier can't place.
+MESSAGE = "Hi, it's Dave. My taffy order was a total disaster - can I get my money back?"
+
+
+async def compare(pattern: str, sessions: int, concurrency: int, latency) -> list:
+    # -> [(label, LoadResult, hedges, fallbacks)] before / after, same stubs and message.
+    from shared.loadtest import load_test
+    from shared.stub_model import FakeModelServer
+
+    root_agent = load_root_agent(pattern)
+    rows = []
+    for label, enabled in (("off", False), ("on", True)):
+        configure(root_agent, hedging=enabled, deadlines=enabled)
+        hedgers = [
+            a.model for a in llm_agents(root_agent) if isinstance(a.model, HedgedModel)
+        ]
+        guards = [a for a in walk_agents(root_agent) if isinstance(a, DeadlineAgent)]
+        for hedger in hedgers:
+            hedger.latencies.clear()
+            hedger.stats = HedgeStats()
+        for guard in guards:
+            guard.stats = DeadlineStats()
+        result = await load_test(
+            pattern,
+            sessions,
+            concurrency,
+            FakeModelServer(),
+            latency,
+            MESSAGE,
+        )
+        rows.append(
+            (
+                label,
+                result,
+                sum(h.stats.hedged for h in hedgers),
+                sum(g.stats.missed for g in guards),
+            )
+        )
+    return rows
+
+
+async def main(args) -> None:
+    from shared.stub_model import lognormal
+
+    latency = lognormal(args.latency, args.sigma)
+    print(
+        f"{'pattern':<34}{'hedge+deadline':>15}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+        f"{'hedges':>8}{'fallbacks':>10}"
+    )
+    results = []
+    for name in args.patterns:
+        pattern = resolve_pattern(name)
+        rows = await compare(pattern, args.sessions, args.concurrency, latency)
+        results.append((pattern, rows))
+    for pattern, rows in results:
+        for label, r, hedges, fallbacks in rows:
+            print(
+                f"{pattern:<34}{label:>15}{r.p50_ms:>9.0f}{r.p95_ms:>9.0f}"
+                f"{r.p99_ms:>9.0f}{hedges:>8}{fallbacks:>10}"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "-p", "--patterns", nargs="+", default=[PATTERNS[3], PATTERNS[4]]
+    )
+    parser.add_argument("--sessions", type=int, default=300)
+    parser.add_argument(
+        "--concurrency", type=int, default=20, help="sessions open at once"
+    )
+    parser.add_argument(
+        "--latency", type=float, default=0.2, help="median seconds per model call"
+    )
+    parser.add_argument("--sigma", type=float, default=1.0, help="lognormal spread")
+    # The patterns import shared.deadlines, not __main__ - use their classes.
+    from shared import deadlines
+
+    asyncio.run(deadlines.main(parser.parse_args()))
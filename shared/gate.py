@@ -0,0 +1,89 @@
+"""
+Eligibility gate for workflows that end in RefundProcessorAgent.
+
+Most refund requests are rejections, and paying for a full LLM turn just to say "no" is the
+most common cost in the pipeline. EligibilityGate runs after the eligibility stage and reads
+state directly:
+- state['is_refund_eligible'] is FALSE, or
+- state['purchase_history'] is an empty list (no purchase on record)
+- with a policy (shared.policy): none of the purchases on record qualifies for
+  state['refund_reason'] given their shipping method and amount - for workflows that
+  checked the reason before the purchase history was known
+
+In any of these cases it answers with a templated decline and skips its sub-agent (the refund
+processor). Anything else - including a state value it can't interpret - goes through to
+the processor as before.
+"""
+
+from typing import Any, AsyncGenerator
+
+from google.adk.agents import BaseAgent
+from google.adk.agents.invocation_context import InvocationContext
+from google.adk.events import Event, EventActions
+from google.genai import types
+
+NOT_ELIGIBLE = (
+    "Thank you for reaching out to Crabby's Taffy{name}! I'm sorry, but this request isn't "
+    "eligible for a refund under our refund policy. We really appreciate you letting us "
+    "know, and we hope to see you again soon."
+)
+NO_PURCHASE = (
+    "Thank you for reaching out to Crabby's Taffy{name}! I'm sorry, but I couldn't find a "
+    "purchase on record for you, so I can't issue a refund. If you ordered under a "
+    "different name, just let me know and I'll take another look."
+)
+
+
+def known_rejection(state, policy=None):
+    # Returns the decline template for a known "no", or None if the processor should decide.
+    purchase_history = state.get("purchase_history")
+    if purchase_history == []:
+        return NO_PURCHASE
+    eligible = state.get("is_refund_eligible")
+    if isinstance(eligible, str) and eligible.strip().upper() == "FALSE":
+        return NOT_ELIGIBLE
+    if eligible is False:
+        return NOT_ELIGIBLE
+    reason = state.get("refund_reason")
+    if policy is not None and reason and isinstance(purchase_history, list):
+        if not any(
+            policy.check(reason, order["shipping_method"], amount=order["total_amount"])
+            for order in purchase_history
+        ):
+            return NOT_ELIGIBLE
+    return None
+
+
+def decline_message(state, policy=None) -> str:
+    template = known_rejection(state, policy) or NOT_ELIGIBLE
+    purchaser = state.get("purchaser")
+    return template.format(name=f", {purchaser}" if purchaser else "")
+
+
+class EligibilityGate(BaseAgent):
+    output_key: str = "refund_confirmation_message"
+    # Optional shared.policy.CompiledPolicy, see above.
+    policy: Any = None
+
+    # State keys this agent reads / writes itself (see shared.planner).
+    def state_reads(self) -> set:
+        return {"purchaser", "purchase_history", "is_refund_eligible", "refund_reason"}
+
+    def state_writes(self) -> set:
+        return {self.output_key}
+
+    async def _run_async_impl(
+        self, ctx: InvocationContext
+    ) -> AsyncGenerator[Event, None]:
+        if known_rejection(ctx.session.state, self.policy) is None:
+            for processor in self.sub_agents:
+                async for event in processor.run_async(ctx):
+                    yield event
+            return
+
+        message = decline_message(ctx.session.state, self.policy)
+        yield Event(
+            author=self.name,
+            content=types.Content(role="model", parts=[types.Part(text=message)]),
+            actions=EventActions(state_delta={self.output_key: message}),
+        )
@@ -0,0 +1,275 @@
+"""
+Latency instrumentation for any agent tree.
+
+Tracer.attach(root_agent) hooks the before/after agent, model and tool callbacks of every
+agent in the tree and records nested spans:
+
+    SequentialRefundProcessor            agent
+      ParallelEligibilityChecker         agent
+        PurchaseVerifierAgent            agent
+        ...
+      RefundProcessorAgent               agent
+        RefundProcessorAgent             model  (prompt/completion tokens)
+        process_refund                   tool
+
+Agents inside a LoopAgent also get the loop iteration they ran in.
+
+Spans can be exported to a local OTLP/JSON file (one ExportTraceServiceRequest per line, the
+same shape the OpenTelemetry file exporter writes), and summary() gives per-span-name latency
+percentiles in-process.
+
+    tracer = Tracer()
+    tracer.attach(root_agent)
+    ... run the agent ...
+    tracer.export_otlp_json("traces.jsonl")
+    print(tracer.format_summary())
+
+This module also owns the structured event log the tools use instead of print():
+
+    if events_enabled():
+        emit_event("refund_eligibility_checked", reason=reason, eligible=result)
+
+Events go to the "agent_patterns.events" logger at DEBUG level, so they're off by default and
+the events_enabled() guard keeps the disabled path down to one cached level check.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import time
+from dataclasses import dataclass, field
+
+from google.adk.agents import LlmAgent, LoopAgent
+
+from shared.callbacks import add_callback
+from shared.patterns import walk_agents
+
+EVENT_LOG = logging.getLogger("agent_patterns.events")
+
+
+def events_enabled() -> bool:
+    return EVENT_LOG.isEnabledFor(logging.DEBUG)
+
+
+def emit_event(name: str, **fields) -> None:
+    EVENT_LOG.debug(
+        "%s %s", name, json.dumps(fields, default=str), extra={"event": name, **fields}
+    )
+
+
+@dataclass
+class Span:
+    trace_id: str
+    span_id: str
+    parent_id: str
+    name: str
+    kind: str  # agent | model | tool
+    start_ns: int
+    end_ns: int = 0
+    attributes: dict = field(default_factory=dict)
+
+    @property
+    def duration_ms(self) -> float:
+        return (self.end_ns - self.start_ns) / 1e6
+
+
+def _trace_id(invocation_id: str) -> str:
+    return hashlib.md5(invocation_id.encode()).hexdigest()
+
+
+def _percentile(sorted_values: list, pct: float) -> float:
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def _otlp_value(value) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+class Tracer:
+    def __init__(self, service_name: str = "agent-patterns"):
+        self.service_name = service_name
+        self.spans = []  # finished spans
+        self._open = {}  # key -> Span
+        self._parents = {}  # agent name -> parent agent name
+        self._loops = {}  # agent name -> nearest enclosing LoopAgent name
+        self._loop_starts = {}  # first sub-agent name -> LoopAgent name
+        self._iterations = {}  # (invocation_id, loop name) -> iteration number
+
+    def attach(self, root_agent) -> None:
+        for agent in walk_agents(root_agent):
+            for sub_agent in agent.sub_agents:
+                self._parents[sub_agent.name] = agent.name
+            if isinstance(agent, LoopAgent) and agent.sub_agents:
+                self._loop_starts[agent.sub_agents[0].name] = agent.name
+                for inner in walk_agents(agent):
+                    if inner is not agent:
+                        self._loops[inner.name] = agent.name
+
+            add_callback(agent, "before_agent_callback", self.before_agent)
+            add_callback(agent, "after_agent_callback", self.after_agent)
+            if isinstance(agent, LlmAgent):
+                add_callback(agent, "before_model_callback", self.before_model)
+                add_callback(agent, "after_model_callback", self.after_model)
+                add_callback(agent, "before_tool_callback", self.before_tool)
+                add_callback(agent, "after_tool_callback", self.after_tool)
+
+    # --- span bookkeeping ---
+
+    def _start(self, key, invocation_id: str, parent_key, name: str, kind: str) -> Span:
+        parent = self._open.get(parent_key)
+        span = Span(
+            trace_id=_trace_id(invocation_id),
+            span_id=os.urandom(8).hex(),
+            parent_id=parent.span_id if parent else "",
+            name=name,
+            kind=kind,
+            start_ns=time.time_ns(),
+        )
+        self._open[key] = span
+        return span
+
+    def _end(self, key):
+        span = self._open.pop(key, None)
+        if span is not None:
+            span.end_ns = time.time_ns()
+            self.spans.append(span)
+        return span
+
+    # --- ADK callbacks (all return None so they never change behaviour) ---
+
+    def before_agent(self, callback_context):
+        invocation_id = callback_context.invocation_id
+        name = callback_context.agent_name
+        if name in self._loop_starts:
+            loop_key = (invocation_id, self._loop_starts[name])
+            self._iterations[loop_key] = self._iterations.get(loop_key, 0) + 1
+        span = self._start(
+            (invocation_id, name),
+            invocation_id,
+            (invocation_id, self._parents.get(name)),
+            name,
+            "agent",
+        )
+        if name in self._loops:
+            span.attributes["loop.name"] = self._loops[name]
+            span.attributes["loop.iteration"] = self._iterations.get(
+                (invocation_id, self._loops[name]), 0
+            )
+        return None
+
+    def after_agent(self, callback_context):
+        self._end((callback_context.invocation_id, callback_context.agent_name))
+        return None
+
+    def before_model(self, callback_context, llm_request):
+        invocation_id = callback_context.invocation_id
+        name = callback_context.agent_name
+        span = self._start(
+            (invocation_id, name, "model"), invocation_id, (invocation_id, name), name, "model"
+        )
+        span.attributes["llm.model"] = llm_request.model or ""
+        return None
+
+    def after_model(self, callback_context, llm_response):
+        if llm_response.partial:
+            return None
+        span = self._end(
+            (callback_context.invocation_id, callback_context.agent_name, "model")
+        )
+        usage = llm_response.usage_metadata
+        if span is not None and usage is not None:
+            span.attributes["llm.prompt_tokens"] = usage.prompt_token_count or 0
+            span.attributes["llm.completion_tokens"] = usage.candidates_token_count or 0
+        return None
+
+    def before_tool(self, tool, args, tool_context):
+        invocation_id = tool_context.invocation_id
+        self._start(
+            (invocation_id, tool_context.function_call_id),
+            invocation_id,
+            (invocation_id, tool_context.agent_name),
+            tool.name,
+            "tool",
+        )
+        return None
+
+    def after_tool(self, tool, args, tool_context, tool_response):
+        self._end((tool_context.invocation_id, tool_context.function_call_id))
+        return None
+
+    # --- reporting ---
+
+    def summary(self) -> list:
+        # [(kind, name, count, mean ms, p50 ms, p95 ms, max ms)]
+        durations = {}
+        for span in self.spans:
+            durations.setdefault((span.kind, span.name), []).append(span.duration_ms)
+        rows = []
+        for (kind, name), values in sorted(durations.items()):
+            values.sort()
+            rows.append(
+                (
+                    kind,
+                    name,
+                    len(values),
+                    sum(values) / len(values),
+                    _percentile(values, 50),
+                    _percentile(values, 95),
+                    values[-1],
+                )
+            )
+        return rows
+
+    def format_summary(self) -> str:
+        header = f"{'kind':<7}{'name':<34}{'count':>6}{'mean':>9}{'p50':>9}{'p95':>9}{'max':>9}"
+        lines = [header, "-" * len(header)]
+        for kind, name, count, mean, p50, p95, top in self.summary():
+            lines.append(
+                f"{kind:<7}{name:<34}{count:>6}{mean:>9.1f}{p50:>9.1f}{p95:>9.1f}{top:>9.1f}"
+            )
+        return "\n".join(lines)
+
+    def export_otlp_json(self, path: str) -> None:
+        spans = [
+            {
+                "traceId": span.trace_id,
+                "spanId": span.span_id,
+                "parentSpanId": span.parent_id,
+                "name": span.name,
+                "kind": 1,  # SPAN_KIND_INTERNAL
+                "startTimeUnixNano": str(span.start_ns),
+                "endTimeUnixNano": str(span.end_ns),
+                "attributes": [
+                    {"key": key, "value": _otlp_value(value)}
+                    for key, value in {"span.kind": span.kind, **span.attributes}.items()
+                ],
+            }
+            for span in self.spans
+        ]
+        request = {
+            "resourceSpans": [
+                {
+                    "resource": {
+                        "attributes": [
+                            {
+                                "key": "service.name",
+                                "value": {"stringValue": self.service_name},
+                            }
+                        ]
+                    },
+                    "scopeSpans": [
+                        {"scope": {"name": "shared.instrumentation"}, "spans": spans}
+                    ],
+                }
+            ]
+        }
+        with open(path, "a") as f:
+            f.write(json.dumps(request) + "\n")
@@ -0,0 +1,207 @@
+"""
+Load test: many concurrent sessions against each pattern, fully on localhost.
+
+Every LLM agent gets a StubModel (see shared.stub_model), and all of them share one
+FakeModelServer, so the pattern competes for the same model capacity the way it would in
+production: latencies drawn from a distribution, a cap on concurrent requests (the rest
+queue), a requests-per-second limit answered with 429s, and random 503s.
+
+Each session sends one refund request. Reported per pattern:
+- p50 / p95 / p99 session latency and throughput (sessions/s)
+- failed sessions (429s, 503s - failures aren't retried)
+- peak resident memory, sampled alongside the loop lag
+- peak model requests queued for a slot and in flight - ParallelAgent fan-out shows up here
+- p99 event-loop lag: how late a 10ms timer fires, ie. how saturated the loop is
+
+    python -m shared.loadtest --sessions 1000
+    python -m shared.loadtest -p 4 --sessions 2000 --max-concurrency 64 --rate-limit 500
+    python -m shared.loadtest -p 3 --latency 0.5 --sigma 0.8 --error-rate 0.02 --json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import resource
+import time
+from dataclasses import asdict, dataclass
+
+from google.adk.runners import Runner
+from google.adk.sessions import InMemorySessionService
+from google.genai import types
+
+from shared.benchmark import DEFAULT_MESSAGE, SCRIPTS, install_stubs
+from shared.patterns import PATTERNS, load_root_agent, resolve_pattern
+from shared.stub_model import FakeModelServer, constant, lognormal
+
+LAG_INTERVAL = 0.01  # seconds between event-loop lag / memory probes
+
+
+@dataclass
+class LoadResult:
+    pattern: str
+    sessions: int
+    failed: int
+    p50_ms: float
+    p95_ms: float
+    p99_ms: float
+    sessions_per_s: float
+    peak_memory_mb: float
+    peak_queued: int
+    peak_in_flight: int
+    loop_lag_p99_ms: float
+
+
+def percentile(values: list, pct: float) -> float:
+    # Nearest-rank percentile.
+    if not values:
+        return 0.0
+    values = sorted(values)
+    rank = max(0, min(len(values) - 1, round(pct / 100 * len(values) + 0.5) - 1))
+    return values[rank]
+
+
+async def run_session(runner: Runner, user_id: str, message: str) -> float:
+    session = await runner.session_service.create_session(
+        app_name=runner.app_name, user_id=user_id
+    )
+    content = types.Content(role="user", parts=[types.Part(text=message)])
+    started = time.perf_counter()
+    async for _ in runner.run_async(
+        user_id=user_id, session_id=session.id, new_message=content
+    ):
+        pass
+    return time.perf_counter() - started
+
+
+def resident_memory() -> int:
+    # Bytes. /proc is Linux-only; elsewhere fall back to the process's peak so far.
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return maxrss if os.uname().sysname == "Darwin" else maxrss * 1024
+
+
+async def probe(lags: list, memory: list, stop: asyncio.Event) -> None:
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(LAG_INTERVAL)
+        lags.append(time.perf_counter() - started - LAG_INTERVAL)
+        memory.append(resident_memory())
+
+
+async def load_test(
+    pattern: str,
+    sessions: int,
+    concurrency: int,
+    server: FakeModelServer,
+    latency,
+    message: str = DEFAULT_MESSAGE,
+) -> LoadResult:
+    pattern = resolve_pattern(pattern)
+    root_agent = load_root_agent(pattern)
+    install_stubs(root_agent, SCRIPTS.get(pattern, {}), latency, [], server)
+    runner = Runner(
+        app_name=pattern, agent=root_agent, session_service=InMemorySessionService()
+    )
+    queue = asyncio.Queue()
+    for i in range(sessions):
+        queue.put_nowait(f"load-{i}")
+    latencies, lags, memory = [], [], [resident_memory()]
+    failed = 0
+
+    async def worker():
+        nonlocal failed
+        while not queue.empty():
+            user_id = queue.get_nowait()
+            try:
+                latencies.append(await run_session(runner, user_id, message))
+            except Exception:
+                failed += 1
+
+    stop = asyncio.Event()
+    prober = asyncio.create_task(probe(lags, memory, stop))
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(min(concurrency, sessions))))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await prober
+
+    return LoadResult(
+        pattern=pattern,
+        sessions=sessions,
+        failed=failed,
+        p50_ms=percentile(latencies, 50) * 1000,
+        p95_ms=percentile(latencies, 95) * 1000,
+        p99_ms=percentile(latencies, 99) * 1000,
+        sessions_per_s=len(latencies) / elapsed if elapsed else 0.0,
+        peak_memory_mb=max(memory) / 2**20,
+        peak_queued=server.peak_queued,
+        peak_in_flight=server.peak_in_flight,
+        loop_lag_p99_ms=percentile(lags, 99) * 1000,
+    )
+
+
+def format_table(results: list) -> str:
+    header = (
+        f"{'pattern':<36}{'failed':>7}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+        f"{'sess/s':>8}{'mem MB':>8}{'queued':>8}{'flight':>8}{'lag ms':>8}"
+    )
+    lines = [header, "-" * len(header)]
+    for r in results:
+        lines.append(
+            f"{r.pattern:<36}{r.failed:>7}{r.p50_ms:>9.0f}{r.p95_ms:>9.0f}"
+            f"{r.p99_ms:>9.0f}{r.sessions_per_s:>8.1f}{r.peak_memory_mb:>8.1f}"
+            f"{r.peak_queued:>8}{r.peak_in_flight:>8}{r.loop_lag_p99_ms:>8.1f}"
+        )
+    return "\n".join(lines)
+
+
+async def main(args) -> None:
+    latency = (
+        lognormal(args.latency, args.sigma) if args.sigma else constant(args.latency)
+    )
+    results = []
+    for pattern in args.patterns:
+        server = FakeModelServer(
+            max_concurrency=args.max_concurrency,
+            rate_limit=args.rate_limit,
+            error_rate=args.error_rate,
+        )
+        results.append(
+            await load_test(
+                pattern,
+                args.sessions,
+                args.concurrency or args.sessions,
+                server,
+                latency,
+            )
+        )
+    if args.json:
+        print(json.dumps([asdict(r) for r in results], indent=2))
+    else:
+        print(format_table(results))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("-p", "--patterns", nargs="+", default=PATTERNS)
+    parser.add_argument("--sessions", type=int, default=500)
+    parser.add_argument(
+        "--concurrency", type=int, help="sessions open at once (default: all of them)"
+    )
+    parser.add_argument(
+        "--latency", type=float, default=0.2, help="median seconds per model call"
+    )
+    parser.add_argument(
+        "--sigma", type=float, default=0.5, help="lognormal spread, 0 for constant"
+    )
+    parser.add_argument(
+        "--max-concurrency", type=int, help="model requests served at once"
+    )
+    parser.add_argument("--rate-limit", type=float, help="model requests per second")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of 503s")
+    parser.add_argument("--json", action="store_true")
+    asyncio.run(main(parser.parse_args()))
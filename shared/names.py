@@ -0,0 +1,219 @@
+"""
+Fuzzy purchaser-name index.
+
+Purchaser lookup used to be an exact dict key check, so "alexis", "Alexis B." or a typo
+found nothing - and the agent went back to the customer to ask again. NameIndex finds the
+closest known names and scores them by trigram similarity (Dice coefficient over the
+padded, normalised name's 3-letter substrings), between 0 and 1:
+
+    index = NameIndex()
+    index.add("Alexis")                  # incremental - no rebuilds as customers are added
+    index.search("alexis b.")            # [("Alexis", 0.875)]
+    index.resolve("Davd")                # "David" if it's a clear winner, else None
+
+Candidates come from one inverted index holding each name's trigrams, the Soundex code of
+each of its words, and the whole name's codes with every one-character deletion (so that
+"Sokjiju" and "Sokujiju", one consonant apart, still share a key). A lookup counts the keys
+each name shares with the query, rarest keys first, and stops once it has touched
+max_postings entries: phonetic keys narrow a million names down to a few hundred, while
+trigrams like "  j" or "an " would touch a large share of the index and barely
+discriminate. Only the `verify` names sharing the most keys are scored, so a near-match to
+a very common name can be missed; resolve() then sees no clear winner and declines rather
+than guessing.
+
+The defaults trade some recall for latency. With 300,000 names, adding one takes about 45us,
+and a lookup p50 0.6ms / p99 1.0ms, with the intended name in the top 5 for 96% of queries
+with one typo; max_postings=5000, verify=128 gets that to 99.9% at p50 1.7ms / p99 3ms.
+
+    python -m shared.names --names 1000000     # build time, lookup latency and accuracy
+"""
+
+import argparse
+import heapq
+import random
+import re
+import time
+from array import array
+from collections import Counter
+
+NON_WORD_RE = re.compile(r"[^\w ]+")
+
+SOUNDEX_CODES = {
+    **dict.fromkeys("bfpv", "1"),
+    **dict.fromkeys("cgjkqsxz", "2"),
+    **dict.fromkeys("dt", "3"),
+    "l": "4",
+    **dict.fromkeys("mn", "5"),
+    "r": "6",
+}
+
+
+def normalize(name: str) -> str:
+    return " ".join(NON_WORD_RE.sub(" ", name.lower()).split())
+
+
+def trigrams(key: str) -> set:
+    padded = f"  {key} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+def soundex(word: str) -> str:
+    # American Soundex: first letter, then up to three consonant-class digits.
+    digits = []
+    previous = SOUNDEX_CODES.get(word[0], "")
+    for letter in word[1:]:
+        code = SOUNDEX_CODES.get(letter, "")
+        if code and code != previous:
+            digits.append(code)
+        if letter not in "hw":
+            previous = code
+    # Not zero-padded, so that dropping a digit still leaves a comparable code.
+    return (word[0] + "".join(digits))[:4]
+
+
+def phonetic_keys(key: str) -> set:
+    # Each word's Soundex code, and the whole name's codes together along with every
+    # variant of those missing one character - two names whose codes are one consonant
+    # apart share a variant. Codes are prefixed with "#", which a normalised name's
+    # trigrams can't contain.
+    codes = [soundex(word) for word in key.split()]
+    joined = " ".join(codes)
+    variants = {joined[:i] + joined[i + 1 :] for i in range(len(joined))}
+    return {"#" + code for code in codes} | {"#" + joined} | {
+        "#" + variant for variant in variants
+    }
+
+
+def index_keys(key: str) -> set:
+    return trigrams(key) | phonetic_keys(key)
+
+
+class NameIndex:
+    def __init__(self, max_postings: int = 2_000, verify: int = 48):
+        self.max_postings = max_postings  # posting entries touched per lookup
+        self.verify = verify  # names sharing the most keys, scored exactly
+        self.names = []  # id -> name as added
+        self._padded = []  # id -> normalised name, padded as for trigrams()
+        self._sizes = array("B")  # id -> number of distinct trigrams
+        self._ids = {}  # normalised name -> id
+        self._postings = {}  # trigram or Soundex code -> array of ids
+
+    def __len__(self):
+        return len(self.names)
+
+    def add(self, name: str) -> None:
+        key = normalize(name)
+        if not key or key in self._ids:
+            return
+        name_id = len(self.names)
+        self.names.append(name)
+        self._padded.append(f"  {key} ")
+        grams = trigrams(key)
+        self._sizes.append(min(len(grams), 255))
+        self._ids[key] = name_id
+        postings = self._postings
+        for index_key in grams | phonetic_keys(key):
+            ids = postings.get(index_key)
+            if ids is None:
+                ids = postings[index_key] = array("l")
+            ids.append(name_id)
+
+    def search(self, query: str, k: int = 5, min_score: float = 0.4) -> list:
+        # -> [(name, score)], best first.
+        key = normalize(query)
+        if key in self._ids:
+            return [(self.names[self._ids[key]], 1.0)]
+        if not key:
+            return []
+        # Count the keys each name shares with the query, rarest keys first, until
+        # max_postings posting entries have been touched; then score the names sharing the
+        # most exactly. A trigram is one of a name's trigrams iff it's a substring of the
+        # padded name.
+        hits = Counter()
+        touched = 0
+        for index_key in sorted(
+            index_keys(key), key=lambda k: len(self._postings.get(k, ()))
+        ):
+            postings = self._postings.get(index_key, ())
+            if hits and touched + len(postings) > self.max_postings:
+                break
+            hits.update(postings)
+            touched += len(postings)
+        candidates = heapq.nlargest(max(k, self.verify), hits, key=hits.__getitem__)
+
+        grams = trigrams(key)
+        scored = []
+        for name_id in candidates:
+            shared = sum(map(self._padded[name_id].__contains__, grams))
+            score = 2 * shared / (len(grams) + self._sizes[name_id])
+            if score >= min_score:
+                scored.append((score, name_id))
+        return [
+            (self.names[name_id], round(score, 3))
+            for score, name_id in heapq.nlargest(k, scored)
+        ]
+
+    def resolve(self, query: str, min_score: float = 0.5, margin: float = 0.15):
+        # The best match if it's good enough and clearly ahead of the runner-up, else None.
+        matches = self.search(query, k=2, min_score=min_score)
+        if not matches:
+            return None
+        if len(matches) == 1 or matches[0][1] - matches[1][1] >= margin:
+            return matches[0][0]
+        return None
+
+
+FIRST_NAMES = (
+    "Alexis David James Mary John Patricia Robert Jennifer Michael Linda Elizabeth "
+    "William Barbara Richard Susan Joseph Jessica Thomas Sarah Charles Karen Daniel "
+    "Nancy Matthew Lisa Anthony Betty Mark Sandra Donald Ashley Steven Kimberly Paul "
+    "Emily Andrew Donna Joshua Michelle Kenneth Carol Kevin Amanda Brian Melissa"
+).split()
+
+
+def _random_name(rng: random.Random) -> str:
+    # Common first names, made-up surnames.
+    syllables = rng.randint(3, 4)
+    surname = "".join(
+        rng.choice("bcdfghjklmnprstvwz") + rng.choice("aeiou") for _ in range(syllables)
+    )
+    return f"{rng.choice(FIRST_NAMES)} {surname.title()}"
+
+
+def _typo(name: str, rng: random.Random) -> str:
+    i = rng.randrange(len(name))
+    return name[:i] + name[i + 1 :]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--names", type=int, default=1_000_000)
+    parser.add_argument("--queries", type=int, default=2_000)
+    parser.add_argument("--max-postings", type=int, default=2_000)
+    parser.add_argument("--verify", type=int, default=48)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    index = NameIndex(max_postings=args.max_postings, verify=args.verify)
+    names = [_random_name(rng) for _ in range(args.names)]
+    started = time.perf_counter()
+    for name in names:
+        index.add(name)
+    build_s = time.perf_counter() - started
+
+    # Each query is a known name with one character dropped.
+    expected = [rng.choice(index.names) for _ in range(args.queries)]
+    latencies, found = [], 0
+    for name in expected:
+        query = _typo(name, rng)
+        started = time.perf_counter()
+        matches = index.search(query, k=5)
+        latencies.append(time.perf_counter() - started)
+        found += any(match == name for match, _ in matches)
+    latencies.sort()
+    print(f"{len(index):,} names indexed in {build_s:.1f}s")
+    print(
+        f"top-5 lookup with one typo: p50 {latencies[len(latencies) // 2] * 1000:.3f}ms"
+        f", p99 {latencies[int(len(latencies) * 0.99)] * 1000:.3f}ms"
+        f", intended name in the top 5 for {found / len(expected):.1%}"
+    )
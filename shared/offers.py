@@ -0,0 +1,161 @@
+"""
+Refund alternatives, computed up front as a ladder of offers with concrete amounts.
+
+Pattern 5 used to hand out one hard-coded offer per negotiation round ("a store credit
+voucher for 75 percent of your order total?"), so a customer who turned everything down
+went through three rounds, each with several model calls and a wait for their answer. The
+whole ladder is now computed once from the order's total and OFFER_POLICY, cheapest for
+us first:
+
+    offer_ladder(30.00)
+    # 1. a free 1/2lb box of assorted taffy (worth $8.00) with your next order
+    # 2. a $22.50 store credit voucher (75% of your order total)
+    # 3. a $15.00 cash refund (50% of your order total)
+
+so the negotiation can present several of them in one turn and settle on whichever the
+customer picks. format_offers() numbers offers for a prompt, and accepted_offer() maps the
+model's answer ("2", "Option 2.", "NONE") back to an Offer.
+
+    python -m shared.offers     # customer turns and model calls per resolved refund,
+                                # one offer per turn vs. the whole ladder at once
+"""
+
+import asyncio
+import re
+from dataclasses import dataclass
+from typing import Optional
+
+PRODUCT = "PRODUCT"
+STORE_CREDIT = "STORE_CREDIT"
+CASH = "CASH"
+
+
+@dataclass
+class OfferStep:
+    kind: str  # PRODUCT, STORE_CREDIT or CASH
+    share: Optional[float] = None  # of the order total
+    value: Optional[float] = None  # fixed value, eg. a product's price
+    label: str = ""
+
+
+@dataclass
+class Offer:
+    rank: int  # 1 is offered first
+    kind: str
+    amount: Optional[float]  # None when the order total isn't known
+    text: str
+
+
+OFFER_POLICY = [
+    OfferStep(PRODUCT, value=8.00, label="1/2lb box of assorted taffy"),
+    OfferStep(STORE_CREDIT, share=0.75),
+    OfferStep(CASH, share=0.50),
+]
+
+NUMBER_RE = re.compile(r"\d+")
+# A reply that is nothing but an offer choice: "2", "#2", "option 2.", "Offer 3!"
+CHOICE_RE = re.compile(r"^\s*(?:option|offer|number|#)?\s*(\d+)\s*[.!]?\s*$", re.I)
+
+
+def _describe(step: OfferStep, amount: Optional[float]) -> str:
+    if step.kind == PRODUCT:
+        worth = f" (worth ${amount:.2f})" if amount is not None else ""
+        return f"a free {step.label}{worth} with your next order"
+    what = "store credit voucher" if step.kind == STORE_CREDIT else "cash refund"
+    if amount is None:
+        return f"a {what} for {step.share:.0%} of your order total"
+    return f"a ${amount:.2f} {what} ({step.share:.0%} of your order total)"
+
+
+def offer_ladder(total_amount: Optional[float], policy: list = OFFER_POLICY) -> list:
+    # total_amount None (order unknown) still gives the ladder, with shares instead of
+    # amounts. A fixed-value offer is never worth more than the order.
+    offers = []
+    for rank, step in enumerate(policy, 1):
+        if step.value is not None:
+            amount = step.value
+            if total_amount is not None:
+                amount = min(amount, total_amount)
+        elif total_amount is not None:
+            amount = round(total_amount * step.share, 2)
+        else:
+            amount = None
+        offers.append(Offer(rank, step.kind, amount, _describe(step, amount)))
+    return offers
+
+
+def format_offers(offers: list) -> str:
+    return "\n".join(f"{offer.rank}. {offer.text}" for offer in offers)
+
+
+def accepted_offer(answer, offers: list) -> Optional[Offer]:
+    # The offer whose number the answer names; a bare TRUE accepts a single offer.
+    answer = str(answer or "").strip()
+    if answer.upper() == "TRUE" and len(offers) == 1:
+        return offers[0]
+    match = NUMBER_RE.search(answer)
+    if match is None:
+        return None
+    rank = int(match.group())
+    return next((offer for offer in offers if offer.rank == rank), None)
+
+
+OPENING = "Hi, I'm Alexis. My Watermelon Taffy never arrived, I'd like a refund please."
+
+
+async def negotiate(offers_per_turn: int, accepts: Optional[int]) -> tuple:
+    # Alexis's order wasn't insured, so pattern 5 negotiates. The customer accepts offer
+    # number `accepts` when it's put to them, or nothing. -> (customer turns, model calls)
+    from google.adk.runners import Runner
+    from google.adk.sessions import InMemorySessionService
+
+    from shared.benchmark import SCRIPTS, install_stubs
+    from shared.compaction import send
+    from shared.patterns import load_pattern
+    from shared.stub_model import constant, say
+
+    pattern = "5-workflow-loop-multi-agent"
+    module = load_pattern(pattern)
+    module.refund_loop_controller.offers_per_turn = offers_per_turn
+    log = []
+    stubs = install_stubs(module.root_agent, SCRIPTS[pattern], constant(0.0), log)
+    reader = stubs[module.refund_offer_reader_agent.name]
+    runner = Runner(
+        app_name=pattern,
+        agent=module.root_agent,
+        session_service=InMemorySessionService(),
+    )
+    session = await runner.session_service.create_session(
+        app_name=pattern, user_id="bench"
+    )
+    turns, message = 0, OPENING
+    while True:
+        turns += 1
+        await send(runner, session.id, message)
+        state = (
+            await runner.session_service.get_session(
+                app_name=pattern, user_id="bench", session_id=session.id
+            )
+        ).state
+        if state.get("refund_resolved") in ("pass", "declined"):
+            return turns, len(log)
+        made = state.get("iteration_number", 0)
+        if accepts is not None and made >= accepts:
+            reader.replies = [say(str(accepts))]
+            message = f"Option {accepts} works for me, thanks."
+        else:
+            reader.replies = [say("NONE")]
+            message = "No thanks, none of that works for me."
+
+
+async def main() -> None:
+    print(f"{'customer accepts':<18}{'offers/turn':>12}{'turns':>7}{'model calls':>13}")
+    for accepts in (1, 2, 3, None):
+        for offers_per_turn in (1, len(OFFER_POLICY)):
+            turns, calls = await negotiate(offers_per_turn, accepts)
+            label = f"offer {accepts}" if accepts else "nothing"
+            print(f"{label:<18}{offers_per_turn:>12}{turns:>7}{calls:>13}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,76 @@
+"""
+Helpers for loading the five agent patterns by name.
+
+The pattern directories ("1-llm-single-agent", ...) aren't valid Python identifiers, so tools
+that work across patterns (benchmarks, batch runs) import them the same way `adk web` does:
+with the repo root on sys.path and importlib.
+
+A pattern name can pick an alternate module in the same directory with "name:module", eg.
+"2:agent_tools" loads 2-llm-multi-agent/agent_tools.py instead of agent.py.
+"""
+
+import importlib
+import os
+import sys
+
+from google.adk.agents import BaseAgent, LlmAgent
+from google.adk.models.base_llm import BaseLlm
+from google.adk.tools.agent_tool import AgentTool
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PATTERNS = [
+    "1-llm-single-agent",
+    "2-llm-multi-agent",
+    "3-workflow-sequential-multi-agent",
+    "4-workflow-parallel-multi-agent",
+    "5-workflow-loop-multi-agent",
+]
+
+
+def resolve_pattern(name: str) -> str:
+    # Accepts the full directory name or just its number ("3"), optionally with ":module".
+    name, sep, module = name.partition(":")
+    for pattern in PATTERNS:
+        if name == pattern or pattern.split("-", 1)[0] == name:
+            return pattern + sep + module
+    raise ValueError(f"Unknown pattern {name!r}, expected one of {PATTERNS}")
+
+
+def load_pattern(name: str):
+    if REPO_ROOT not in sys.path:
+        sys.path.insert(0, REPO_ROOT)
+    pattern, _, module = resolve_pattern(name).partition(":")
+    return importlib.import_module(f"{pattern}.{module or 'agent'}")
+
+
+def load_root_agent(name: str) -> BaseAgent:
+    return load_pattern(name).root_agent
+
+
+def walk_agents(agent: BaseAgent):
+    # Includes agents wrapped as tools (AgentTool) - they run as part of the same request.
+    yield agent
+    for sub_agent in agent.sub_agents:
+        yield from walk_agents(sub_agent)
+    for tool in getattr(agent, "tools", []):
+        if isinstance(tool, AgentTool):
+            yield from walk_agents(tool.agent)
+
+
+def llm_agents(agent: BaseAgent):
+    return [a for a in walk_agents(agent) if isinstance(a, LlmAgent)]
+
+
+def replace_base_model(agent: LlmAgent, replace) -> BaseLlm:
+    # Swaps the model at the bottom of the agent's model wrappers (eg. HedgedModel, which
+    # holds the model it wraps in `inner`) for replace(model); the wrappers stay in place.
+    # -> the new model
+    model = agent.canonical_model
+    if not isinstance(getattr(model, "inner", None), BaseLlm):
+        agent.model = replace(model)
+        return agent.model
+    while isinstance(getattr(model.inner, "inner", None), BaseLlm):
+        model = model.inner
+    model.inner = replace(model.inner)
+    return model.inner
@@ -0,0 +1,156 @@
+"""
+Dependency planner: run independent SequentialAgent stages concurrently.
+
+A SequentialAgent hard-codes its stage order, but the real dependencies are written on the
+agents themselves: each stage writes state through `output_key` and reads it through
+{placeholder} templates in its instruction. The planner builds a DAG from those keys and
+regroups the stages so that stages with no dependency between them run side by side in a
+derived ParallelAgent - the speedup pattern 4 does by hand - while dependent stages keep their
+original order.
+
+Stage B depends on an earlier stage A if B reads a key A writes, writes a key A reads, or
+writes a key A also writes. Keys come from:
+- LlmAgent: output_key (writes) and {placeholders} in its instruction (reads)
+- custom agents: their state_reads() / state_writes() methods
+- workflow agents and DeadlineAgents: the union of their sub-agents
+A custom agent that doesn't declare its keys is treated as a barrier: nothing moves across it.
+
+Note that parallel branches don't see each other's conversation events, only shared state -
+the same trade-off pattern 4 makes.
+
+None of the shipped patterns has stages to regroup, and the dry run shows why: in patterns 3
+and 5 the policy applier reads purchase_history (the full-refund check needs the order's
+shipping method), so it has to wait for the verifier; pattern 4 checks the reason alone and
+already runs the two side by side - the plan the planner derives for its flattened stages.
+It's for checking a workflow's order, and for workflows with independent stages.
+
+    python -m shared.planner 3 5          # dry run: print the inferred plan
+    root_agent = parallelize(root_agent)  # rebuild the tree (re-parents the original stages)
+"""
+
+import argparse
+
+from google.adk.agents import (
+    BaseAgent,
+    LlmAgent,
+    LoopAgent,
+    ParallelAgent,
+    SequentialAgent,
+)
+
+from shared.deadlines import DeadlineAgent
+from shared.patterns import PATTERNS, load_root_agent
+from shared.projection import PLACEHOLDER_RE, ProjectedInstruction
+
+
+def _template(instruction):
+    if isinstance(instruction, str):
+        return instruction
+    if isinstance(instruction, ProjectedInstruction):
+        return instruction.template
+    return None
+
+
+def state_keys(agent: BaseAgent):
+    # Returns (reads, writes), or None if the agent's state access can't be known.
+    if hasattr(agent, "state_reads"):
+        reads, writes = set(agent.state_reads()), set(agent.state_writes())
+    elif isinstance(agent, LlmAgent):
+        template = _template(agent.instruction)
+        if template is None:
+            return None
+        reads = {match.group(1) for match in PLACEHOLDER_RE.finditer(template)}
+        writes = {agent.output_key} if agent.output_key else set()
+    elif isinstance(
+        agent, (SequentialAgent, ParallelAgent, LoopAgent, DeadlineAgent)
+    ):
+        reads, writes = set(), set()
+    else:
+        return None
+
+    for sub_agent in agent.sub_agents:
+        keys = state_keys(sub_agent)
+        if keys is None:
+            return None
+        reads |= keys[0]
+        writes |= keys[1]
+    return reads, writes
+
+
+def depends_on(later, earlier) -> bool:
+    if later is None or earlier is None:
+        return True
+    later_reads, later_writes = later
+    earlier_reads, earlier_writes = earlier
+    return bool(
+        later_reads & earlier_writes
+        or later_writes & earlier_reads
+        or later_writes & earlier_writes
+    )
+
+
+def plan(sequential_agent: SequentialAgent) -> list:
+    # Groups of stages; groups run in order, stages within a group run concurrently.
+    stages = sequential_agent.sub_agents
+    keys = [state_keys(stage) for stage in stages]
+    levels = []
+    for i in range(len(stages)):
+        deps = [levels[j] for j in range(i) if depends_on(keys[i], keys[j])]
+        # Never start before the previous group, so barriers and ordering hold.
+        levels.append(max(deps, default=-1) + 1)
+    groups = [[] for _ in range(max(levels, default=-1) + 1)]
+    for stage, level in zip(stages, levels):
+        groups[level].append(stage)
+    return groups
+
+
+def parallelize(sequential_agent: SequentialAgent) -> SequentialAgent:
+    groups = plan(sequential_agent)
+    for stage in sequential_agent.sub_agents:
+        stage.parent_agent = None
+    steps = []
+    for n, group in enumerate(groups, 1):
+        if len(group) == 1:
+            steps.append(group[0])
+        else:
+            steps.append(
+                ParallelAgent(
+                    name=f"{sequential_agent.name}Stage{n}",
+                    description="Stages with no state dependencies between them.",
+                    sub_agents=group,
+                )
+            )
+    return SequentialAgent(
+        name=sequential_agent.name,
+        description=sequential_agent.description,
+        sub_agents=steps,
+    )
+
+
+def format_plan(sequential_agent: SequentialAgent) -> str:
+    lines = [sequential_agent.name]
+    for n, group in enumerate(plan(sequential_agent), 1):
+        mode = "parallel" if len(group) > 1 else "sequential"
+        lines.append(f"  stage {n} ({mode})")
+        for stage in group:
+            keys = state_keys(stage)
+            if keys is None:
+                detail = "unknown state access - barrier"
+            else:
+                detail = (
+                    f"reads {sorted(keys[0]) or '-'}  writes {sorted(keys[1]) or '-'}"
+                )
+            lines.append(f"    {stage.name:<30} {detail}")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("patterns", nargs="*", default=PATTERNS)
+    args = parser.parse_args()
+    for pattern in args.patterns:
+        root_agent = load_root_agent(pattern)
+        if not isinstance(root_agent, SequentialAgent):
+            print(f"{pattern}: root agent is not a SequentialAgent, nothing to plan\n")
+            continue
+        print(f"{pattern}:\n{format_plan(root_agent)}\n")
@@ -0,0 +1,125 @@
+"""
+Compact, per-agent projections of structured session state.
+
+Every downstream instruction used to get the whole purchase history pasted into its
+{purchase_history} template - either the verifier's prose restatement or the str() of every
+order with every line item. Most agents only need a sliver of it: the policy agent needs the
+order IDs and shipping methods, the processor needs IDs, dates and totals.
+
+ProjectedInstruction is an ADK instruction provider. It fills in {placeholders} from session
+state like ADK does, except that keys with a renderer get a minimal, token-budgeted view:
+
+    instruction=ProjectedInstruction(
+        \"\"\"... This is the user's purchase history: {purchase_history} ...\"\"\",
+        purchase_history=render_orders("purchase_id", "shipping_method"),
+    )
+
+Prose (eg. from the LLM verifier fallback) is passed through, cut down to the budget.
+
+    python -m shared.projection     # prompt tokens per agent, full vs. projected
+"""
+
+import re
+
+from google.adk.agents.readonly_context import ReadonlyContext
+
+from shared.patterns import PATTERNS, load_pattern, walk_agents
+from shared.stub_model import estimate_tokens
+
+# Per placeholder, not per prompt.
+DEFAULT_MAX_TOKENS = 200
+
+PLACEHOLDER_RE = re.compile(r"\{([A-Za-z_][A-Za-z0-9_]*)(\?)?\}")
+
+
+def _format_field(order: dict, field: str) -> str:
+    value = order[field]
+    if field == "items":
+        return ", ".join(f"{i['quantity']}x {i['product_name']}" for i in value)
+    if field == "total_amount":
+        return f"${value:.2f}"
+    return str(value)
+
+
+def render_orders(*fields):
+    # One line per order with just `fields`, eg. "SG001-20250501 | INSURED".
+    def render(value, max_tokens: int) -> str:
+        if not isinstance(value, list):
+            return _truncate(str(value), max_tokens)
+        if not value:
+            return "No purchases found."
+        lines = [" | ".join(fields)]
+        for i, order in enumerate(value):
+            line = " | ".join(_format_field(order, field) for field in fields)
+            if estimate_tokens("\n".join(lines + [line])) > max_tokens:
+                lines.append(f"... ({len(value) - i} more orders)")
+                break
+            lines.append(line)
+        return "\n".join(lines)
+
+    return render
+
+
+def _truncate(text: str, max_tokens: int) -> str:
+    max_chars = max_tokens * 4
+    return text if len(text) <= max_chars else text[:max_chars] + "..."
+
+
+class ProjectedInstruction:
+    def __init__(self, template: str, max_tokens: int = DEFAULT_MAX_TOKENS, **renderers):
+        self.template = template
+        self.max_tokens = max_tokens
+        self.renderers = renderers
+
+    def render(self, state, project: bool = True) -> str:
+        def substitute(match):
+            key, optional = match.group(1), match.group(2)
+            if key not in state:
+                if optional:
+                    return ""
+                raise KeyError(f"Context variable not found: `{key}`.")
+            renderer = self.renderers.get(key)
+            if project and renderer is not None:
+                return renderer(state[key], self.max_tokens)
+            return str(state[key])
+
+        return PLACEHOLDER_RE.sub(substitute, self.template)
+
+    def __call__(self, context: ReadonlyContext) -> str:
+        return self.render(context.state)
+
+
+def token_report(root_agent, state) -> list:
+    # [(agent name, instruction tokens with the full state, with projections)]
+    rows = []
+    for agent in walk_agents(root_agent):
+        instruction = getattr(agent, "instruction", None)
+        if isinstance(instruction, ProjectedInstruction):
+            full = estimate_tokens(instruction.render(state, project=False))
+            projected = estimate_tokens(instruction.render(state))
+            rows.append((agent.name, full, projected))
+    return rows
+
+
+if __name__ == "__main__":
+    # The agent modules import shared.projection, not __main__ - use their copy of the class.
+    from shared.projection import token_report
+
+    for pattern in PATTERNS:
+        module = load_pattern(pattern)
+        purchaser = max(
+            module.purchase_store.purchasers(),
+            key=lambda name: len(module.purchase_store.get_history(name)),
+        )
+        state = {
+            "purchaser": purchaser,
+            "purchase_history": module.purchase_store.get_history(purchaser),
+            "is_refund_eligible": "TRUE",
+            "is_full_refund_eligible": "TRUE",
+            "refund_reason": "DAMAGED",
+        }
+        for agent_name, full, projected in token_report(module.root_agent, state):
+            print(
+                f"{pattern:<36}{agent_name:<32}{full:>6} -> {projected:>5} tokens"
+                f" ({full - projected} saved)"
+            )
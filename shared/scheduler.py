@@ -0,0 +1,350 @@
+"""
+Process-wide scheduler for model calls: token-bucket rate limits and priority classes.
+
+Every session's agents used to call the model on their own, so under load pattern 4's
+parallel fan-out and pattern 5's loop burst through the quota and got 429s at random points
+in the pipeline - often throwing away a session that was one call from done. All model
+calls in the process now go through one ModelScheduler:
+
+- two token buckets, one for requests and one for (estimated) tokens per minute. A call
+  waits until both have room, so the provider never sees more than the quota.
+- priority classes. Waiting calls are granted highest class first (FIFO within a class):
+  FOREGROUND for the agents whose answer the customer is waiting on - RefundProcessorAgent,
+  the negotiation in pattern 5 - BACKGROUND for the lookups and checks before them. Under
+  a tight quota the sessions closest to done finish first, instead of every session
+  stalling behind everyone else's first call.
+
+    schedule_models(root_agent, foreground={"RefundProcessorAgent"})
+    model_scheduler.set_limits(requests_per_minute=600, tokens_per_minute=400_000)
+    model_scheduler.metrics()   # queue depth, wait-time percentiles per class
+
+Limits come from MODEL_RPM / MODEL_TPM; unset means unlimited, and calls go straight
+through. Tokens are estimated from the request text before the call and corrected from
+the response's usage metadata after it.
+
+    python -m shared.scheduler -p 4 5 --rate-limit 20    # 429s and refunds per minute,
+                                                         # unscheduled vs. scheduled
+"""
+
+import argparse
+import asyncio
+import heapq
+import itertools
+import os
+import time
+from collections import deque
+from typing import Any, AsyncGenerator, Optional
+
+from google.adk.models.base_llm import BaseLlm
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+
+from shared.instrumentation import emit_event, events_enabled
+from shared.patterns import PATTERNS, llm_agents, load_root_agent, resolve_pattern
+from shared.stub_model import estimate_tokens, request_text
+
+FOREGROUND = 0  # the reply the customer is waiting on
+BACKGROUND = 1  # lookups and checks before it
+CLASS_NAMES = {FOREGROUND: "foreground", BACKGROUND: "background"}
+
+
+class TokenBucket:
+    def __init__(self, per_minute: float, burst: float = 1.0):
+        self.rate = per_minute / 60  # per second
+        # Up to `burst` seconds' worth can go out at once.
+        self.capacity = max(1.0, self.rate * burst)
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        # Seconds until `amount` is available. More than the capacity only has to wait
+        # for a full bucket, or it would never go.
+        self._refill()
+        missing = min(amount, self.capacity) - self.level
+        return max(0.0, missing / self.rate)
+
+    def take(self, amount: float) -> None:
+        # Can go negative (an over-capacity call, or a correction), which delays the next.
+        self._refill()
+        self.level -= amount
+
+
+class ModelScheduler:
+    def __init__(
+        self,
+        requests_per_minute: Optional[float] = None,
+        tokens_per_minute: Optional[float] = None,
+        burst: float = 1.0,
+    ):
+        self._waiting = []  # heap of (priority, seq, tokens, future)
+        self._seq = itertools.count()
+        self._dispatcher = None
+        self.queued = 0  # calls waiting for a grant
+        self.set_limits(requests_per_minute, tokens_per_minute, burst)
+        self.reset_metrics()
+
+    @classmethod
+    def from_env(cls) -> "ModelScheduler":
+        rpm, tpm = os.environ.get("MODEL_RPM"), os.environ.get("MODEL_TPM")
+        return cls(float(rpm) if rpm else None, float(tpm) if tpm else None)
+
+    def set_limits(
+        self,
+        requests_per_minute: Optional[float] = None,
+        tokens_per_minute: Optional[float] = None,
+        burst: float = 1.0,
+    ) -> None:
+        self.requests = None
+        self.tokens = None
+        if requests_per_minute:
+            self.requests = TokenBucket(requests_per_minute, burst)
+        if tokens_per_minute:
+            self.tokens = TokenBucket(tokens_per_minute, burst)
+
+    def reset_metrics(self) -> None:
+        self.peak_queued = 0
+        self.granted = {priority: 0 for priority in CLASS_NAMES}
+        self.waits = {priority: deque(maxlen=1000) for priority in CLASS_NAMES}
+
+    def _wait_time(self, tokens: int) -> float:
+        return max(
+            self.requests.wait_time(1) if self.requests else 0.0,
+            self.tokens.wait_time(tokens) if self.tokens else 0.0,
+        )
+
+    def _take(self, tokens: int) -> None:
+        if self.requests:
+            self.requests.take(1)
+        if self.tokens:
+            self.tokens.take(tokens)
+
+    async def acquire(self, priority: int, tokens: int) -> float:
+        # Waits for a slot within the limits; -> seconds waited.
+        started = time.perf_counter()
+        if not self.queued and self._wait_time(tokens) == 0.0:
+            self._take(tokens)
+        else:
+            future = asyncio.get_running_loop().create_future()
+            heapq.heappush(self._waiting, (priority, next(self._seq), tokens, future))
+            self.queued += 1
+            self.peak_queued = max(self.peak_queued, self.queued)
+            if self._dispatcher is None or self._dispatcher.done():
+                self._dispatcher = asyncio.ensure_future(self._dispatch())
+            try:
+                # Cancelled while waiting (eg. a deadline): the dispatcher skips it.
+                await future
+            finally:
+                self.queued -= 1
+        waited = time.perf_counter() - started
+        self.granted[priority] += 1
+        self.waits[priority].append(waited)
+        if events_enabled():
+            emit_event(
+                "model_call_scheduled",
+                priority=CLASS_NAMES.get(priority, priority),
+                waited_ms=round(waited * 1000, 1),
+                queued=self.queued,
+            )
+        return waited
+
+    def settle(self, estimated: int, actual: Optional[int]) -> None:
+        # Charges the difference once the response says how many tokens it really took.
+        if self.tokens and actual is not None:
+            self.tokens.take(actual - estimated)
+
+    async def _dispatch(self) -> None:
+        # Grants waiting calls in priority order as the buckets refill. The head is picked
+        # again after every sleep, so a foreground call that arrives meanwhile goes first.
+        while self._waiting:
+            _, _, tokens, future = self._waiting[0]
+            if future.done():
+                heapq.heappop(self._waiting)
+                continue
+            delay = self._wait_time(tokens)
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+            heapq.heappop(self._waiting)
+            self._take(tokens)
+            future.set_result(None)
+
+    def metrics(self) -> dict:
+        classes = {}
+        for priority, name in CLASS_NAMES.items():
+            waits = sorted(self.waits[priority])
+            classes[name] = {
+                "granted": self.granted[priority],
+                "wait_p50_ms": _percentile(waits, 50) * 1000,
+                "wait_p99_ms": _percentile(waits, 99) * 1000,
+            }
+        return {"queued": self.queued, "peak_queued": self.peak_queued, **classes}
+
+
+def _percentile(values: list, pct: float) -> float:
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+# Shared by every pattern loaded in this process.
+model_scheduler = ModelScheduler.from_env()
+
+
+class ScheduledModel(BaseLlm):
+    inner: BaseLlm
+    priority: int = BACKGROUND
+    # Typed Any so pydantic doesn't copy it - every model must share the one scheduler.
+    scheduler: Any = None
+
+    async def generate_content_async(
+        self, llm_request: LlmRequest, stream: bool = False
+    ) -> AsyncGenerator[LlmResponse, None]:
+        scheduler = self.scheduler or model_scheduler
+        estimated = estimate_tokens(request_text(llm_request))
+        if llm_request.config and llm_request.config.max_output_tokens:
+            estimated += llm_request.config.max_output_tokens
+        await scheduler.acquire(self.priority, estimated)
+        actual = None
+        async for response in self.inner.generate_content_async(llm_request, stream):
+            if response.usage_metadata and response.usage_metadata.total_token_count:
+                actual = response.usage_metadata.total_token_count
+            yield response
+        scheduler.settle(estimated, actual)
+
+
+def schedule_models(
+    root_agent, foreground=(), scheduler: ModelScheduler = None
+) -> list:
+    # Routes the model calls of every LLM agent under root_agent through the scheduler, as
+    # FOREGROUND if the agent's name is in `foreground`. Model wrappers (eg. HedgedModel)
+    # stay on top, so every request they send is scheduled. -> the new ScheduledModels
+    scheduled = []
+    for agent in llm_agents(root_agent):
+        priority = FOREGROUND if agent.name in foreground else BACKGROUND
+        model = agent.canonical_model
+        if not isinstance(getattr(model, "inner", None), BaseLlm):
+            agent.model = ScheduledModel(
+                model=model.model, inner=model, priority=priority, scheduler=scheduler
+            )
+            scheduled.append(agent.model)
+            continue
+        while isinstance(getattr(model.inner, "inner", None), BaseLlm):
+            model = model.inner
+        if isinstance(model, ScheduledModel):
+            continue
+        model.inner = ScheduledModel(
+            model=model.inner.model,
+            inner=model.inner,
+            priority=priority,
+            scheduler=scheduler,
+        )
+        scheduled.append(model.inner)
+    return scheduled
+
+
+async def compare(
+    pattern: str, sessions: int, concurrency: int, rate_limit: float, latency
+) -> list:
+    # -> [(label, LoadResult, scheduler metrics)] against a model endpoint that answers
+    # over `rate_limit` requests/s with 429s: unscheduled, scheduled with every call in one
+    # class (FIFO), and scheduled with the pattern's priorities. Hedging and deadlines are
+    # off, so every session gets its real answer or fails.
+    from shared.deadlines import MESSAGE, configure
+    from shared.loadtest import load_test
+    from shared.stub_model import FakeModelServer
+
+    root_agent = load_root_agent(pattern)
+    scheduled = [
+        model
+        for agent in llm_agents(root_agent)
+        for model in _model_chain(agent.model)
+        if isinstance(model, ScheduledModel)
+    ]
+    priorities = [model.priority for model in scheduled]
+    configure(root_agent, hedging=False, deadlines=False)
+    # Scheduled a little under the endpoint's limit: its window is one second, and the
+    # bucket can go a quarter second's worth over its rate at once.
+    runs = (
+        ("off", None, priorities),
+        ("fifo", rate_limit * 60 * 0.8, [BACKGROUND] * len(scheduled)),
+        ("priority", rate_limit * 60 * 0.8, priorities),
+    )
+    rows = []
+    try:
+        for label, requests_per_minute, run_priorities in runs:
+            model_scheduler.set_limits(requests_per_minute, burst=0.25)
+            model_scheduler.reset_metrics()
+            for model, priority in zip(scheduled, run_priorities):
+                model.priority = priority
+            server = FakeModelServer(rate_limit=rate_limit)
+            result = await load_test(
+                pattern, sessions, concurrency, server, latency, MESSAGE
+            )
+            rows.append((label, result, model_scheduler.metrics()))
+    finally:
+        for model, priority in zip(scheduled, priorities):
+            model.priority = priority
+        configure(root_agent)
+        model_scheduler.set_limits()
+    return rows
+
+
+def _model_chain(model):
+    while isinstance(model, BaseLlm):
+        yield model
+        model = getattr(model, "inner", None)
+
+
+async def main(args) -> None:
+    from shared.stub_model import lognormal
+
+    latency = lognormal(args.latency, args.sigma)
+    results = []
+    for name in args.patterns:
+        pattern = resolve_pattern(name)
+        rows = await compare(
+            pattern, args.sessions, args.concurrency, args.rate_limit, latency
+        )
+        results.append((pattern, rows))
+    header = (
+        f"{'pattern':<34}{'scheduler':>10}{'failed':>7}{'refunds/min':>12}"
+        f"{'p50 ms':>8}{'p99 ms':>8}{'peak queue':>11}{'fg wait p99':>12}"
+        f"{'bg wait p99':>12}"
+    )
+    print(header)
+    print("-" * len(header))
+    for pattern, rows in results:
+        for label, r, metrics in rows:
+            print(
+                f"{pattern:<34}{label:>10}{r.failed:>7}{r.sessions_per_s * 60:>12.0f}"
+                f"{r.p50_ms:>8.0f}{r.p99_ms:>8.0f}{metrics['peak_queued']:>11}"
+                f"{metrics['foreground']['wait_p99_ms']:>12.0f}"
+                f"{metrics['background']['wait_p99_ms']:>12.0f}"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "-p", "--patterns", nargs="+", default=[PATTERNS[3], PATTERNS[4]]
+    )
+    parser.add_argument("--sessions", type=int, default=120)
+    parser.add_argument(
+        "--concurrency", type=int, default=20, help="sessions open at once"
+    )
+    parser.add_argument(
+        "--rate-limit", type=float, default=20, help="model requests per second"
+    )
+    parser.add_argument(
+        "--latency", type=float, default=0.2, help="median seconds per model call"
+    )
+    parser.add_argument("--sigma", type=float, default=0.5, help="lognormal spread")
+    # The patterns import shared.scheduler, not __main__ - use their scheduler.
+    from shared import scheduler
+
+    asyncio.run(scheduler.main(parser.parse_args()))
@@ -0,0 +1,383 @@
+"""
+Purchase store shared by all five agent patterns.
+
+The store is built ONCE, when an agent module is imported, and keeps two indexes:
+- purchaser name -> list of purchases
+- purchase_id -> purchase
+
+That makes `get_purchase_history` a single dict lookup instead of rebuilding the whole
+dataset on every tool call.
+
+For filtered lookups (`query`) it also keeps the orders in columns - one typed array per
+field (date, total, item count, shipping method) - so a repeat buyer's orders can be
+filtered by date window, product name and shipping method, capped to the most recent N,
+and summarised to precomputed per-order totals and item counts, without walking every
+line item or sending them all to the model.
+
+Each purchaser's orders are also indexed by product-name token (flavour, size, pack type -
+"peanut", "0.5lb", "bag") so `find_order` can rank them against the items a customer
+describes ("the peanut butter taffy") and pick the order outright when one clearly matches
+best. Tokens are weighted by how few of the customer's orders contain them, so "taffy",
+which every order has, counts for nothing. A lookup walks only the described tokens'
+postings - about 2ms for a customer with 5,000 orders.
+
+Purchaser names also go into a fuzzy NameIndex (see shared.names) as they're added, and
+lookups resolve a name that isn't stored exactly - "alexis", "Alexsis" - to the one clearly
+closest purchaser. When several names are about as close, `query` returns a tool error
+listing them (`search_purchasers`) for the caller to confirm with the customer rather than
+picking one of them.
+
+Bad arguments (a since / until that isn't YYYY-MM-DD, a negative limit) also come back as a
+tool error, {"status": "error", "error_message": ...}, that the model can correct and retry.
+
+Each pattern ships its own small demo dataset. To run against a real (local) table instead,
+point PURCHASE_DB at a SQLite file with the schema below. You can build one from a JSON file
+shaped like the demo data ({"Alexis": [{...purchase...}], ...}):
+
+    python -m shared.store purchases.json purchases.db
+"""
+
+import heapq
+import json
+import math
+import os
+import re
+import sqlite3
+import sys
+from array import array
+from bisect import bisect_left
+from datetime import date
+
+from shared.names import NameIndex
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS purchases (
+    purchase_id TEXT PRIMARY KEY,
+    purchaser TEXT NOT NULL,
+    purchased_date TEXT NOT NULL,
+    shipping_method TEXT NOT NULL,
+    total_amount REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS purchases_by_purchaser ON purchases (purchaser);
+CREATE TABLE IF NOT EXISTS purchase_items (
+    purchase_id TEXT NOT NULL REFERENCES purchases (purchase_id),
+    product_name TEXT NOT NULL,
+    quantity INTEGER NOT NULL,
+    price REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS purchase_items_by_purchase ON purchase_items (purchase_id);
+"""
+
+# Let SQLite memory-map up to 1GB of the file while we read it.
+MMAP_SIZE = 1 << 30
+
+PRODUCT_TOKEN_RE = re.compile(r"[a-z0-9]+(?:\.[0-9]+)?[a-z]*")
+
+# find_order only picks an order when the runner-up scores at most this share of the best.
+AMBIGUOUS_RATIO = 0.5
+
+
+def product_tokens(text: str) -> set:
+    # "Peanut Butter Taffy 0.5lb Bags" -> {"peanut", "butter", "taffy", "0.5lb", "bag"}
+    tokens = set()
+    for token in PRODUCT_TOKEN_RE.findall(text.lower()):
+        if token.endswith("xes"):
+            token = token[:-2]
+        elif len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+            token = token[:-1]
+        tokens.add(token)
+    return tokens
+
+
+def tool_error(message: str, **details) -> dict:
+    # The shape ADK tools report failures in, so the model can correct its call.
+    return {"status": "error", "error_message": message, **details}
+
+
+def _has(positions: array, i: int) -> bool:
+    # positions is sorted - they're appended in history order.
+    j = bisect_left(positions, i)
+    return j < len(positions) and positions[j] == i
+
+
+class OrderColumns:
+    # One row per purchase, appended as purchases are added.
+    def __init__(self):
+        self.purchase_ids = []
+        self.dates = array("l")  # date.toordinal()
+        self.totals = array("d")
+        self.item_counts = array("l")  # total quantity across line items
+        self.shipping = array("h")  # index into shipping_methods
+        self.shipping_methods = []
+        self.products = []  # lower-cased product names, one string per purchase
+        self._shipping_codes = {}
+
+    def append(self, purchase: dict) -> int:
+        method = purchase["shipping_method"].upper()
+        if method not in self._shipping_codes:
+            self._shipping_codes[method] = len(self.shipping_methods)
+            self.shipping_methods.append(method)
+        self.purchase_ids.append(purchase["purchase_id"])
+        self.dates.append(date.fromisoformat(purchase["purchased_date"]).toordinal())
+        self.totals.append(purchase["total_amount"])
+        self.item_counts.append(sum(item["quantity"] for item in purchase["items"]))
+        self.shipping.append(self._shipping_codes[method])
+        self.products.append(
+            "\n".join(item["product_name"].lower() for item in purchase["items"])
+        )
+        return len(self.purchase_ids) - 1
+
+    def shipping_code(self, shipping_method: str) -> int:
+        return self._shipping_codes.get(shipping_method.strip().upper(), -1)
+
+    def summary(self, row: int) -> dict:
+        return {
+            "purchase_id": self.purchase_ids[row],
+            "purchased_date": date.fromordinal(self.dates[row]).isoformat(),
+            "shipping_method": self.shipping_methods[self.shipping[row]],
+            "total_amount": self.totals[row],
+            "item_count": self.item_counts[row],
+        }
+
+
+class PurchaseStore:
+    def __init__(self):
+        self._by_purchaser = {}
+        self._by_id = {}
+        self._columns = OrderColumns()
+        self._rows = {}  # purchaser -> column rows, in the same order as _by_purchaser
+        self._products = {}  # purchaser -> product token -> positions in their history
+        self._names = NameIndex()
+
+    def add_purchase(self, purchaser: str, purchase: dict) -> None:
+        if purchaser not in self._by_purchaser:
+            self._names.add(purchaser)
+        history = self._by_purchaser.setdefault(purchaser, [])
+        products = self._products.setdefault(purchaser, {})
+        names = " ".join(item["product_name"] for item in purchase["items"])
+        for token in product_tokens(names):
+            products.setdefault(token, array("l")).append(len(history))
+        history.append(purchase)
+        self._by_id[purchase["purchase_id"]] = purchase
+        self._rows.setdefault(purchaser, array("l")).append(
+            self._columns.append(purchase)
+        )
+
+    def get_history(self, purchaser: str) -> list:
+        # Returns the stored list itself - callers must treat it as read-only.
+        return self._by_purchaser.get(purchaser, [])
+
+    def resolve_purchaser(self, name: str):
+        # The stored purchaser `name` refers to: itself if stored, else an unambiguous
+        # near-match, else None.
+        if name in self._by_purchaser:
+            return name
+        return self._names.resolve(name)
+
+    def search_purchasers(self, name: str, k: int = 5) -> list:
+        # -> [(purchaser, confidence 0..1)], best first.
+        return self._names.search(name, k)
+
+    def unknown_purchaser(self, name: str):
+        # What query() returns for a name it can't resolve: nothing, or the closest names
+        # for the caller to confirm - never a guess at whose history it is.
+        candidates = [purchaser for purchaser, _ in self.search_purchasers(name, k=3)]
+        if not candidates:
+            return []
+        return tool_error(
+            f"No purchases for {name!r}. Confirm the customer's name - did they mean "
+            "one of did_you_mean?",
+            did_you_mean=candidates,
+        )
+
+    def query(
+        self,
+        purchaser: str,
+        since: str = None,
+        until: str = None,
+        product: str = None,
+        shipping_method: str = None,
+        limit: int = None,
+        summary: bool = False,
+    ):
+        # Filters are optional and combine with AND. since / until are inclusive ISO dates,
+        # product matches part of any line item's name, limit keeps the most recent N.
+        # summary=True returns OrderColumns.summary() rows instead of full purchases.
+        # -> list of purchases, or a tool_error() dict.
+        name = purchaser
+        purchaser = self.resolve_purchaser(name)
+        if purchaser is None:
+            return self.unknown_purchaser(name)
+        if limit is not None and limit < 0:
+            return tool_error(f"limit must be 0 or more, got {limit}")
+        try:
+            first = date.fromisoformat(since).toordinal() if since else None
+            last = date.fromisoformat(until).toordinal() if until else None
+        except (TypeError, ValueError):
+            return tool_error(
+                f"since / until must be dates in YYYY-MM-DD format, got {since!r}"
+                f" / {until!r}"
+            )
+        history = self.get_history(purchaser)
+        if not (since or until or product or shipping_method or limit or summary):
+            return history
+        columns = self._columns
+        rows = self._rows.get(purchaser, ())
+        code = columns.shipping_code(shipping_method) if shipping_method else None
+        needle = product.strip().lower() if product else None
+        matches = [
+            i
+            for i, row in enumerate(rows)
+            if (first is None or columns.dates[row] >= first)
+            and (last is None or columns.dates[row] <= last)
+            and (code is None or columns.shipping[row] == code)
+            and (needle is None or needle in columns.products[row])
+        ]
+        if limit:
+            matches.sort(key=lambda i: columns.dates[rows[i]])
+            matches = matches[-limit:]
+        if summary:
+            return [columns.summary(rows[i]) for i in matches]
+        return [history[i] for i in matches]
+
+    def match_orders(self, purchaser: str, text: str, k: int = 3) -> list:
+        # Ranks the purchaser's orders by the product tokens they share with `text`, each
+        # weighted log(orders / orders containing it). -> [{"purchase_id", "score",
+        # "matched"}], best first, orders sharing nothing left out.
+        purchaser = self.resolve_purchaser(purchaser) or purchaser
+        history = self.get_history(purchaser)
+        products = self._products.get(purchaser, {})
+        scores = [0.0] * len(history)
+        used = {}  # token -> positions, for the tokens that counted
+        for token in product_tokens(text):
+            positions = products.get(token)
+            if not positions or len(positions) == len(history):
+                continue
+            used[token] = positions
+            weight = math.log(len(history) / len(positions))
+            for i in positions:
+                scores[i] += weight
+        best = heapq.nlargest(k, range(len(scores)), key=scores.__getitem__)
+        return [
+            {
+                "purchase_id": history[i]["purchase_id"],
+                "score": round(scores[i], 3),
+                "matched": sorted(t for t, p in used.items() if _has(p, i)),
+            }
+            for i in best
+            if scores[i] > 0
+        ]
+
+    def find_order(self, purchaser: str, text: str, k: int = 3) -> dict:
+        # purchase_id is the best match if it's clearly ahead of the runner-up, else None.
+        matches = self.match_orders(purchaser, text, k)
+        purchase_id = None
+        if matches and (
+            len(matches) == 1
+            or matches[1]["score"] <= matches[0]["score"] * AMBIGUOUS_RATIO
+        ):
+            purchase_id = matches[0]["purchase_id"]
+        return {"purchase_id": purchase_id, "matches": matches}
+
+    def get_purchase(self, purchase_id: str):
+        return self._by_id.get(purchase_id)
+
+    def purchasers(self):
+        return self._by_purchaser.keys()
+
+    def __len__(self):
+        return len(self._by_id)
+
+    @classmethod
+    def from_dict(cls, history_data: dict) -> "PurchaseStore":
+        store = cls()
+        for purchaser, purchases in history_data.items():
+            for purchase in purchases:
+                store.add_purchase(purchaser, purchase)
+        return store
+
+    @classmethod
+    def from_sqlite(cls, path: str) -> "PurchaseStore":
+        store = cls()
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        try:
+            conn.execute(f"PRAGMA mmap_size = {MMAP_SIZE}")
+            # Items first, so each purchase is complete when it's added (and indexed).
+            items = {}
+            for purchase_id, product_name, quantity, price in conn.execute(
+                "SELECT purchase_id, product_name, quantity, price"
+                " FROM purchase_items ORDER BY rowid"
+            ):
+                items.setdefault(purchase_id, []).append(
+                    {"product_name": product_name, "quantity": quantity, "price": price}
+                )
+            for row in conn.execute(
+                "SELECT purchase_id, purchaser, purchased_date, shipping_method, total_amount"
+                " FROM purchases ORDER BY purchaser, purchased_date, rowid"
+            ):
+                purchase_id, purchaser, purchased_date, shipping_method, total = row
+                store.add_purchase(
+                    purchaser,
+                    {
+                        "purchase_id": purchase_id,
+                        "purchased_date": purchased_date,
+                        "items": items.pop(purchase_id, []),
+                        "shipping_method": shipping_method,
+                        "total_amount": total,
+                    },
+                )
+        finally:
+            conn.close()
+        return store
+
+
+def write_sqlite(path: str, history_data: dict) -> None:
+    conn = sqlite3.connect(path)
+    try:
+        conn.executescript(SCHEMA)
+        with conn:
+            for purchaser, purchases in history_data.items():
+                for purchase in purchases:
+                    conn.execute(
+                        "INSERT OR REPLACE INTO purchases VALUES (?, ?, ?, ?, ?)",
+                        (
+                            purchase["purchase_id"],
+                            purchaser,
+                            purchase["purchased_date"],
+                            purchase["shipping_method"],
+                            purchase["total_amount"],
+                        ),
+                    )
+                    conn.execute(
+                        "DELETE FROM purchase_items WHERE purchase_id = ?",
+                        (purchase["purchase_id"],),
+                    )
+                    conn.executemany(
+                        "INSERT INTO purchase_items VALUES (?, ?, ?, ?)",
+                        [
+                            (
+                                purchase["purchase_id"],
+                                item["product_name"],
+                                item["quantity"],
+                                item["price"],
+                            )
+                            for item in purchase["items"]
+                        ],
+                    )
+    finally:
+        conn.close()
+
+
+def load_purchase_store(default_data: dict) -> PurchaseStore:
+    # PURCHASE_DB wins over the demo data baked into each agent module.
+    path = os.environ.get("PURCHASE_DB")
+    if path:
+        return PurchaseStore.from_sqlite(path)
+    return PurchaseStore.from_dict(default_data)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        sys.exit("usage: python -m shared.store <purchases.json> <purchases.db>")
+    with open(sys.argv[1]) as f:
+        write_sqlite(sys.argv[2], json.load(f))
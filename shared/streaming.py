@@ -0,0 +1,176 @@
+"""
+Streaming entry point: send the customer the final answer as it's generated.
+
+Without streaming, customers wait for RefundProcessorAgent (patterns 3/4), Coordinator
+(pattern 2) or refundagent (pattern 1) to finish its whole message - the longest generation
+in every pattern - before they see anything. stream_reply() runs a root_agent with SSE
+streaming and yields text chunks, but only from the agents that talk to the customer
+(USER_FACING_AGENTS). Sub-agents whose output only goes into state are never forwarded.
+
+If a deadline (shared.deadlines) cuts off a message while it's streaming, stream_reply
+yields RETRACT: drop what was shown of that message - the fallback reply follows.
+
+    async for chunk in stream_reply(runner, user_id, session_id, message, timer=timer):
+        if chunk is RETRACT:
+            clear_message()
+        else:
+            send(chunk)
+    timer.ttft, timer.total   # seconds to the first chunk / to the end of the turn
+
+    python -m shared.streaming -p 3 4 --stub-latency 0.8    # TTFT streamed vs. not, offline
+    python -m shared.streaming -p 3 --stub-latency 0.8 --show
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+from dataclasses import dataclass
+from typing import AsyncGenerator, Union
+
+from google.adk.agents.run_config import RunConfig, StreamingMode
+from google.adk.runners import Runner
+from google.adk.sessions import InMemorySessionService
+from google.genai import types
+
+from shared.patterns import PATTERNS, load_root_agent, resolve_pattern
+
+# pattern -> agents whose text goes to the customer. Code agents that answer with a template
+# (EligibilityGate, RefundLoopController) are listed too; they just never stream partials.
+USER_FACING_AGENTS = {
+    "1-llm-single-agent": {"refundagent"},
+    "2-llm-multi-agent": {
+        "Coordinator",
+        "PurchaseVerifierAgent",
+        "RefundPolicyApplierAgent",
+        "RefundProcessorAgent",
+    },
+    # Sub-agents answer the coordinator as tool results, so only it talks to the user.
+    "2-llm-multi-agent:agent_tools": {"Coordinator"},
+    "3-workflow-sequential-multi-agent": {"RefundProcessorAgent"},
+    "4-workflow-parallel-multi-agent": {"RefundProcessorAgent", "EligibilityGate"},
+    "5-workflow-loop-multi-agent": {
+        "RefundLoopController",
+        "RefundLoopCheckerAgent",
+        "RefundLoopNegotiatorAgent",
+    },
+}
+
+RETRACT = object()
+
+
+@dataclass
+class StreamTimer:
+    started: float = 0.0
+    first_chunk: float = None
+    finished: float = None
+
+    @property
+    def ttft(self) -> float:
+        return None if self.first_chunk is None else self.first_chunk - self.started
+
+    @property
+    def total(self) -> float:
+        return None if self.finished is None else self.finished - self.started
+
+
+def _text(event) -> str:
+    if not event.content or not event.content.parts:
+        return ""
+    return "".join(part.text or "" for part in event.content.parts if not part.thought)
+
+
+async def stream_reply(
+    runner: Runner,
+    user_id: str,
+    session_id: str,
+    message: str,
+    user_facing: set = None,
+    timer: StreamTimer = None,
+    streaming: bool = True,
+) -> AsyncGenerator[Union[str, object], None]:
+    user_facing = user_facing or USER_FACING_AGENTS.get(runner.app_name, set())
+    timer = timer or StreamTimer()
+    timer.started = time.perf_counter()
+    run_config = RunConfig(
+        streaming_mode=StreamingMode.SSE if streaming else StreamingMode.NONE
+    )
+    content = types.Content(role="user", parts=[types.Part(text=message)])
+    streamed = set()  # authors whose current message already went out as partials
+    async for event in runner.run_async(
+        user_id=user_id, session_id=session_id, new_message=content, run_config=run_config
+    ):
+        if event.interrupted and event.author in streamed:
+            # Cut off by its deadline - the fallback reply (if any) replaces it.
+            streamed.discard(event.author)
+            yield RETRACT
+        text = _text(event)
+        if not text or event.author not in user_facing:
+            continue
+        if event.partial:
+            streamed.add(event.author)
+        elif event.author in streamed:
+            # The aggregated copy of what we just streamed.
+            streamed.discard(event.author)
+            continue
+        if timer.first_chunk is None:
+            timer.first_chunk = time.perf_counter()
+        yield text
+    timer.finished = time.perf_counter()
+
+
+async def measure(pattern: str, message: str, streaming: bool, show: bool = False):
+    runner = Runner(
+        app_name=pattern,
+        agent=load_root_agent(pattern),
+        session_service=InMemorySessionService(),
+    )
+    session = await runner.session_service.create_session(
+        app_name=pattern, user_id="stream"
+    )
+    timer = StreamTimer()
+    async for chunk in stream_reply(
+        runner, "stream", session.id, message, timer=timer, streaming=streaming
+    ):
+        if show and chunk is RETRACT:
+            print(" [cut off]")
+        elif show:
+            print(chunk, end="", flush=True)
+    if show:
+        print()
+    return timer
+
+
+async def main(args) -> None:
+    print(f"{'pattern':<36}{'mode':<10}{'TTFT ms':>10}{'total ms':>10}", file=sys.stderr)
+    for name in args.patterns:
+        pattern = resolve_pattern(name)
+        if args.stub_latency is not None:
+            from shared.benchmark import SCRIPTS, install_stubs
+
+            install_stubs(
+                load_root_agent(pattern), SCRIPTS[pattern], args.stub_latency, []
+            )
+        for streaming in (False, True):
+            timer = await measure(pattern, args.message, streaming, args.show)
+            ttft = "-" if timer.ttft is None else f"{timer.ttft * 1000:.0f}"
+            print(
+                f"{pattern:<36}{'stream' if streaming else 'whole':<10}"
+                f"{ttft:>10}{timer.total * 1000:>10.0f}",
+                file=sys.stderr,
+            )
+
+
+if __name__ == "__main__":
+    from shared.benchmark import DEFAULT_MESSAGE
+
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("-p", "--patterns", nargs="+", default=PATTERNS)
+    parser.add_argument("--message", default=DEFAULT_MESSAGE)
+    parser.add_argument(
+        "--stub-latency",
+        type=float,
+        help="use the offline StubModel with this many seconds per call",
+    )
+    parser.add_argument("--show", action="store_true", help="print the streamed text")
+    asyncio.run(main(parser.parse_args()))
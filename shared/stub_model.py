@@ -0,0 +1,241 @@
+"""
+Local stand-in for Gemini, for offline benchmarks and tests.
+
+A StubModel answers from a script instead of calling a real model:
+
+    log = []
+    agent.model = StubModel(
+        agent_name=agent.name,
+        replies=[call("get_purchase_history", purchaser="David"), say("Found it!")],
+        latency=0.2,
+        log=log,
+    )
+
+Reply N is used for the agent's Nth model turn in the conversation (counted from the model
+turns already in the request), and the last reply repeats once the script runs out.
+
+When ADK asks for a streamed response (RunConfig streaming_mode=SSE), text replies come back
+word by word as partial responses: the first one after `first_token_latency` (default: a
+quarter of the call's latency), the rest spread evenly over the remaining time, followed by
+the complete response.
+
+Give several StubModels one FakeModelServer to model the endpoint they share under load: a
+fixed number of concurrent slots (requests queue for a free one), a requests-per-second limit
+answered with 429s, and random 503s - the same errors google-genai raises.
+
+Every call is appended to `log` as a ModelCall, with token counts estimated from the
+request / response text.
+"""
+
+import asyncio
+import contextlib
+import json
+import math
+import random
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import AsyncGenerator, Any
+
+from google.adk.models.base_llm import BaseLlm
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from google.genai import errors, types
+from pydantic import Field
+
+
+def call(tool_name: str, **args) -> types.Part:
+    return types.Part(function_call=types.FunctionCall(name=tool_name, args=args))
+
+
+def say(text: str) -> types.Part:
+    return types.Part(text=text)
+
+
+def estimate_tokens(text: str) -> int:
+    # Roughly 4 characters per token for English text - close enough to compare patterns.
+    return max(1, len(text) // 4) if text else 0
+
+
+def request_text(llm_request: LlmRequest) -> str:
+    chunks = []
+    config = llm_request.config
+    if config and config.system_instruction:
+        chunks.append(str(config.system_instruction))
+    for content in llm_request.contents:
+        chunks.extend(part_text(part) for part in content.parts or [])
+    return "\n".join(chunks)
+
+
+def part_text(part: types.Part) -> str:
+    if part.text:
+        return part.text
+    if part.function_call:
+        return part.function_call.name + json.dumps(part.function_call.args or {})
+    if part.function_response:
+        return json.dumps(part.function_response.response or {}, default=str)
+    return ""
+
+
+@dataclass
+class ModelCall:
+    agent_name: str
+    started: float
+    ended: float
+    prompt_tokens: int
+    completion_tokens: int
+
+    @property
+    def latency(self) -> float:
+        return self.ended - self.started
+
+
+def constant(seconds: float):
+    return lambda: seconds
+
+
+def uniform(low: float, high: float):
+    return lambda: random.uniform(low, high)
+
+
+def lognormal(median: float, sigma: float):
+    # Long right tail, like real model latencies; sigma=0 is constant(median).
+    return lambda: random.lognormvariate(math.log(median), sigma)
+
+
+def _api_error(error_class, code: int, status: str, message: str):
+    return error_class(
+        code, {"error": {"code": code, "message": message, "status": status}}
+    )
+
+
+class FakeModelServer:
+    def __init__(
+        self,
+        max_concurrency: int = None,
+        rate_limit: float = None,
+        error_rate: float = 0.0,
+    ):
+        self.max_concurrency = max_concurrency  # None: unlimited
+        self.rate_limit = rate_limit  # requests per second, None: unlimited
+        self.error_rate = error_rate  # share of admitted requests that fail with a 503
+        self._slots = asyncio.Semaphore(max_concurrency) if max_concurrency else None
+        self._admitted = deque()  # admission times within the last second
+        self.requests = 0
+        self.rate_limited = 0
+        self.errors = 0
+        self.queued = 0  # waiting for a slot
+        self.in_flight = 0
+        self.peak_queued = 0
+        self.peak_in_flight = 0
+
+    def _admit(self) -> None:
+        self.requests += 1
+        now = time.perf_counter()
+        while self._admitted and self._admitted[0] <= now - 1.0:
+            self._admitted.popleft()
+        if self.rate_limit is not None and len(self._admitted) >= self.rate_limit:
+            self.rate_limited += 1
+            raise _api_error(
+                errors.ClientError, 429, "RESOURCE_EXHAUSTED", "Rate limit exceeded."
+            )
+        self._admitted.append(now)
+
+    @contextlib.asynccontextmanager
+    async def request(self):
+        self._admit()
+        self.queued += 1
+        self.peak_queued = max(self.peak_queued, self.queued)
+        async with self._slots or contextlib.nullcontext():
+            self.queued -= 1
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+            try:
+                if random.random() < self.error_rate:
+                    self.errors += 1
+                    raise _api_error(
+                        errors.ServerError, 503, "UNAVAILABLE", "Model overloaded."
+                    )
+                yield
+            finally:
+                self.in_flight -= 1
+
+
+class StubModel(BaseLlm):
+    model: str = "stub"
+    agent_name: str = ""
+    replies: list = Field(default_factory=list)
+    # Seconds per call, or a zero-argument callable returning seconds (see constant/uniform).
+    latency: Any = 0.0
+    # Seconds until the first streamed chunk; None means a quarter of the call's latency.
+    first_token_latency: Any = None
+    # Shared with the caller as-is (typed Any so pydantic doesn't copy it).
+    log: Any = Field(default_factory=list)
+    # Optional FakeModelServer shared by several stubs.
+    server: Any = None
+
+    def next_reply(self, llm_request: LlmRequest) -> list:
+        if not self.replies:
+            return [say("OK")]
+        turn = sum(1 for content in llm_request.contents if content.role == "model")
+        reply = self.replies[min(turn, len(self.replies) - 1)]
+        return reply if isinstance(reply, list) else [reply]
+
+    def delay(self) -> float:
+        return self.latency() if callable(self.latency) else self.latency
+
+    async def generate_content_async(
+        self, llm_request: LlmRequest, stream: bool = False
+    ) -> AsyncGenerator[LlmResponse, None]:
+        if self.server is None:
+            async for response in self._generate(llm_request, stream):
+                yield response
+            return
+        async with self.server.request():
+            async for response in self._generate(llm_request, stream):
+                yield response
+
+    async def _generate(
+        self, llm_request: LlmRequest, stream: bool
+    ) -> AsyncGenerator[LlmResponse, None]:
+        started = time.perf_counter()
+        parts = self.next_reply(llm_request)
+        delay = self.delay()
+        text = "".join(part.text or "" for part in parts)
+        if stream and text and len(parts) == 1:
+            first = self.first_token_latency
+            first = delay / 4 if first is None else first
+            words = text.split(" ")
+            gap = max(0.0, delay - first) / len(words)
+            await asyncio.sleep(first)
+            for i, word in enumerate(words):
+                if i:
+                    await asyncio.sleep(gap)
+                chunk = word if i == len(words) - 1 else word + " "
+                yield LlmResponse(
+                    content=types.Content(role="model", parts=[say(chunk)]),
+                    partial=True,
+                )
+        else:
+            await asyncio.sleep(delay)
+
+        prompt_tokens = estimate_tokens(request_text(llm_request))
+        completion_tokens = sum(estimate_tokens(part_text(part)) for part in parts)
+        self.log.append(
+            ModelCall(
+                agent_name=self.agent_name,
+                started=started,
+                ended=time.perf_counter(),
+                prompt_tokens=prompt_tokens,
+                completion_tokens=completion_tokens,
+            )
+        )
+        yield LlmResponse(
+            content=types.Content(role="model", parts=parts),
+            partial=False,
+            usage_metadata=types.GenerateContentResponseUsageMetadata(
+                prompt_token_count=prompt_tokens,
+                candidates_token_count=completion_tokens,
+                total_token_count=prompt_tokens + completion_tokens,
+            ),
+        )
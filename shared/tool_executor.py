@@ -0,0 +1,76 @@
+"""
+Runs an agent's function tools off the event loop, so independent calls overlap.
+
+When a model response contains several function calls, ADK starts them together and merges
+their responses back in call order. That only helps for async tools, though: a plain `def`
+tool backed by a blocking database or payment call runs on the event loop thread and holds
+up everything else until it returns. ToolExecutor wraps each tool in an async function that
+runs sync tools on a bounded thread pool (async tools are awaited as they are), so a turn
+costs as long as its slowest tool instead of the sum of them all.
+
+    tool_executor = ToolExecutor(max_workers=8, timeout=10.0, timeouts={"process_refund": None})
+    root_agent = Agent(..., tools=tool_executor.wrap_all([get_purchase_history, ...]))
+
+A call that runs past its timeout returns {"status": "error", "error_message": ...} to the
+model instead of raising. The worker thread can't be interrupted, so a timed-out call still
+finishes in the background - and a model that retries it runs it twice. Tools with side
+effects (refunds) should get a timeout of None, which waits for them however long they take.
+"""
+
+import asyncio
+import functools
+import inspect
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+
+
+class ToolExecutor:
+    def __init__(
+        self,
+        max_workers: int = 8,
+        timeout: Optional[float] = None,
+        timeouts: Optional[dict] = None,
+    ):
+        self.max_workers = max_workers
+        self.timeout = timeout  # seconds, per call; None waits forever
+        # tool name -> timeout, overrides the default; None never times out
+        self.timeouts = timeouts or {}
+        self._pool = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="tool"
+        )
+
+    def timeout_for(self, tool_name: str) -> Optional[float]:
+        return self.timeouts.get(tool_name, self.timeout)
+
+    def wrap(self, func: Callable) -> Callable:
+        # functools.wraps keeps the name, docstring and signature, which is what ADK builds
+        # the function declaration the model sees from.
+        name = func.__name__
+        is_async = inspect.iscoroutinefunction(func)
+
+        @functools.wraps(func)
+        async def run_tool(*args, **kwargs):
+            if is_async:
+                pending = func(*args, **kwargs)
+            else:
+                loop = asyncio.get_running_loop()
+                pending = loop.run_in_executor(
+                    self._pool, functools.partial(func, *args, **kwargs)
+                )
+            timeout = self.timeout_for(name)
+            try:
+                return await asyncio.wait_for(pending, timeout)
+            except asyncio.TimeoutError:
+                return {
+                    "status": "error",
+                    "error_message": f"{name} timed out after {timeout}s",
+                }
+
+        return run_tool
+
+    def wrap_all(self, tools: list) -> list:
+        # Only plain functions are wrapped - BaseTool instances (AgentTool, ...) pass through.
+        return [self.wrap(t) if inspect.isfunction(t) else t for t in tools]
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._pool.shutdown(wait=wait)
@@ -0,0 +1,81 @@
+"""
+Deterministic (non-LLM) purchase verifier for the workflow patterns (3, 4 and 5).
+
+The LLM PurchaseVerifierAgent spends a whole model round trip just to call
+get_purchase_history and restate the result into state['purchase_history'].
+PurchaseLookupAgent does the same thing in code:
+1. Find the purchaser's name in the user's message (or reuse the one from an earlier turn).
+2. Look them up in the purchase store.
+3. Write the structured history straight into session state - no model call.
+
+If no known purchaser name can be found, it hands off to the LLM verifier (its only sub-agent).
+"""
+
+import re
+from typing import AsyncGenerator
+
+from google.adk.agents import BaseAgent
+from google.adk.agents.invocation_context import InvocationContext
+from google.adk.events import Event, EventActions
+
+from shared.store import PurchaseStore
+
+# Customer names are at most a few words long ("Alexis", "Mary Ann Lee").
+MAX_NAME_WORDS = 3
+
+_WORD_RE = re.compile(r"[A-Za-z][A-Za-z'.-]*")
+
+
+def user_message_text(ctx: InvocationContext) -> str:
+    if not ctx.user_content or not ctx.user_content.parts:
+        return ""
+    return " ".join(part.text for part in ctx.user_content.parts if part.text)
+
+
+def find_purchaser(text: str, store: PurchaseStore):
+    # Try every run of 1..MAX_NAME_WORDS words against the purchaser index, longest first,
+    # so "Mary Ann" wins over "Mary". Each check is a dict lookup.
+    words = [w.strip(".'-") for w in _WORD_RE.findall(text)]
+    for size in range(MAX_NAME_WORDS, 0, -1):
+        for start in range(len(words) - size + 1):
+            candidate = " ".join(words[start : start + size])
+            for name in (candidate, candidate.title()):
+                if store.get_history(name):
+                    return name
+    return None
+
+
+class PurchaseLookupAgent(BaseAgent):
+    store: PurchaseStore
+    output_key: str = "purchase_history"
+
+    # State keys this agent reads / writes itself (see shared.planner).
+    def state_reads(self) -> set:
+        return {"purchaser"}
+
+    def state_writes(self) -> set:
+        return {"purchaser", self.output_key}
+
+    async def _run_async_impl(
+        self, ctx: InvocationContext
+    ) -> AsyncGenerator[Event, None]:
+        purchaser = find_purchaser(user_message_text(ctx), self.store)
+        if purchaser is None:
+            purchaser = ctx.session.state.get("purchaser")
+
+        if purchaser is None:
+            # Couldn't pin down a name - let the LLM verifier ask / figure it out.
+            for fallback in self.sub_agents:
+                async for event in fallback.run_async(ctx):
+                    yield event
+            return
+
+        yield Event(
+            author=self.name,
+            actions=EventActions(
+                state_delta={
+                    "purchaser": purchaser,
+                    self.output_key: self.store.get_history(purchaser),
+                }
+            ),
+        )
@@ -0,0 +1,55 @@
+import asyncio
+import importlib
+import unittest
+
+from google.adk.runners import Runner
+from google.adk.sessions import InMemorySessionService
+
+from shared.benchmark import DEFAULT_MESSAGE, SCRIPTS, install_stubs, run_once
+from shared.stub_model import constant
+
+agent_tools = importlib.import_module("2-llm-multi-agent.agent_tools")
+
+
+class AgentToolsTest(unittest.TestCase):
+    def test_tool_agents_have_no_parent(self):
+        for tool in agent_tools.root_agent.tools:
+            self.assertIsNone(tool.agent.parent_agent, tool.agent.name)
+            self.assertEqual(tool.agent.sub_agents, [])
+
+    def test_eligible_shipping_methods(self):
+        self.assertEqual(
+            agent_tools.eligible_shipping_methods("DAMAGED"), ["INSURED", "OVERNIGHT"]
+        )
+        self.assertEqual(agent_tools.eligible_shipping_methods("RACCOON_ATE_IT"), [])
+
+    def test_verifier_and_policy_run_concurrently(self):
+        log = []
+        root_agent = agent_tools.root_agent
+        install_stubs(
+            root_agent, SCRIPTS["2-llm-multi-agent:agent_tools"], constant(0.05), log
+        )
+        runner = Runner(
+            app_name="agent_tools",
+            agent=root_agent,
+            session_service=InMemorySessionService(),
+        )
+        counts = asyncio.run(run_once(runner, DEFAULT_MESSAGE, log))
+
+        def calls(agent_name):
+            return [call for call in log if call.agent_name == agent_name]
+
+        verifier = calls("PurchaseVerifierAgent")
+        policy = calls("RefundPolicyApplierAgent")
+        # Each one's first model call starts before the other's ends.
+        self.assertLess(verifier[0].started, policy[0].ended)
+        self.assertLess(policy[0].started, verifier[0].ended)
+        # The refund needs both answers.
+        (first_refund_call, *_) = calls("RefundProcessorAgent")
+        last = max(call.ended for call in verifier + policy)
+        self.assertGreaterEqual(first_refund_call.started, last)
+        self.assertLess(counts["critical_path"], counts["model_calls"])
+
+
+if __name__ == "__main__":
+    unittest.main()
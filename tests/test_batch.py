@@ -0,0 +1,119 @@
+import asyncio
+import importlib
+import json
+import os
+import tempfile
+import unittest
+
+from google.adk.agents import BaseAgent
+from google.adk.events import Event
+from google.genai import types
+
+from shared.batch import completed_ids, run_batch
+
+loop = importlib.import_module("5-workflow-loop-multi-agent.agent")
+
+
+class EchoAgent(BaseAgent):
+    async def _run_async_impl(self, ctx):
+        text = ctx.user_content.parts[0].text
+        yield Event(
+            author=self.name,
+            content=types.Content(role="model", parts=[types.Part(text=text)]),
+        )
+
+
+class BatchResumeTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+        self.input = os.path.join(self.dir.name, "requests.jsonl")
+        self.output = os.path.join(self.dir.name, "results.jsonl")
+
+    def write(self, path, lines):
+        with open(path, "w") as f:
+            f.write("\n".join(lines) + "\n")
+
+    def results(self):
+        with open(self.output) as f:
+            return [json.loads(line) for line in f]
+
+    def run_batch(self):
+        return asyncio.run(
+            run_batch("1", self.input, self.output, 2, EchoAgent(name="Echo"))
+        )
+
+    def test_completed_ids_skips_only_successes(self):
+        self.write(
+            self.output,
+            [
+                json.dumps({"id": "a", "error": None}),
+                json.dumps({"id": "b", "error": "TimeoutError: "}),
+                '{"id": "c", "err',
+            ],
+        )
+        self.assertEqual(completed_ids(self.output), {"a"})
+
+    def test_malformed_request_fails_alone(self):
+        self.write(
+            self.input,
+            [
+                json.dumps({"id": "a", "message": "my taffy melted"}),
+                json.dumps({"id": "b", "text": "no message key"}),
+                json.dumps({"id": "c", "message": "it never arrived"}),
+            ],
+        )
+        report = self.run_batch()
+        self.assertEqual((report["completed"], report["failed"]), (2, 1))
+        by_id = {result["id"]: result for result in self.results()}
+        self.assertEqual(by_id["c"]["response"], "it never arrived")
+        self.assertIn("KeyError", by_id["b"]["error"])
+
+    def test_unparseable_line_fails_alone(self):
+        self.write(
+            self.input,
+            [
+                json.dumps({"id": "a", "message": "my taffy melted"}),
+                '{"id": "b", "message": "cut off',
+                '["not", "an", "object"]',
+                json.dumps({"id": "d", "message": "it never arrived"}),
+            ],
+        )
+        report = self.run_batch()
+        self.assertEqual((report["completed"], report["failed"]), (2, 2))
+        by_id = {result["id"]: result for result in self.results()}
+        self.assertEqual(by_id["d"]["response"], "it never arrived")
+        self.assertIn("JSONDecodeError", by_id["2"]["error"])
+        self.assertIn("JSON object", by_id["3"]["error"])
+
+    def test_resume_retries_failed_requests(self):
+        self.write(self.input, [json.dumps({"id": "a", "message": "my taffy melted"})])
+        self.write(self.output, [json.dumps({"id": "a", "error": "TimeoutError: "})])
+        report = self.run_batch()
+        self.assertEqual((report["completed"], report["skipped"]), (1, 0))
+
+        report = self.run_batch()
+        self.assertEqual((report["completed"], report["skipped"]), (0, 1))
+
+
+class ProcessRefundsTest(unittest.TestCase):
+    def test_one_result_per_refund(self):
+        results = loop.process_refunds(
+            [
+                {"amount": 8.0, "order_id": "SG005-20250612"},
+                {"amount": 8.0, "order_id": "SG005-20250612"},
+                {"order_id": "SG009-20250701"},
+                {"amount": 42.0},
+            ]
+        )
+        self.assertEqual(
+            [result["order_id"] for result in results],
+            ["SG005-20250612", "SG005-20250612", "SG009-20250701", None],
+        )
+        self.assertEqual(results[1]["result"], "Refund processed successfully")
+        for result in results[2:]:
+            self.assertEqual(result["result"]["status"], "error")
+
+
+if __name__ == "__main__":
+    unittest.main()
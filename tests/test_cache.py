@@ -0,0 +1,80 @@
+import os
+import tempfile
+import time
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from google.genai import types
+
+from shared.cache import MemoryBackend, ResponseCache, SqliteBackend, request_key
+
+
+def request(message, instruction="Check the refund policy."):
+    return LlmRequest(
+        model="stub",
+        contents=[types.Content(role="user", parts=[types.Part(text=message)])],
+        config=types.GenerateContentConfig(system_instruction=instruction),
+    )
+
+
+def response(text):
+    content = types.Content(role="model", parts=[types.Part(text=text)])
+    return LlmResponse(content=content)
+
+
+class BackendTest(unittest.TestCase):
+    def check_backend(self, backend):
+        backend.set("a", "1", ttl=60)
+        backend.set("b", "2", ttl=60)
+        self.assertEqual(backend.get("a"), "1")
+        backend.set("c", "3", ttl=60)  # over max_entries: b was used least recently
+        self.assertIsNone(backend.get("b"))
+        self.assertEqual(backend.get("c"), "3")
+
+        backend.set("d", "4", ttl=60)
+        with mock.patch("time.time", return_value=time.time() + 120):
+            self.assertIsNone(backend.get("d"))
+
+    def test_memory_backend(self):
+        self.check_backend(MemoryBackend(max_entries=2))
+
+    def test_sqlite_backend(self):
+        with tempfile.TemporaryDirectory() as directory:
+            backend = SqliteBackend(os.path.join(directory, "cache.db"), max_entries=2)
+            self.check_backend(backend)
+            backend._conn.close()
+
+
+class ResponseCacheTest(unittest.TestCase):
+    def test_key_covers_instruction_and_contents(self):
+        key = request_key("Agent", request("melted"))
+        self.assertEqual(key, request_key("Agent", request("melted")))
+        self.assertNotEqual(key, request_key("Other", request("melted")))
+        self.assertNotEqual(key, request_key("Agent", request("lost")))
+        self.assertNotEqual(key, request_key("Agent", request("melted", "New rules.")))
+
+    def test_second_identical_request_is_a_hit(self):
+        cache = ResponseCache()
+        context = SimpleNamespace(agent_name="Agent", invocation_id="inv-1")
+        self.assertIsNone(cache.before_model_callback(context, request("melted")))
+        cache.after_model_callback(context, response("TRUE"))
+
+        context.invocation_id = "inv-2"
+        cached = cache.before_model_callback(context, request("melted"))
+        self.assertEqual(cached.content.parts[0].text, "TRUE")
+        self.assertEqual((cache.totals().hits, cache.totals().misses), (1, 1))
+
+    def test_errors_are_not_cached(self):
+        cache = ResponseCache()
+        context = SimpleNamespace(agent_name="Agent", invocation_id="inv-1")
+        cache.before_model_callback(context, request("melted"))
+        error = LlmResponse(error_code="RESOURCE_EXHAUSTED")
+        cache.after_model_callback(context, error)
+        self.assertIsNone(cache.before_model_callback(context, request("melted")))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,69 @@
+import asyncio
+import os
+import tempfile
+import unittest
+
+from google.adk.agents import Agent
+
+from shared.cassette import (
+    RECORD,
+    REPLAY,
+    Cassette,
+    CassetteMiss,
+    run_conversation,
+    use_cassette,
+)
+from shared.stub_model import StubModel, constant, say
+
+MESSAGES = ["Hi, I'm David. My taffy melted.", "Thanks!"]
+
+
+def agent(instruction="Help the customer with their refund."):
+    stub = StubModel(
+        agent_name="RefundAgent",
+        replies=[say("Sorry to hear that!"), say("You're welcome!")],
+        latency=constant(0.2),
+    )
+    return Agent(name="RefundAgent", model=stub, instruction=instruction)
+
+
+class CassetteTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "refund.cassette")
+        cassette = Cassette("test", MESSAGES)
+        root_agent = agent()
+        use_cassette(root_agent, cassette, RECORD)
+        asyncio.run(run_conversation(root_agent, MESSAGES))
+        cassette.save(self.path)
+
+    def replay(self, root_agent, **options):
+        cassette = Cassette.load(self.path)
+        use_cassette(root_agent, cassette, REPLAY, **options)
+        seconds = asyncio.run(run_conversation(root_agent, cassette.messages))
+        return cassette, seconds
+
+    def test_round_trip(self):
+        cassette = Cassette.load(self.path)
+        self.assertEqual(cassette.messages, MESSAGES)
+        self.assertEqual(len(cassette.recordings), 2)
+        self.assertGreaterEqual(cassette.recordings[0].latency, 0.2)
+
+    def test_replay_matches_without_the_model(self):
+        cassette, seconds = self.replay(agent(), latency_scale=0.0)
+        self.assertEqual(cassette.finish(), [])
+        self.assertLess(seconds, 0.2)
+
+    def test_changed_prompt_is_a_divergence(self):
+        cassette, _ = self.replay(agent("Help the customer quickly."), latency_scale=0)
+        divergences = cassette.finish()
+        self.assertEqual([d.kind for d in divergences], ["miss", "miss"])
+        self.assertIn("quickly", divergences[0].detail)
+
+        with self.assertRaises(CassetteMiss), self.assertLogs(level="ERROR"):
+            self.replay(agent("Help the customer quickly."), strict=True)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,73 @@
+import unittest
+from types import SimpleNamespace
+
+from google.genai import types
+
+from shared.classifier import (
+    ReasonClassifier,
+    ReasonClassifierAgent,
+    shipping_method_from_state,
+)
+
+
+def invocation(message, **state):
+    content = types.Content(role="user", parts=[types.Part(text=message)])
+    return SimpleNamespace(user_content=content, session=SimpleNamespace(state=state))
+
+
+def check(reason, shipping_method):
+    return reason == "DAMAGED" and shipping_method == "INSURED"
+
+
+INSURED = [{"shipping_method": "INSURED"}]
+
+
+class ReasonClassifierTest(unittest.TestCase):
+    def setUp(self):
+        self.classifier = ReasonClassifier()
+
+    def test_clear_reasons(self):
+        for text, reason in (
+            ("My taffy arrived completely melted", "DAMAGED"),
+            ("the package never arrived", "LOST"),
+            ("I think it was stolen off my porch", "LOST"),
+            ("it took forever to get here", "LATE"),
+        ):
+            self.assertEqual(self.classifier.classify(text)[0], reason, text)
+
+    def test_competing_reasons_lower_the_confidence(self):
+        _, clear = self.classifier.classify("it arrived melted")
+        _, mixed = self.classifier.classify("it arrived late and melted")
+        self.assertLess(mixed, clear)
+
+    def test_no_reason(self):
+        self.assertEqual(self.classifier.classify("hello there"), ("OTHER", 0.0))
+
+    def test_shipping_method_from_state(self):
+        insured = {"purchase_history": INSURED}
+        self.assertEqual(shipping_method_from_state(insured), "INSURED")
+        mixed = INSURED + [{"shipping_method": "STANDARD"}]
+        self.assertIsNone(shipping_method_from_state({"purchase_history": mixed}))
+        self.assertIsNone(shipping_method_from_state({"purchase_history": "text"}))
+
+
+class ReasonClassifierAgentTest(unittest.TestCase):
+    def setUp(self):
+        self.agent = ReasonClassifierAgent(name="Classifier", check_eligible=check)
+
+    def test_decides_without_a_model(self):
+        ctx = invocation("my taffy melted", purchase_history=INSURED)
+        self.assertEqual(self.agent._decide(ctx), ("DAMAGED", True))
+
+    def test_reuses_the_earlier_reason(self):
+        ctx = invocation("ok, thanks", purchase_history=INSURED, refund_reason="LOST")
+        self.assertEqual(self.agent._decide(ctx), ("LOST", False))
+
+    def test_leaves_unclear_requests_to_the_llm(self):
+        unclear = invocation("hi", purchase_history=INSURED)
+        self.assertIsNone(self.agent._decide(unclear))
+        self.assertIsNone(self.agent._decide(invocation("my taffy melted")))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,83 @@
+import unittest
+from types import SimpleNamespace
+
+from google.adk.agents import Agent
+from google.adk.models.llm_request import LlmRequest
+from google.genai import types
+
+from shared.context_cache import (
+    ContextCache,
+    prefix_segments,
+    split_instruction,
+    split_instructions,
+)
+
+CRITERIA = """
+    This is how you decide if the customer should get a refund.
+
+    1 - They must have a valid purchase history: {purchase_history}
+
+    2 - They must also be eligible for a refund: {is_refund_eligible}
+
+    Always make a "refund" or "no refund" decision, for {purchase_history}.
+"""
+
+
+class SplitInstructionTest(unittest.TestCase):
+    def test_criteria_text_stays_static(self):
+        static, dynamic = split_instruction(CRITERIA)
+        self.assertIn(
+            "1 - They must have a valid purchase history: [purchase_history, below]",
+            static,
+        )
+        self.assertIn("eligible for a refund: [is_refund_eligible, below]", static)
+        self.assertNotIn("{", static)
+        self.assertEqual(
+            dynamic,
+            "purchase_history:\n{purchase_history}\n\n"
+            "is_refund_eligible:\n{is_refund_eligible}",
+        )
+
+    def test_optional_placeholders_stay_optional(self):
+        _, dynamic = split_instruction("The reason was {refund_reason?}.")
+        self.assertEqual(dynamic, "refund_reason:\n{refund_reason?}")
+
+    def test_split_instructions(self):
+        agent = Agent(name="RefundProcessorAgent", model="stub", instruction=CRITERIA)
+        plain = Agent(name="Greeter", model="stub", instruction="Say hello.")
+        root = Agent(name="Root", model="stub", sub_agents=[agent, plain])
+        self.assertEqual(split_instructions(root), ["RefundProcessorAgent"])
+        self.assertEqual(agent.static_instruction, split_instruction(CRITERIA)[0])
+        self.assertEqual(plain.instruction, "Say hello.")
+
+
+class ContextCacheTest(unittest.TestCase):
+    def request(self, *messages):
+        contents = [
+            types.Content(role="user", parts=[types.Part(text=message)])
+            for message in messages
+        ]
+        return LlmRequest(
+            model="stub",
+            contents=contents,
+            config=types.GenerateContentConfig(system_instruction="Static rules."),
+        )
+
+    def test_counts_the_shared_prefix(self):
+        cache = ContextCache()
+        context = SimpleNamespace(agent_name="Agent")
+        first = self.request("Hi, I'm David.")
+        head, whole = prefix_segments(first)
+        for request in (
+            first,
+            self.request("Hi, I'm David.", "Thanks!"),  # the whole first request
+            self.request("Hi, I'm Alexis."),  # the system instruction only
+        ):
+            cache.before_model_callback(context, request)
+        stats = cache.stats["Agent"]
+        self.assertEqual(stats.requests, 3)
+        self.assertEqual(stats.cached_tokens, whole[1] + head[1])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,190 @@
+import asyncio
+import importlib
+import unittest
+from types import SimpleNamespace
+
+from google.adk.agents import BaseAgent
+from google.adk.events import Event
+from google.adk.runners import Runner
+from google.adk.sessions import InMemorySessionService
+from google.genai import types
+
+from shared.deadlines import (
+    PENDING,
+    REFUNDED,
+    DeadlineAgent,
+    eligibility_fallback,
+    processor_fallback,
+    template_fallback,
+)
+from shared.gate import NOT_ELIGIBLE
+from shared.streaming import RETRACT, stream_reply
+
+loop = importlib.import_module("5-workflow-loop-multi-agent.agent")
+
+ELIGIBLE = {
+    "purchaser": "David",
+    "purchase_history": [{"shipping_method": "INSURED", "total_amount": 30.0}],
+    "is_refund_eligible": "TRUE",
+}
+
+
+def invocation(message, state=None, events=()):
+    content = types.Content(role="user", parts=[types.Part(text=message)])
+    session = SimpleNamespace(state=dict(state or {}), events=list(events))
+    return SimpleNamespace(user_content=content, session=session, invocation_id="inv-1")
+
+
+def refund_response(invocation_id="inv-1"):
+    response = types.FunctionResponse(
+        name="process_refund", response={"result": "Refund processed successfully"}
+    )
+    return Event(
+        author="RefundProcessorAgent",
+        invocation_id=invocation_id,
+        content=types.Content(
+            role="user", parts=[types.Part(function_response=response)]
+        ),
+    )
+
+
+class SlowProcessor(BaseAgent):
+    # Issues the refund, then takes too long to write its reply.
+    async def _run_async_impl(self, ctx):
+        event = refund_response(ctx.invocation_id)
+        event.author = self.name
+        yield event
+        await asyncio.sleep(5)
+
+
+class StreamingProcessor(BaseAgent):
+    # Starts streaming its reply, then stalls.
+    async def _run_async_impl(self, ctx):
+        yield Event(
+            author=self.name,
+            partial=True,
+            content=types.Content(role="model", parts=[types.Part(text="Thanks, ")]),
+        )
+        await asyncio.sleep(5)
+
+
+def deadline_runner(processor, fallback):
+    deadline = DeadlineAgent(
+        name="RefundProcessorDeadline",
+        budget=0.05,
+        fallback=fallback,
+        sub_agents=[processor],
+    )
+    runner = Runner(
+        app_name="deadlines",
+        agent=deadline,
+        session_service=InMemorySessionService(),
+    )
+    return deadline, runner
+
+
+class ProcessorFallbackTest(unittest.TestCase):
+    def setUp(self):
+        self.fallback = processor_fallback("refund_confirmation_message")
+
+    def test_pending_when_nothing_was_refunded(self):
+        message, state = self.fallback(invocation("my taffy melted", ELIGIBLE))
+        self.assertEqual(message, PENDING.format(name=", David"))
+        self.assertEqual(state, {"refund_confirmation_message": message})
+
+    def test_confirms_a_refund_issued_this_turn(self):
+        ctx = invocation("my taffy melted", ELIGIBLE, [refund_response()])
+        message, _ = self.fallback(ctx)
+        self.assertEqual(message, REFUNDED.format(name=", David"))
+
+    def test_ignores_refunds_from_earlier_turns(self):
+        ctx = invocation("my taffy melted", ELIGIBLE, [refund_response("inv-0")])
+        message, _ = self.fallback(ctx)
+        self.assertEqual(message, PENDING.format(name=", David"))
+
+    def test_declines_a_known_rejection(self):
+        state = {**ELIGIBLE, "is_refund_eligible": "FALSE"}
+        message, _ = self.fallback(invocation("my taffy melted", state))
+        self.assertEqual(message, NOT_ELIGIBLE.format(name=", David"))
+
+    def test_deadline_after_the_refund_tool_ran(self):
+        deadline, runner = deadline_runner(
+            SlowProcessor(name="RefundProcessorAgent"), self.fallback
+        )
+
+        async def run():
+            session = await runner.session_service.create_session(
+                app_name="deadlines", user_id="test", state=ELIGIBLE
+            )
+            content = types.Content(role="user", parts=[types.Part(text="melted")])
+            async for _ in runner.run_async(
+                user_id="test", session_id=session.id, new_message=content
+            ):
+                pass
+            session = await runner.session_service.get_session(
+                app_name="deadlines", user_id="test", session_id=session.id
+            )
+            return session.state["refund_confirmation_message"]
+
+        self.assertEqual(asyncio.run(run()), REFUNDED.format(name=", David"))
+        self.assertEqual(deadline.stats.missed, 1)
+
+    def test_fallback_replaces_a_cut_off_stream(self):
+        _, runner = deadline_runner(
+            StreamingProcessor(name="RefundProcessorAgent"), self.fallback
+        )
+
+        async def run():
+            session = await runner.session_service.create_session(
+                app_name="deadlines", user_id="test", state=ELIGIBLE
+            )
+            return [
+                chunk
+                async for chunk in stream_reply(
+                    runner,
+                    "test",
+                    session.id,
+                    "melted",
+                    user_facing={"RefundProcessorAgent"},
+                )
+            ]
+
+        chunks = asyncio.run(run())
+        self.assertEqual(chunks, ["Thanks, ", RETRACT, PENDING.format(name=", David")])
+
+
+class TemplateFallbackTest(unittest.TestCase):
+    def test_missing_state_keys_are_blank(self):
+        fallback = template_fallback("Hi{name}, how about:\n{current_offer}", "offer")
+        message, state = fallback(invocation("no", {"name": ", David"}))
+        self.assertEqual(message, "Hi, David, how about:\n")
+        self.assertEqual(state, {"offer": message})
+
+
+class EligibilityFallbackTest(unittest.TestCase):
+    def test_uses_the_classified_reason(self):
+        def check(reason, shipping_method):
+            return reason == "DAMAGED" and shipping_method == "INSURED"
+
+        fallback = eligibility_fallback(check, "is_refund_eligible")
+        _, state = fallback(invocation("the box arrived melted", ELIGIBLE))
+        expected = {"refund_reason": "DAMAGED", "is_refund_eligible": True}
+        self.assertEqual(state, expected)
+
+
+class OfferAnswerFallbackTest(unittest.TestCase):
+    def answer(self, message):
+        _, state = loop.read_offer_answer(invocation(message))
+        return state["accepted_offer"]
+
+    def test_whole_reply_choices(self):
+        for message in ("2", " #2 ", "Option 2.", "offer 2!"):
+            self.assertEqual(self.answer(message), "2", message)
+
+    def test_numbers_inside_a_sentence_accept_nothing(self):
+        for message in ("I ordered 2 boxes", "none of the 3 work for me", "no thanks"):
+            self.assertEqual(self.answer(message), "NONE", message)
+
+
+if __name__ == "__main__":
+    unittest.main()
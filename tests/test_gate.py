@@ -0,0 +1,91 @@
+import asyncio
+import unittest
+
+from google.adk.agents import BaseAgent
+from google.adk.events import Event
+from google.adk.runners import Runner
+from google.adk.sessions import InMemorySessionService
+from google.genai import types
+
+from shared.gate import (
+    NO_PURCHASE,
+    NOT_ELIGIBLE,
+    EligibilityGate,
+    decline_message,
+    known_rejection,
+)
+from shared.policy import refund_policy
+
+STANDARD = [{"shipping_method": "STANDARD", "total_amount": 23.0}]
+INSURED = [{"shipping_method": "INSURED", "total_amount": 30.0}]
+
+
+class Processor(BaseAgent):
+    async def _run_async_impl(self, ctx):
+        yield Event(
+            author=self.name,
+            content=types.Content(role="model", parts=[types.Part(text="Refunded!")]),
+        )
+
+
+class KnownRejectionTest(unittest.TestCase):
+    def test_declines(self):
+        self.assertEqual(known_rejection({"purchase_history": []}), NO_PURCHASE)
+        for eligible in ("FALSE", " false\n", False):
+            state = {"purchase_history": INSURED, "is_refund_eligible": eligible}
+            self.assertEqual(known_rejection(state), NOT_ELIGIBLE)
+
+    def test_policy_checks_the_orders_on_record(self):
+        state = {"purchase_history": STANDARD, "refund_reason": "DAMAGED"}
+        self.assertEqual(known_rejection(state, refund_policy), NOT_ELIGIBLE)
+        state["purchase_history"] = STANDARD + INSURED
+        self.assertIsNone(known_rejection(state, refund_policy))
+
+    def test_leaves_the_rest_to_the_processor(self):
+        for state in (
+            {"purchase_history": INSURED, "is_refund_eligible": "TRUE"},
+            {"purchase_history": "David has one order", "is_refund_eligible": "maybe"},
+            {},
+        ):
+            self.assertIsNone(known_rejection(state), state)
+
+    def test_decline_message_names_the_customer(self):
+        state = {"purchaser": "Alexis", "purchase_history": []}
+        self.assertEqual(decline_message(state), NO_PURCHASE.format(name=", Alexis"))
+
+
+class EligibilityGateTest(unittest.TestCase):
+    def run_gate(self, state):
+        gate = EligibilityGate(name="Gate", sub_agents=[Processor(name="Processor")])
+        runner = Runner(
+            app_name="gate", agent=gate, session_service=InMemorySessionService()
+        )
+
+        async def run():
+            session = await runner.session_service.create_session(
+                app_name="gate", user_id="test", state=state
+            )
+            content = types.Content(role="user", parts=[types.Part(text="refund")])
+            return [
+                event.content.parts[0].text
+                async for event in runner.run_async(
+                    user_id="test", session_id=session.id, new_message=content
+                )
+                if event.content
+            ]
+
+        return asyncio.run(run())
+
+    def test_declines_without_the_processor(self):
+        self.assertEqual(
+            self.run_gate({"purchase_history": INSURED, "is_refund_eligible": "FALSE"}),
+            [NOT_ELIGIBLE.format(name="")],
+        )
+
+    def test_passes_eligible_requests_on(self):
+        state = {"purchase_history": INSURED, "is_refund_eligible": "TRUE"}
+        self.assertEqual(self.run_gate(state), ["Refunded!"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,27 @@
+import unittest
+
+from shared.names import NameIndex
+
+
+class NameIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.index = NameIndex()
+        for name in ("Alexis", "Alexandra", "David", "Mary Ann", "Mary Anne"):
+            self.index.add(name)
+
+    def test_exact_name_after_normalising(self):
+        self.assertEqual(self.index.search("  alexis "), [("Alexis", 1.0)])
+
+    def test_typo_finds_the_closest_name(self):
+        (best, score), *_ = self.index.search("Alexsis")
+        self.assertEqual(best, "Alexis")
+        self.assertLess(score, 1.0)
+        self.assertEqual(self.index.resolve("Davd"), "David")
+
+    def test_no_clear_winner(self):
+        self.assertIsNone(self.index.resolve("Mary Ane"))
+        self.assertEqual(self.index.search("Zebulon"), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
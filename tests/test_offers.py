@@ -0,0 +1,34 @@
+import unittest
+
+from shared.offers import CASH, accepted_offer, format_offers, offer_ladder
+
+
+class OfferLadderTest(unittest.TestCase):
+    def test_amounts_from_the_order_total(self):
+        ladder = offer_ladder(30.0)
+        self.assertEqual([offer.amount for offer in ladder], [8.0, 22.5, 15.0])
+        self.assertEqual(ladder[-1].kind, CASH)
+        self.assertEqual(
+            format_offers(ladder).splitlines()[1],
+            "2. a $22.50 store credit voucher (75% of your order total)",
+        )
+
+    def test_product_never_worth_more_than_the_order(self):
+        self.assertEqual(offer_ladder(5.0)[0].amount, 5.0)
+
+    def test_unknown_total(self):
+        ladder = offer_ladder(None)
+        self.assertEqual([offer.amount for offer in ladder], [8.0, None, None])
+        self.assertIn("50% of your order total", ladder[2].text)
+
+    def test_accepted_offer(self):
+        ladder = offer_ladder(30.0)
+        self.assertEqual(accepted_offer("Option 2.", ladder), ladder[1])
+        self.assertIsNone(accepted_offer("NONE", ladder))
+        self.assertIsNone(accepted_offer("4", ladder))
+        self.assertEqual(accepted_offer("TRUE", ladder[:1]), ladder[0])
+        self.assertIsNone(accepted_offer("TRUE", ladder))
+
+
+if __name__ == "__main__":
+    unittest.main()
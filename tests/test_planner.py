@@ -0,0 +1,53 @@
+import importlib
+import unittest
+from types import SimpleNamespace
+
+from google.adk.agents import Agent, ParallelAgent, SequentialAgent
+
+from shared.planner import parallelize, plan
+
+
+def names(groups):
+    return [[stage.name for stage in group] for group in groups]
+
+
+class PlannerTest(unittest.TestCase):
+    def test_independent_stages_share_a_group(self):
+        root = SequentialAgent(
+            name="Refund",
+            sub_agents=[
+                Agent(name="Lookup", model="stub", output_key="orders"),
+                Agent(name="Reason", model="stub", output_key="reason"),
+                Agent(
+                    name="Decide",
+                    model="stub",
+                    instruction="{orders} {reason}",
+                    output_key="decision",
+                ),
+            ],
+        )
+        self.assertEqual(names(plan(root)), [["Lookup", "Reason"], ["Decide"]])
+
+        root = parallelize(root)
+        stage, decide = root.sub_agents
+        self.assertIsInstance(stage, ParallelAgent)
+        self.assertEqual([a.name for a in stage.sub_agents], ["Lookup", "Reason"])
+        self.assertEqual(decide.parent_agent, root)
+
+    def test_shipped_patterns(self):
+        # Pattern 3's policy applier needs the verifier's purchase_history...
+        sequential = importlib.import_module("3-workflow-sequential-multi-agent.agent")
+        self.assertEqual(len(plan(sequential.root_agent)), 3)
+
+        # ...pattern 4's doesn't, and its hand-built parallel stage is what the planner
+        # derives from the same stages in a row.
+        parallel = importlib.import_module("4-workflow-parallel-multi-agent.agent")
+        flat = SimpleNamespace(
+            sub_agents=[*parallel.parallel_agent.sub_agents, parallel.eligibility_gate]
+        )
+        verify_and_check = ["PurchaseVerifierAgent", "RefundPolicyApplierAgent"]
+        self.assertEqual(names(plan(flat)), [verify_and_check, ["EligibilityGate"]])
+
+
+if __name__ == "__main__":
+    unittest.main()
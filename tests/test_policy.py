@@ -0,0 +1,76 @@
+import unittest
+
+from shared.policy import PolicyRule, compile_policy, refund_policy
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+RULES = [
+    PolicyRule(reasons={"DAMAGED", "LOST"}, shipping_methods={"INSURED"}),
+    PolicyRule(
+        reasons={"DAMAGED"},
+        shipping_methods={"STANDARD"},
+        max_age_days=30,
+        max_amount=25.0,
+    ),
+]
+
+
+class PolicyCheckTest(unittest.TestCase):
+    def test_refund_policy(self):
+        self.assertTrue(refund_policy.check("DAMAGED", "INSURED"))
+        self.assertTrue(refund_policy.check("never_arrived", " overnight "))
+        self.assertFalse(refund_policy.check("DAMAGED", "STANDARD"))
+        self.assertFalse(refund_policy.check("OTHER", "INSURED"))
+
+    def test_unknown_shipping_method_means_any(self):
+        self.assertTrue(refund_policy.check("LATE"))
+        self.assertFalse(refund_policy.check("OTHER"))
+
+    def test_limits(self):
+        policy = compile_policy(RULES)
+        self.assertTrue(policy.check("DAMAGED", "STANDARD", age_days=10, amount=20.0))
+        self.assertFalse(policy.check("DAMAGED", "STANDARD", age_days=45, amount=20.0))
+        self.assertFalse(policy.check("DAMAGED", "STANDARD", age_days=10, amount=30.0))
+        # Limits that aren't known yet aren't checked.
+        self.assertTrue(policy.check("DAMAGED", "STANDARD"))
+
+
+@unittest.skipIf(np is None, "check_many needs NumPy")
+class PolicyCheckManyTest(unittest.TestCase):
+    def test_matches_per_row_check(self):
+        policy = compile_policy(RULES, {"NEVER_ARRIVED": "LOST"})
+        rng = np.random.default_rng(0)
+        rows = 5_000
+        reasons = rng.choice(["DAMAGED", "LOST", "NEVER_ARRIVED", "late", "?"], rows)
+        shipping = rng.choice(["STANDARD", "INSURED", "OVERNIGHT"], rows)
+        age_days = rng.integers(0, 90, rows)
+        amounts = rng.uniform(5, 50, rows).round(2)
+
+        vectorized = policy.check_many(reasons, shipping, age_days, amounts)
+        per_row = [
+            policy.check(*row)
+            for row in zip(
+                reasons.tolist(), shipping.tolist(), age_days.tolist(), amounts.tolist()
+            )
+        ]
+        self.assertEqual(vectorized.tolist(), per_row)
+        self.assertTrue(0 < sum(per_row) < rows)
+
+    def test_accepts_encoded_columns(self):
+        reasons = ["DAMAGED", "OTHER", "STOLEN"]
+        shipping = ["INSURED", "INSURED", "OVERNIGHT"]
+        codes = (
+            refund_policy.encode_reasons(reasons),
+            refund_policy.encode_shipping_methods(shipping),
+        )
+        self.assertEqual(
+            refund_policy.check_many(*codes).tolist(),
+            refund_policy.check_many(reasons, shipping).tolist(),
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,133 @@
+import asyncio
+import importlib
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+from google.adk.runners import Runner
+from google.adk.sessions import InMemorySessionService
+from google.genai import types
+
+from shared.benchmark import install_stubs
+from shared.stub_model import constant, say
+from shared.store import PurchaseStore
+from tests.test_store import HISTORY
+
+loop = importlib.import_module("5-workflow-loop-multi-agent.agent")
+
+
+def invocation(message, **state):
+    content = types.Content(role="user", parts=[types.Part(text=message)])
+    return SimpleNamespace(
+        user_content=content,
+        session=SimpleNamespace(state=state),
+        invocation_id="inv-1",
+    )
+
+
+def david(message, **state):
+    return invocation(
+        message, purchaser="David", purchase_history=HISTORY["David"], **state
+    )
+
+
+class StoreTestCase(unittest.TestCase):
+    def setUp(self):
+        store = PurchaseStore.from_dict(HISTORY)
+        patcher = mock.patch.object(loop, "purchase_store", store)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+
+class OrderToRefundTest(StoreTestCase):
+    def test_picks_the_order_the_customer_described(self):
+        ctx = david("I'm David, the assorted taffy box I got in May arrived melted")
+        self.assertEqual(loop.order_to_refund(ctx)["purchase_id"], "SG001-20250501")
+
+    def test_no_order_when_the_message_matches_several(self):
+        self.assertIsNone(loop.order_to_refund(david("I'm David, my taffy melted")))
+
+    def test_only_order_needs_no_description(self):
+        ctx = invocation(
+            "my taffy melted", purchaser="Alexis", purchase_history=HISTORY["Alexis"]
+        )
+        self.assertEqual(loop.order_to_refund(ctx)["purchase_id"], "JD001-20250415")
+
+    def test_keeps_the_order_chosen_for_the_offers(self):
+        ctx = david("2", refund_purchase_id="SG005-20250612")
+        self.assertEqual(loop.order_to_refund(ctx)["purchase_id"], "SG005-20250612")
+
+    def test_unstructured_history(self):
+        ctx = invocation("I'm David", purchase_history="David bought some taffy")
+        self.assertIsNone(loop.order_to_refund(ctx))
+
+
+class FullRefundTest(StoreTestCase):
+    def run_controller(self, ctx):
+        async def collect():
+            return [e async for e in loop.refund_loop_controller._run_async_impl(ctx)]
+
+        return asyncio.run(collect())
+
+    def test_refunds_the_described_order(self):
+        ctx = david(
+            "I'm David, the assorted taffy box arrived melted",
+            is_full_refund_eligible="TRUE",
+        )
+        with mock.patch.object(loop, "process_refund") as process_refund:
+            (event,) = self.run_controller(ctx)
+        process_refund.assert_called_once_with(30.0, "SG001-20250501")
+        self.assertIn("SG001-20250501", event.content.parts[0].text)
+
+    def test_waits_for_the_customer_to_pick_an_order(self):
+        question = "Which of your taffy orders melted?"
+        install_stubs(
+            loop.refund_loop_agent,
+            {"RefundLoopCheckerAgent": [say(question)]},
+            constant(0),
+            [],
+        )
+        runner = Runner(
+            app_name="test",
+            agent=loop.refund_loop_agent,
+            session_service=InMemorySessionService(),
+        )
+
+        async def conversation():
+            session = await runner.session_service.create_session(
+                app_name="test",
+                user_id="david",
+                state={
+                    "purchaser": "David",
+                    "purchase_history": HISTORY["David"],
+                    "is_full_refund_eligible": "TRUE",
+                },
+            )
+            replies = []
+            for message in ["I'm David, my taffy melted", "The watermelon bag please"]:
+                content = types.Content(role="user", parts=[types.Part(text=message)])
+                texts = [
+                    part.text
+                    async for event in runner.run_async(
+                        user_id="david", session_id=session.id, new_message=content
+                    )
+                    if event.content
+                    for part in event.content.parts
+                    if part.text
+                ]
+                session = await runner.session_service.get_session(
+                    app_name="test", user_id="david", session_id=session.id
+                )
+                replies.append((texts, session.state.get("refund_resolved")))
+            return replies
+
+        with mock.patch.object(loop, "process_refund") as process_refund:
+            asked, answered = asyncio.run(conversation())
+        self.assertEqual(asked, ([question], None))
+        process_refund.assert_called_once_with(8.0, "SG005-20250612")
+        self.assertIn("SG005-20250612", answered[0][0])
+        self.assertEqual(answered[1], "pass")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,68 @@
+import asyncio
+import unittest
+
+from shared.scheduler import BACKGROUND, FOREGROUND, ModelScheduler, TokenBucket
+
+
+class TokenBucketTest(unittest.TestCase):
+    def test_waits_for_a_refill(self):
+        bucket = TokenBucket(per_minute=600)  # 10 a second, 10 at once
+        self.assertEqual(bucket.wait_time(10), 0.0)
+        bucket.take(10)
+        self.assertAlmostEqual(bucket.wait_time(1), 0.1, places=2)
+        # More than the capacity only waits for a full bucket.
+        self.assertAlmostEqual(bucket.wait_time(50), 1.0, places=2)
+
+
+class ModelSchedulerTest(unittest.TestCase):
+    def test_unlimited_calls_go_straight_through(self):
+        scheduler = ModelScheduler()
+
+        async def run():
+            return await asyncio.gather(
+                *(scheduler.acquire(BACKGROUND, 1_000) for _ in range(20))
+            )
+
+        self.assertLess(max(asyncio.run(run())), 0.01)
+        self.assertEqual(scheduler.peak_queued, 0)
+
+    def test_foreground_goes_first(self):
+        # One request per 20ms: everything after the first call has to queue.
+        scheduler = ModelScheduler(requests_per_minute=3_000, burst=0.02)
+        granted = []
+
+        async def call(name, priority):
+            await scheduler.acquire(priority, 10)
+            granted.append(name)
+
+        async def run():
+            await call("first", BACKGROUND)
+            background = [
+                asyncio.ensure_future(call(f"background {n}", BACKGROUND))
+                for n in range(3)
+            ]
+            await asyncio.sleep(0)
+            await asyncio.gather(call("foreground", FOREGROUND), *background)
+
+        asyncio.run(run())
+        self.assertEqual(granted[:2], ["first", "foreground"])
+        self.assertEqual(scheduler.metrics()["foreground"]["granted"], 1)
+        self.assertEqual(scheduler.peak_queued, 4)
+
+    def test_cancelled_waiters_are_skipped(self):
+        scheduler = ModelScheduler(requests_per_minute=3_000, burst=0.02)
+
+        async def run():
+            await scheduler.acquire(BACKGROUND, 10)
+            waiter = asyncio.ensure_future(scheduler.acquire(BACKGROUND, 10))
+            await asyncio.sleep(0)
+            waiter.cancel()
+            await asyncio.wait_for(scheduler.acquire(FOREGROUND, 10), 1.0)
+
+        asyncio.run(run())
+        self.assertEqual(scheduler.queued, 0)
+        self.assertEqual(scheduler.granted[BACKGROUND], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
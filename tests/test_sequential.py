@@ -0,0 +1,41 @@
+import asyncio
+import importlib
+import unittest
+from unittest import mock
+
+from google.adk.runners import Runner
+from google.adk.sessions import InMemorySessionService
+
+from shared.benchmark import DEFAULT_MESSAGE, SCRIPTS, install_stubs, run_once
+from shared.stub_model import StubModel, constant, request_text
+
+PATTERN = "3-workflow-sequential-multi-agent"
+
+
+class RefundProcessorPromptTest(unittest.TestCase):
+    def test_prompt_has_the_order_to_refund(self):
+        module = importlib.import_module(f"{PATTERN}.agent")
+        install_stubs(module.root_agent, SCRIPTS[PATTERN], constant(0), [])
+        prompts = {}
+        next_reply = StubModel.next_reply
+
+        def record(stub, llm_request):
+            prompts[stub.agent_name] = request_text(llm_request)
+            return next_reply(stub, llm_request)
+
+        runner = Runner(
+            app_name=PATTERN,
+            agent=module.root_agent,
+            session_service=InMemorySessionService(),
+        )
+        with mock.patch.object(StubModel, "next_reply", record):
+            asyncio.run(run_once(runner, DEFAULT_MESSAGE, []))
+
+        # The verifier and classifier answer in code, so state is all it gets.
+        prompt = prompts["RefundProcessorAgent"]
+        self.assertIn("SG001-20250501", prompt)
+        self.assertIn("30.00", prompt)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,116 @@
+import unittest
+from types import SimpleNamespace
+
+from google.genai import types
+
+from shared.deadlines import verifier_fallback
+from shared.store import PurchaseStore
+
+
+def purchase(purchase_id, day, product, total, shipping_method="STANDARD"):
+    return {
+        "purchase_id": purchase_id,
+        "purchased_date": day,
+        "items": [{"product_name": product, "quantity": 1, "price": total}],
+        "shipping_method": shipping_method,
+        "total_amount": total,
+    }
+
+
+HISTORY = {
+    "Alexis": [
+        purchase("JD001-20250415", "2025-04-15", "Assorted Taffy 1lb Box", 15.0),
+    ],
+    "Alexa": [
+        purchase("JD004-20250420", "2025-04-20", "Peppermint Taffy 1lb Box", 15.0),
+    ],
+    "David": [
+        purchase(
+            "SG001-20250501", "2025-05-01", "Assorted Taffy 1lb Box", 30.0, "INSURED"
+        ),
+        purchase("SG005-20250612", "2025-06-12", "Watermelon Taffy 0.5lb Bag", 8.0),
+        purchase("SG009-20250701", "2025-07-01", "Salt Water Taffy Gift Tin", 42.0),
+    ],
+}
+
+
+def invocation(message, state=None):
+    content = types.Content(role="user", parts=[types.Part(text=message)])
+    session = SimpleNamespace(state=state or {})
+    return SimpleNamespace(user_content=content, session=session)
+
+
+class PurchaserNameTest(unittest.TestCase):
+    def setUp(self):
+        self.store = PurchaseStore.from_dict(HISTORY)
+
+    def test_exact_name_returns_history(self):
+        self.assertEqual(self.store.query("David"), HISTORY["David"])
+
+    def test_case_and_typos_resolve_to_the_one_close_name(self):
+        for name in ("david", "DAVID ", "Davd"):
+            self.assertEqual(self.store.query(name), HISTORY["David"], name)
+
+    def test_several_close_names_return_candidates_not_history(self):
+        result = self.store.query("Alexsa")
+        self.assertEqual(result["status"], "error")
+        self.assertEqual(set(result["did_you_mean"]), {"Alexis", "Alexa"})
+        self.assertNotIn("purchase_id", str(result))
+
+    def test_unrelated_name_returns_nothing(self):
+        self.assertEqual(self.store.query("Zebulon"), [])
+
+    def test_match_orders_resolves_the_name(self):
+        (match,) = self.store.match_orders("david", "watermelon bag")
+        self.assertEqual(match["purchase_id"], "SG005-20250612")
+        self.assertEqual(self.store.match_orders("Alexsa", "taffy box"), [])
+
+    def test_verifier_fallback_looks_names_up_exactly(self):
+        fallback = verifier_fallback(self.store)
+        _, state = fallback(invocation("Hi, I'm Alexis and my taffy arrived broken"))
+        self.assertEqual(state["purchaser"], "Alexis")
+        self.assertEqual(state["purchase_history"], HISTORY["Alexis"])
+
+        _, state = fallback(invocation("Hi, I'm Alexsis and my taffy arrived broken"))
+        self.assertEqual(state, {"purchase_history": []})
+
+    def test_verifier_fallback_keeps_earlier_purchaser(self):
+        fallback = verifier_fallback(self.store)
+        _, state = fallback(invocation("it was the gift tin", {"purchaser": "David"}))
+        self.assertEqual(state["purchaser"], "David")
+
+
+class QueryFilterTest(unittest.TestCase):
+    def setUp(self):
+        self.store = PurchaseStore.from_dict(HISTORY)
+
+    def ids(self, **filters):
+        return [p["purchase_id"] for p in self.store.query("David", **filters)]
+
+    def test_filters_combine(self):
+        self.assertEqual(
+            self.ids(since="2025-05-01", until="2025-06-30"),
+            ["SG001-20250501", "SG005-20250612"],
+        )
+        self.assertEqual(
+            self.ids(product="taffy", shipping_method="INSURED"), ["SG001-20250501"]
+        )
+        self.assertEqual(self.ids(limit=2), ["SG005-20250612", "SG009-20250701"])
+
+    def test_summary_rows(self):
+        (row,) = self.store.query("David", product="gift tin", summary=True)
+        self.assertEqual(row["purchase_id"], "SG009-20250701")
+        self.assertNotIn("items", row)
+
+    def test_bad_date_is_a_tool_error(self):
+        result = self.store.query("David", since="last May")
+        self.assertEqual(result["status"], "error")
+        self.assertIn("YYYY-MM-DD", result["error_message"])
+
+    def test_negative_limit_is_a_tool_error(self):
+        result = self.store.query("David", limit=-1)
+        self.assertEqual(result["status"], "error")
+
+
+if __name__ == "__main__":
+    unittest.main()
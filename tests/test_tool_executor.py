@@ -0,0 +1,43 @@
+import asyncio
+import importlib
+import time
+import unittest
+
+from shared.tool_executor import ToolExecutor
+
+single_agent = importlib.import_module("1-llm-single-agent.agent")
+
+
+def slow_lookup() -> str:
+    time.sleep(0.2)
+    return "found"
+
+
+def slow_refund() -> str:
+    time.sleep(0.2)
+    return "Refund processed successfully"
+
+
+class ToolExecutorTest(unittest.TestCase):
+    def setUp(self):
+        self.executor = ToolExecutor(timeout=0.05, timeouts={"slow_refund": None})
+        self.addCleanup(self.executor.shutdown)
+
+    def test_timed_out_call_is_a_tool_error(self):
+        result = asyncio.run(self.executor.wrap(slow_lookup)())
+        self.assertEqual(result["status"], "error")
+        self.assertIn("timed out", result["error_message"])
+
+    def test_tool_without_timeout_runs_to_completion(self):
+        result = asyncio.run(self.executor.wrap(slow_refund)())
+        self.assertEqual(result, "Refund processed successfully")
+
+    def test_refund_tools_never_time_out(self):
+        executor = single_agent.tool_executor
+        self.assertIsNone(executor.timeout_for("process_refund"))
+        self.assertIsNone(executor.timeout_for("process_refunds"))
+        self.assertIsNotNone(executor.timeout_for("get_purchase_history"))
+
+
+if __name__ == "__main__":
+    unittest.main()